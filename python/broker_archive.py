@@ -0,0 +1,279 @@
+"""
+券商分點原始資料封存
+主力買賣超每日對全市場逐檔查詢 TaiwanStockTradingDailyReport，原本只留下每檔的主力買超張數；
+封存保留完整的分點資料列，之後改變主力定義時可直接以歷史資料重算，不必重新抓取。
+
+每個交易日一個壓縮分區 data/broker_archive/YYYY-MM-DD.npz：
+    stocks          股票代碼（遞增）
+    offsets         各股票資料列的起訖位置（長度 = 股票數 + 1），資料列依 (股票, 券商, 價格) 排序
+    trader_ids      當日券商代碼字典；trader_names 為對應的券商名稱
+    trader          各列的券商代碼索引（uint16）
+    price           成交價 × PRICE_SCALE（int32）
+    buy / sell      買進、賣出股數（int32，超出範圍時 int64）
+
+讀取時第一次將分區解壓為未壓縮的 .npy（.mmap/YYYY-MM-DD/），之後以 memory map 開啟，
+只有實際用到的頁面才會讀入記憶體。
+
+抓取中途每批分點資料先寫成暫存片段（.parts/YYYY-MM-DD/NNNN.npz，只追加、不改寫既有檔案），
+抓取結束時 compact 一次合併為單日分區，同一檔股票以後寫入者為準；中斷後接續抓取時保留既有片段。
+中斷後未在當日接續的片段，於下次執行時由 compact_stale 合併為（只有部分股票的）單日分區。
+全市場抓取無失敗時另寫入完成標記 YYYY-MM-DD.complete，未標記的交易日可能只有部分股票。
+
+以新的主力定義重算歷史：
+    archive = BrokerArchive()
+    for date in archive.dates():
+        stats = broker_concentration(archive.load_day(date), ks=(10, 30))
+"""
+
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ARCHIVE_DIR = os.getenv(
+    'BROKER_ARCHIVE_DIR', '../data/broker_archive' if os.path.exists('../data') else 'data/broker_archive'
+)
+
+# 成交價以整數儲存的倍率（台股價格最小跳動 0.01）
+PRICE_SCALE = 100
+
+# 分區中的陣列
+FIELDS = ('stocks', 'offsets', 'trader_ids', 'trader_names', 'trader', 'price', 'buy', 'sell')
+
+
+def encode(reports):
+    """
+    將券商分點長表編碼為分區陣列
+
+    Args:
+        reports: TaiwanStockTradingDailyReport 長表（stock_id、securities_trader、securities_trader_id、price、buy、sell）
+
+    Returns:
+        dict: {欄位: 陣列}（見模組說明）
+    """
+    stock_codes, stocks = pd.factorize(reports['stock_id'].astype(str), sort=True)
+    trader_codes, trader_ids = pd.factorize(reports['securities_trader_id'].astype(str), sort=True)
+    names = pd.Series(reports['securities_trader'].astype(str).to_numpy()).groupby(trader_codes).first()
+    price = np.round(reports['price'].to_numpy(dtype=np.float64) * PRICE_SCALE)
+    price = np.nan_to_num(price, nan=0).astype(np.int32)
+
+    order = np.lexsort((price, trader_codes, stock_codes))
+    counts = np.bincount(stock_codes, minlength=len(stocks))
+    arrays = {
+        'stocks': np.asarray(stocks, dtype='U'),
+        'offsets': np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+        'trader_ids': np.asarray(trader_ids, dtype='U'),
+        'trader_names': names.reindex(range(len(trader_ids)), fill_value='').to_numpy(dtype='U'),
+        'trader': trader_codes[order].astype(np.uint16),
+        'price': price[order],
+    }
+    for side in ('buy', 'sell'):
+        values = reports[side].to_numpy(dtype=np.int64)[order]
+        fits = len(values) == 0 or (values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max)
+        arrays[side] = values.astype(np.int32) if fits else values
+    return arrays
+
+
+class BrokerDay:
+    """
+    單日封存分區（memory map）
+
+    Attributes:
+        date: 交易日
+        stocks: 股票代碼（遞增）
+        offsets: 各股票資料列的起訖位置
+        trader_ids / trader_names: 券商字典
+        trader / price / buy / sell: 逐列陣列（依 (股票, 券商, 價格) 排序）
+    """
+
+    def __init__(self, date, arrays):
+        self.date = date
+        for field in FIELDS:
+            setattr(self, field, arrays[field])
+        self._position = {code: i for i, code in enumerate(self.stocks.tolist())}
+
+    def __len__(self):
+        return len(self.trader)
+
+    def rows(self, stock_id):
+        """單一股票的資料列範圍；無資料時為空範圍"""
+        i = self._position.get(str(stock_id))
+        if i is None:
+            return slice(0, 0)
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def frame(self, stocks=None):
+        """
+        解碼為與 FinMind 回應相同欄位的長表
+
+        Args:
+            stocks: 只取這些股票；None 表示全部
+
+        Returns:
+            DataFrame: date、stock_id、securities_trader、securities_trader_id、price、buy、sell
+        """
+        counts = np.diff(self.offsets)
+        if stocks is None:
+            rows = slice(None)
+            stock_codes = np.repeat(np.arange(len(self.stocks)), counts)
+        else:
+            slices = [self.rows(s) for s in stocks]
+            rows = np.concatenate([np.arange(s.start, s.stop) for s in slices] or [np.arange(0)])
+            stock_codes = np.repeat(np.arange(len(self.stocks)), counts)[rows]
+        trader = np.asarray(self.trader[rows]).astype(np.int64)
+        return pd.DataFrame({
+            'date': self.date,
+            'stock_id': pd.Categorical.from_codes(stock_codes, self.stocks.tolist()),
+            'securities_trader': pd.Categorical(self.trader_names[trader]),
+            'securities_trader_id': pd.Categorical.from_codes(trader, self.trader_ids.tolist()),
+            'price': (np.asarray(self.price[rows]) / PRICE_SCALE).astype(np.float32),
+            'buy': np.asarray(self.buy[rows]).astype(np.int64),
+            'sell': np.asarray(self.sell[rows]).astype(np.int64),
+        })
+
+
+class BrokerArchive:
+    """券商分點封存分區的讀寫"""
+
+    def __init__(self, root=ARCHIVE_DIR):
+        """
+        Args:
+            root: 封存根目錄
+        """
+        self.root = Path(root)
+
+    def _path(self, date):
+        return self.root / f"{date}.npz"
+
+    def _mmap_dir(self, date):
+        return self.root / '.mmap' / date
+
+    def _complete_path(self, date):
+        return self.root / f"{date}.complete"
+
+    def _parts_dir(self, date):
+        return self.root / '.parts' / date
+
+    def dates(self):
+        """已封存的交易日（遞增）"""
+        if not self.root.exists():
+            return []
+        return sorted(p.stem for p in self.root.glob('*.npz'))
+
+    def has_day(self, date):
+        return self._path(date).exists()
+
+    def mark_complete(self, date):
+        """標記單日分區已涵蓋全市場（抓取無失敗時呼叫）；無分區時不標記"""
+        if self.has_day(date):
+            self._complete_path(date).touch()
+
+    def is_complete(self, date):
+        """單日分區是否已標記為完整"""
+        return self.has_day(date) and self._complete_path(date).exists()
+
+    def write_day(self, date, reports):
+        """
+        寫入單日分區（覆寫同日舊分區）
+
+        Args:
+            date: 交易日 'YYYY-MM-DD'
+            reports: 當日券商分點長表
+        """
+        path = self._path(date)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{date}.{os.getpid()}.tmp.npz")
+        np.savez_compressed(tmp, **encode(reports))
+        os.replace(tmp, path)
+        shutil.rmtree(self._mmap_dir(date), ignore_errors=True)
+
+    def append_part(self, date, reports):
+        """
+        將一批股票的分點資料寫成暫存片段（不改寫單日分區，待 compact 合併）
+
+        Args:
+            date: 交易日 'YYYY-MM-DD'
+            reports: 這批股票的券商分點長表
+        """
+        folder = self._parts_dir(date)
+        folder.mkdir(parents=True, exist_ok=True)
+        number = max((int(p.stem) for p in folder.glob('[0-9]*.npz')), default=-1) + 1
+        tmp = folder / f".{number:04d}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, **encode(reports))
+        os.replace(tmp, folder / f"{number:04d}.npz")
+
+    def compact(self, date):
+        """
+        將暫存片段與既有單日分區合併為一個分區（只寫入一次），同一股票以較晚寫入者為準
+
+        Returns:
+            bool: 是否有片段被合併
+        """
+        folder = self._parts_dir(date)
+        parts = sorted(folder.glob('[0-9]*.npz')) if folder.exists() else []
+        if not parts:
+            return False
+        frames = []
+        for part in parts:
+            with np.load(part, allow_pickle=False) as z:
+                frames.append(BrokerDay(date, {field: z[field] for field in FIELDS}).frame())
+        if self.has_day(date):
+            frames.insert(0, self.load_day(date))
+
+        # 由後往前取，已出現在較晚片段的股票略過
+        columns = ['stock_id', 'securities_trader', 'securities_trader_id', 'price', 'buy', 'sell']
+        seen, kept = set(), []
+        for frame in reversed(frames):
+            frame = frame[columns].astype({'stock_id': str, 'securities_trader': str, 'securities_trader_id': str})
+            stocks = set(frame['stock_id'].unique())
+            kept.append(frame[~frame['stock_id'].isin(seen)])
+            seen |= stocks
+        self.write_day(date, pd.concat(kept[::-1], ignore_index=True))
+        shutil.rmtree(folder, ignore_errors=True)
+        return True
+
+    def compact_stale(self, before):
+        """
+        合併早於 before 的所有殘留片段（中斷後未在當日接續的抓取）
+
+        Args:
+            before: 日期 'YYYY-MM-DD'；通常為今日，今日的片段留待接續抓取
+
+        Returns:
+            list: 本次合併的交易日（未標記完整，只有部分股票）
+        """
+        parts = self.root / '.parts'
+        if not parts.exists():
+            return []
+        stale = sorted(p.name for p in parts.iterdir() if p.is_dir() and p.name < before)
+        return [date for date in stale if self.compact(date)]
+
+    def open_day(self, date):
+        """
+        以 memory map 開啟單日分區（第一次開啟時解壓）
+
+        Returns:
+            BrokerDay；無分區時為 None
+        """
+        path = self._path(date)
+        if not path.exists():
+            return None
+        folder = self._mmap_dir(date)
+        stamp = folder / '.source'
+        if not stamp.exists() or stamp.read_text() != str(path.stat().st_mtime_ns):
+            shutil.rmtree(folder, ignore_errors=True)
+            tmp = folder.with_name(f"{date}.{os.getpid()}.tmp")
+            tmp.mkdir(parents=True, exist_ok=True)
+            with np.load(path, allow_pickle=False) as z:
+                for field in FIELDS:
+                    np.save(tmp / f"{field}.npy", z[field])
+            (tmp / '.source').write_text(str(path.stat().st_mtime_ns))
+            os.replace(tmp, folder)
+        return BrokerDay(date, {field: np.load(folder / f"{field}.npy", mmap_mode='r') for field in FIELDS})
+
+    def load_day(self, date, stocks=None):
+        """讀取單日分點長表（見 BrokerDay.frame）；無分區時回傳 None"""
+        day = self.open_day(date)
+        return day.frame(stocks) if day is not None else None
@@ -0,0 +1,288 @@
+"""
+券商分點持股部位追蹤
+依每日券商分點資料（broker_archive 封存）累計每個 (券商, 股票) 的淨買賣超股數，
+每日只併入當日資料，不重算整段歷史。
+
+狀態以陣列存放（data/broker_positions/state.npz）：
+    stocks / traders / trader_names   股票與券商字典（只追加）
+    pair_stock / pair_trader          每個 (股票, 券商) 組合的字典索引，組合編號只追加、不重排
+    position                          各組合自開始追蹤以來的累計淨買賣超（股）
+    dates, day_offsets, day_pair, day_net
+                                      最近 HISTORY_DAYS 個交易日各組合的當日淨買賣超（稀疏，只存有交易的組合）
+    partial_dates                     以部分股票資料併入的交易日（抓取有失敗且未在當日補齊）
+
+索引（每次併入後重建）：
+    依 (股票, 券商) 排序的組合編號：查詢單一股票的所有券商、以二分搜尋找組合
+    依 (券商, 股票) 排序的組合編號：查詢單一券商的所有股票
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from finmind_cache import taipei_today
+
+POSITIONS_DIR = os.getenv(
+    'BROKER_POSITIONS_DIR', '../data/broker_positions' if os.path.exists('../data') else 'data/broker_positions'
+)
+
+# 保留逐日淨買賣超的交易日數（N 日查詢的上限）
+HISTORY_DAYS = 60
+
+
+def _extend(dictionary, position, values):
+    """將新代碼加入字典，回傳 values 對應的字典索引"""
+    codes, uniques = pd.factorize(values)
+    for value in uniques:
+        if value not in position:
+            position[value] = len(dictionary)
+            dictionary.append(value)
+    return np.array([position[v] for v in uniques], dtype=np.int64)[codes] if len(values) else np.arange(0)
+
+
+class BrokerPositions:
+    """各券商在各股票的累計淨買賣超"""
+
+    def __init__(self, root=POSITIONS_DIR, history_days=HISTORY_DAYS):
+        """
+        Args:
+            root: 狀態檔目錄
+            history_days: 保留逐日淨買賣超的交易日數
+        """
+        self.root = Path(root)
+        self.history_days = history_days
+        self.stocks, self.traders, self.trader_names = [], [], []
+        self.pair_stock = np.zeros(0, dtype=np.int32)
+        self.pair_trader = np.zeros(0, dtype=np.int32)
+        self.position = np.zeros(0, dtype=np.int64)
+        self.dates = []
+        self.partial_dates = []
+        self._days = []    # [(組合編號, 當日淨買賣超)...]，與 dates 對齊
+        self._load()
+        self._reindex()
+
+    # ---------- 狀態 ----------
+
+    @property
+    def _state_path(self):
+        return self.root / 'state.npz'
+
+    @property
+    def last_date(self):
+        """最後併入的交易日；尚未併入任何資料時為 None"""
+        return self.dates[-1] if self.dates else None
+
+    def _load(self):
+        if not self._state_path.exists():
+            return
+        with np.load(self._state_path, allow_pickle=False) as z:
+            self.stocks = z['stocks'].tolist()
+            self.traders = z['traders'].tolist()
+            self.trader_names = z['trader_names'].tolist()
+            self.pair_stock = z['pair_stock']
+            self.pair_trader = z['pair_trader']
+            self.position = z['position']
+            self.dates = z['dates'].tolist()
+            if 'partial_dates' in z.files:
+                self.partial_dates = z['partial_dates'].tolist()
+            offsets, pairs, nets = z['day_offsets'], z['day_pair'], z['day_net']
+        self._days = [(pairs[a:b], nets[a:b]) for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def save(self):
+        """原子寫入狀態檔"""
+        lengths = [len(pairs) for pairs, _ in self._days]
+        arrays = {
+            'stocks': np.array(self.stocks, dtype='U'),
+            'traders': np.array(self.traders, dtype='U'),
+            'trader_names': np.array(self.trader_names, dtype='U'),
+            'pair_stock': self.pair_stock,
+            'pair_trader': self.pair_trader,
+            'position': self.position,
+            'dates': np.array(self.dates, dtype='U'),
+            'partial_dates': np.array(self.partial_dates, dtype='U'),
+            'day_offsets': np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+            'day_pair': np.concatenate([p for p, _ in self._days] or [np.zeros(0, dtype=np.int32)]),
+            'day_net': np.concatenate([n for _, n in self._days] or [np.zeros(0, dtype=np.int64)]),
+        }
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self._state_path.with_name(f"state.{os.getpid()}.tmp.npz")
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, self._state_path)
+
+    def _reindex(self):
+        self._stock_pos = {code: i for i, code in enumerate(self.stocks)}
+        self._trader_pos = {code: i for i, code in enumerate(self.traders)}
+        keys = self.pair_stock.astype(np.int64) << 32 | self.pair_trader.astype(np.int64)
+        self._by_stock = np.argsort(keys, kind='stable')
+        self._stock_keys = keys[self._by_stock]
+        self._by_trader = np.lexsort((self.pair_stock, self.pair_trader))
+        self._trader_sorted = self.pair_trader[self._by_trader]
+
+    # ---------- 併入 ----------
+
+    def ingest(self, date, reports, partial=False):
+        """
+        併入一個交易日的券商分點資料
+
+        Args:
+            date: 交易日 'YYYY-MM-DD'；需晚於 last_date
+            reports: 當日券商分點長表（stock_id、securities_trader、securities_trader_id、buy、sell）
+            partial: 是否只有部分股票的資料（記入 partial_dates）
+
+        Returns:
+            bool: 是否併入（已併入過或早於最後併入日時為 False）
+        """
+        if self.last_date is not None and date <= self.last_date:
+            return False
+
+        stock_ids = reports['stock_id'].astype(str).to_numpy()
+        trader_ids = reports['securities_trader_id'].astype(str).to_numpy()
+        stock_codes = _extend(self.stocks, self._stock_pos, stock_ids)
+        new_traders = len(self.traders)
+        trader_codes = _extend(self.traders, self._trader_pos, trader_ids)
+        if len(self.traders) > new_traders:
+            names = dict(zip(trader_ids, reports['securities_trader'].astype(str).to_numpy()))
+            self.trader_names.extend(names.get(code, '') for code in self.traders[new_traders:])
+
+        # 當日各 (股票, 券商) 的淨買賣超：組合鍵排序後逐段加總
+        keys = stock_codes << 32 | trader_codes
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        net = (reports['buy'].to_numpy(dtype=np.int64) - reports['sell'].to_numpy(dtype=np.int64))[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.arange(0)
+        keys, net = keys[starts], np.add.reduceat(net, starts) if len(starts) else net
+
+        # 對應到組合編號，新組合追加在最後
+        found = np.searchsorted(self._stock_keys, keys)
+        found = np.minimum(found, max(len(self._stock_keys) - 1, 0))
+        exists = (self._stock_keys[found] == keys) if len(self._stock_keys) else np.zeros(len(keys), dtype=bool)
+        pairs = np.empty(len(keys), dtype=np.int32)
+        pairs[exists] = self._by_stock[found[exists]]
+        new = keys[~exists]
+        pairs[~exists] = np.arange(len(self.position), len(self.position) + len(new))
+        self.pair_stock = np.concatenate([self.pair_stock, (new >> 32).astype(np.int32)])
+        self.pair_trader = np.concatenate([self.pair_trader, (new & 0xFFFFFFFF).astype(np.int32)])
+        self.position = np.concatenate([self.position, np.zeros(len(new), dtype=np.int64)])
+
+        self.position[pairs] += net
+        self.dates.append(date)
+        if partial:
+            self.partial_dates.append(date)
+        self._days.append((pairs, net))
+        if len(self._days) > self.history_days:
+            self.dates = self.dates[-self.history_days:]
+            self._days = self._days[-self.history_days:]
+        self._reindex()
+        return True
+
+    def sync(self, archive, save=True, verbose=True):
+        """
+        依序併入封存中晚於 last_date 的所有交易日
+
+        未標記完整的交易日：今日（含）以後的停止併入，待當日以 --resume 補抓完成後再接續；
+        過去的交易日已無法在當日接續抓取，以現有的部分資料併入並記入 partial_dates，部位不會因此停滯。
+        已併入的交易日不會重新併入。
+
+        Args:
+            archive: BrokerArchive
+            save: 有併入資料時是否寫入狀態檔
+
+        Returns:
+            list: 本次併入的交易日
+        """
+        added = []
+        for date in archive.dates():
+            if self.last_date is None or date > self.last_date:
+                partial = not archive.is_complete(date)
+                if partial and date >= taipei_today():
+                    if verbose:
+                        print(f"  ⚠ {date} 券商分點資料不完整，暫停併入券商部位")
+                    break
+                self.ingest(date, archive.load_day(date), partial=partial)
+                added.append(date)
+                if verbose and partial:
+                    print(f"  ⚠ 券商部位併入 {date}（部分股票，{len(self.position)} 個券商×股票組合）")
+                elif verbose:
+                    print(f"  ✓ 券商部位併入 {date}（{len(self.position)} 個券商×股票組合）")
+        if added and save:
+            self.save()
+        return added
+
+    # ---------- 查詢 ----------
+
+    def window_net(self, days=None):
+        """
+        各組合最近 days 個交易日的淨買賣超（股）
+
+        Args:
+            days: 交易日數（正整數，不超過保留的天數）；None 表示自開始追蹤以來的累計部位
+
+        Returns:
+            ndarray: 依組合編號
+        """
+        if days is None:
+            return self.position
+        if days <= 0:
+            raise ValueError(f"days 需為正整數: {days}")
+        net = np.zeros(len(self.position), dtype=np.int64)
+        for pairs, values in self._days[-days:]:
+            net[pairs] += values    # 同一日內組合不重複
+        return net
+
+    def _stock_pairs(self, stock_id):
+        i = self._stock_pos.get(str(stock_id))
+        if i is None:
+            return np.arange(0)
+        lo = np.searchsorted(self._stock_keys, i << 32)
+        hi = np.searchsorted(self._stock_keys, (i + 1) << 32)
+        return self._by_stock[lo:hi]
+
+    def _trader_pairs(self, trader_id):
+        i = self._trader_pos.get(str(trader_id))
+        if i is None:
+            return np.arange(0)
+        lo, hi = np.searchsorted(self._trader_sorted, [i, i + 1])
+        return self._by_trader[lo:hi]
+
+    def _ranking(self, pairs, days, n, ascending):
+        net = self.window_net(days)[pairs]
+        order = np.argsort(net if ascending else -net, kind='stable')[:n]
+        pairs = pairs[order]
+        traders = self.pair_trader[pairs]
+        return pd.DataFrame({
+            'stock_id': np.array(self.stocks, dtype=object)[self.pair_stock[pairs]] if len(pairs) else [],
+            'securities_trader_id': np.array(self.traders, dtype=object)[traders] if len(pairs) else [],
+            'securities_trader': np.array(self.trader_names, dtype=object)[traders] if len(pairs) else [],
+            'net': net[order],
+            'net_lots': net[order] // 1000,
+            'position': self.position[pairs],
+        })
+
+    def top_brokers(self, stock_id, days=20, n=15, ascending=False):
+        """
+        單一股票最近 days 日淨買超最多的券商
+
+        Args:
+            stock_id: 股票代碼
+            days: 交易日數；None 表示累計部位
+            n: 筆數
+            ascending: True 時改為淨賣超最多的券商
+
+        Returns:
+            DataFrame: stock_id、securities_trader_id、securities_trader、net（股）、net_lots（張）、position（累計股數）
+        """
+        return self._ranking(self._stock_pairs(stock_id), days, n, ascending)
+
+    def building(self, trader_id, days=20, n=20, ascending=False):
+        """
+        單一券商最近 days 日淨買超最多的股票（欄位同 top_brokers）
+
+        Args:
+            trader_id: 券商代碼（securities_trader_id）
+            days: 交易日數；None 表示累計部位
+            n: 筆數
+            ascending: True 時改為淨賣超最多的股票
+        """
+        return self._ranking(self._trader_pairs(trader_id), days, n, ascending)
@@ -0,0 +1,120 @@
+"""
+族群 × 股票 關聯矩陣
+stock_category.csv 為一對多的（股票, 族群）對應，建成 CSR 稀疏矩陣（列 = 族群、欄 = 股票）後，
+任何以股票為單位的指標（漲跌幅、上漲與否、法人買超金額、成交量…）都能以一次
+稀疏矩陣 × 向量 彙總到所有族群；傳入 (日期 × 股票) 矩陣時一次彙總整段歷史。
+
+只依賴 numpy：矩陣 × 向量以 np.bincount、矩陣 × 矩陣以 np.add.reduceat 計算。
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class CategoryMatrix:
+    """
+    族群 × 股票 的 CSR 關聯矩陣
+
+    權重為該（股票, 族群）在分類檔中出現的次數（重複列會重複計入，與逐列處理的結果一致）；
+    binary=True 時視為集合關係（每檔股票在每個族群最多計一次）。
+
+    Attributes:
+        categories: 族群名稱（依分類檔中首次出現的順序）
+        stocks: 欄位對應的股票代碼（依分類檔中首次出現的順序）
+        indptr: CSR 列指標，第 i 個族群的成員位於 indices[indptr[i]:indptr[i+1]]
+        indices: 成員股票的欄位（同一族群內依分類檔順序，可重複）
+    """
+
+    def __init__(self, pairs):
+        """
+        Args:
+            pairs: [(股票代碼, 族群)...]，保留檔案順序與重複
+        """
+        codes = [code for code, _ in pairs]
+        names = [category for _, category in pairs]
+        cols, stocks = pd.factorize(pd.Series(codes, dtype=object), sort=False)
+        rows, categories = pd.factorize(pd.Series(names, dtype=object), sort=False)
+        self.stocks = list(stocks)
+        self.categories = list(categories)
+        self._index = {code: i for i, code in enumerate(self.stocks)}
+        self._category_index = {name: i for i, name in enumerate(self.categories)}
+
+        order = np.argsort(rows, kind='stable')
+        self.indices = cols[order].astype(np.int64)
+        self._rows = rows[order].astype(np.int64)
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(self.categories)))))
+
+        # 集合關係：同一（族群, 股票）只保留第一次出現
+        key = self._rows * max(len(self.stocks), 1) + self.indices
+        _, first = np.unique(key, return_index=True)
+        self._unique = np.zeros(len(key), dtype=bool)
+        self._unique[first] = True
+
+    @property
+    def shape(self):
+        return len(self.categories), len(self.stocks)
+
+    def pairs(self):
+        """所有（族群列, 股票欄）對應，依族群、再依分類檔順序"""
+        return self._rows, self.indices
+
+    def members(self, category):
+        """族群成員股票代碼（依分類檔順序，可重複）"""
+        i = self._category_index[category]
+        return [self.stocks[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def columns_of(self, stock_ids):
+        """股票代碼 → 欄位（不在任何族群中為 -1）"""
+        return np.array([self._index.get(str(s), -1) for s in stock_ids], dtype=np.int64)
+
+    def align(self, values, fill=np.nan):
+        """
+        將 {股票代碼: 值}（dict 或以股票代碼為 index 的 Series）對齊成欄位向量
+
+        Returns:
+            ndarray: 長度為股票數的 float64 向量，缺少的股票為 fill
+        """
+        out = np.full(len(self.stocks), fill, dtype=np.float64)
+        if isinstance(values, pd.Series):
+            values = values.to_dict()
+        for code, value in values.items():
+            j = self._index.get(str(code))
+            if j is not None:
+                out[j] = value
+        return out
+
+    def dot(self, x, binary=False):
+        """
+        族群彙總：關聯矩陣 × x
+
+        Args:
+            x: 股票向量 (n_stocks,) 或 (n_dates × n_stocks) 矩陣；NaN 視為 0
+            binary: True 時每檔股票在每個族群最多計一次
+
+        Returns:
+            ndarray: (n_categories,) 或 (n_dates × n_categories)
+        """
+        x = np.nan_to_num(np.asarray(x, dtype=np.float64))
+        keep = self._unique if binary else slice(None)
+        rows, cols = self._rows[keep], self.indices[keep]
+        n_categories = len(self.categories)
+        if x.ndim == 1:
+            return np.bincount(rows, weights=x[cols], minlength=n_categories)
+
+        out = np.zeros((x.shape[0], n_categories))
+        if len(cols):
+            # rows 已依族群排序，逐段加總即為各族群合計
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            out[:, rows[starts]] = np.add.reduceat(x[:, cols], starts, axis=1)
+        return out
+
+    def count(self, mask, binary=False):
+        """各族群中 mask 為 True 的成員數"""
+        return self.dot(np.asarray(mask, dtype=np.float64), binary=binary)
+
+    def mean(self, x):
+        """各族群成員（忽略 NaN）的平均值；沒有有效成員的族群為 NaN"""
+        x = np.asarray(x, dtype=np.float64)
+        n = self.count(~np.isnan(x))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(n > 0, self.dot(x) / n, np.nan)
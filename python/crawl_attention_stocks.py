@@ -10,15 +10,18 @@ import time
 import json
 import os
 
+from finmind_client import get_http_session
+from stock_registry import STOCK_LIST_FILE, StockRegistry
+
 class TWSEAttentionStockCrawler:
-    def __init__(self, stock_list_path='../(all)stock_info_list.csv'):
+    def __init__(self, stock_list_path=STOCK_LIST_FILE):
         """
         初始化爬蟲
 
         Args:
             stock_list_path: 股票清單CSV檔案路徑
         """
-        self.base_url = 'https://www.twse.com.tw'
+        self.base_url = os.getenv('TWSE_BASE_URL', 'https://www.twse.com.tw').rstrip('/')
         self.notice_url = f'{self.base_url}/rwd/zh/announcement/notice'
 
         # 讀取有效股票代碼清單
@@ -39,10 +42,8 @@ class TWSEAttentionStockCrawler:
             return None
 
         try:
-            df = pd.read_csv(file_path, encoding='utf-8-sig')
-            # 將股票代碼轉為字串格式，並去除可能的空白
-            stock_codes = df['股票代碼'].astype(str).str.strip().tolist()
-            return set(stock_codes)
+            # 股票代碼已正規化為去除空白的字串
+            return set(StockRegistry.load(file_path, category_file=None).codes)
         except Exception as e:
             print(f"讀取股票清單失敗: {e}，將顯示所有注意股票")
             return None
@@ -74,7 +75,7 @@ class TWSEAttentionStockCrawler:
         print(f"API URL: {self.base_url}/rwd/zh/announcement/notice")
 
         try:
-            response = requests.get(
+            response = get_http_session().get(
                 f'{self.base_url}/rwd/zh/announcement/notice',
                 params=params,
                 headers=self.headers,
@@ -0,0 +1,106 @@
+"""
+逐檔抓取的進度檢查點
+長時間的逐檔抓取（例如全市場券商分點）中途失敗時，下次以 --resume 執行可跳過已完成的股票，
+只重抓失敗與尚未處理的部分，不必重新消耗配額。
+
+檢查點為 JSON 檔，每完成一定數量就以 tmp + os.replace 原子寫入：
+    {"key": "2025-01-02", "done": {"2330": <結果>, ...}, "failed": ["1101", ...]}
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+CHECKPOINT_DIR = os.getenv('CRAWL_CHECKPOINT_DIR', '.cache/checkpoints')
+
+
+def write_atomic(path, write):
+    """
+    以暫存檔 + os.replace 原子寫入檔案，中途失敗不會留下半份檔案
+
+    Args:
+        path: 目標路徑
+        write: 接收暫存檔路徑並寫入內容的函式
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+class CrawlCheckpoint:
+    """
+    逐檔抓取的檢查點
+
+    結果須可 JSON 序列化；查無資料也算完成（結果為 None），失敗則下次重試。
+    """
+
+    def __init__(self, name, key, resume=False, interval=100, root=CHECKPOINT_DIR):
+        """
+        Args:
+            name: 抓取工作名稱（檔名用）
+            key: 本次抓取的識別值（例如資料日期）；不同 key 的檢查點互不沿用
+            resume: True 時載入既有進度，False 時從頭開始
+            interval: 每完成幾檔寫入一次檢查點
+            root: 檢查點目錄
+        """
+        self.path = Path(root) / f"{name}_{key}.json"
+        self.key = key
+        self.interval = max(1, interval)
+        self.done = {}
+        self.failed = set()
+        self._dirty = 0
+        self._lock = threading.Lock()
+        if resume:
+            self._load()
+
+    def _load(self):
+        try:
+            state = json.loads(self.path.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return
+        if state.get('key') == self.key:
+            self.done = state.get('done', {})
+            self.failed = set(state.get('failed', []))
+
+    def pending(self, items):
+        """尚未完成的項目（含上次失敗的），保留原順序"""
+        return [item for item in items if item not in self.done]
+
+    def record(self, item, result):
+        """記錄一檔完成（result 為 None 代表查無資料）"""
+        with self._lock:
+            self.done[item] = result
+            self.failed.discard(item)
+            self._tick()
+
+    def record_failure(self, item):
+        """記錄一檔失敗，下次 resume 時重試"""
+        with self._lock:
+            self.failed.add(item)
+            self._tick()
+
+    def _tick(self):
+        self._dirty += 1
+        if self._dirty >= self.interval:
+            self._flush()
+
+    def flush(self):
+        """立即寫入檢查點"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        state = {'key': self.key, 'done': self.done, 'failed': sorted(self.failed)}
+        write_atomic(self.path, lambda tmp: tmp.write_text(json.dumps(state, ensure_ascii=False), encoding='utf-8'))
+        self._dirty = 0
+
+    def clear(self):
+        """全部完成並輸出結果後刪除檢查點"""
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,243 @@
+"""
+每日技術指標庫
+均線、均量、N 日漲幅、近 5 日高低點等指標原本在強勢股、投信、隔日衝階段1 各自重算；
+改為每個交易日對全市場計算一次，存在日K分區旁：
+    data/store/features/YYYY-MM-DD.npz   該交易日的指標（每列一檔股票）
+    data/store/features/state.npz        滾動狀態：最近 FEATURE_WINDOW 個交易日的日K欄位
+
+更新某日時沿用滾動狀態中內容未變的交易日，只讀取新增或有變動的分區
+（以 npz 內各欄位的 CRC 判斷，不受 git checkout 改變檔案時間影響）。
+指標檔記錄計算時的分區簽章，分區之後被補抓或改寫時自動重算。
+指標庫可由分區重建，不納入版本控制（.gitignore）。
+
+指標的語意是「截至該交易日、最近 FEATURE_WINDOW 個交易日內」的資料，
+回溯序與 price_panel.PricePanel 相同（停牌日不佔位置）。
+"""
+
+import os
+import zipfile
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from market_store import MarketStore
+from price_panel import PricePanel
+from trading_calendar import get_calendar
+
+# 滾動視窗（交易日數）：60MA / 60 日均量，多一日供 N 日漲幅使用
+FEATURE_WINDOW = 60 + 1
+
+PRICE_FIELDS = ('open', 'max', 'min', 'close', 'Trading_Volume')
+
+MA_DAYS = (5, 10, 20, 60)
+VOLUME_MA_DAYS = (5, 20, 60)
+RETURN_DAYS = (1, 3, 5, 10)
+
+
+def partition_signature(path):
+    """
+    分區內容簽章：npz（zip）各成員 CRC 的組合，只讀取 zip 目錄
+
+    Returns:
+        int: 簽章；分區不存在時為 -1
+    """
+    if not os.path.exists(path):
+        return -1
+    with zipfile.ZipFile(path) as z:
+        digest = ';'.join(f"{info.filename}:{info.CRC}:{info.file_size}" for info in z.infolist())
+    return zlib.crc32(digest.encode())
+
+
+class FeatureStore:
+    """每日全市場技術指標的計算與讀寫"""
+
+    def __init__(self, store=None, window=FEATURE_WINDOW):
+        """
+        Args:
+            store: MarketStore，None 則使用預設資料庫
+            window: 滾動視窗（交易日數）
+        """
+        self.store = store or MarketStore()
+        self.root = self.store.root / 'features'
+        self.window = window
+        self._cache = {}
+
+    def _path(self, name):
+        return self.root / f"{name}.npz"
+
+    def _save(self, name, arrays, compressed=True):
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._path(name)
+        tmp = path.with_name(f"{name}.{os.getpid()}.tmp.npz")
+        (np.savez_compressed if compressed else np.savez)(tmp, **arrays)
+        os.replace(tmp, path)
+
+    # ---------- 讀取 ----------
+
+    def get(self, date):
+        """
+        取得該交易日的全市場指標；指標檔不存在或分區已變動時重新計算並寫回
+
+        Args:
+            date: 交易日 'YYYY-MM-DD'
+
+        Returns:
+            DataFrame: 每列一檔股票（依視窗內首次出現的順序），欄位見 compute()；
+                       視窗內沒有任何日K時為空表
+        """
+        calendar = get_calendar()
+        dates = calendar.trading_days(calendar.window_start(date, self.window), date)
+        signatures = np.array(
+            [partition_signature(self.store.root / 'price' / f"{d}.npz") for d in dates], dtype=np.int64
+        )
+        cached = self._cache.get(date)
+        if cached is not None and np.array_equal(cached[0], signatures):
+            return cached[1]
+
+        features = self._read(date, dates, signatures)
+        if features is None:
+            features = self.compute(self._roll(dates, signatures), dates)
+            self._save(date, {
+                'window': np.array(dates, dtype='U'),
+                'signatures': signatures,
+                **{col: self._encode(features[col]) for col in features.columns},
+            })
+        self._cache[date] = (signatures, features)
+        return features
+
+    def _read(self, date, dates, signatures):
+        """讀取指標檔；視窗或分區簽章不符時回傳 None"""
+        path = self._path(date)
+        if not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as z:
+            if z['window'].tolist() != list(dates) or not np.array_equal(z['signatures'], signatures):
+                return None
+            columns = {col: z[col] for col in z.files if col not in ('window', 'signatures')}
+        features = pd.DataFrame(columns)
+        for col in ('stock_id', 'date'):
+            features[col] = features[col].astype(object)
+        return features
+
+    @staticmethod
+    def _encode(values):
+        values = values.to_numpy()
+        return values.astype(str).astype('U') if values.dtype == object else values
+
+    # ---------- 滾動狀態 ----------
+
+    def _roll(self, dates, signatures):
+        """
+        視窗內各交易日的日K欄位：沿用滾動狀態中簽章相同的交易日，其餘讀取分區，並寫回滾動狀態
+
+        Returns:
+            dict: {日期: {欄位: 陣列}}（依 dates 順序；無分區的交易日不出現）
+        """
+        previous = {}
+        path = self._path('state')
+        if path.exists():
+            with np.load(path, allow_pickle=False) as z:
+                state = {col: z[col] for col in z.files}
+            offsets = state['offsets']
+            for i, (d, sig) in enumerate(zip(state['dates'].tolist(), state['signatures'])):
+                rows = slice(offsets[i], offsets[i + 1])
+                previous[d] = (sig, {col: state[col][rows] for col in ('stock_id',) + PRICE_FIELDS})
+
+        days = {}
+        reused = 0
+        for d, sig in zip(dates, signatures):
+            if sig < 0:
+                continue
+            if d in previous and previous[d][0] == sig:
+                days[d] = previous[d][1]
+                reused += 1
+                continue
+            df = self.store.read_day('price', d)
+            days[d] = {'stock_id': df['stock_id'].to_numpy().astype(str).astype('U')}
+            days[d].update({col: df[col].to_numpy() for col in PRICE_FIELDS})
+
+        if reused < len(days):
+            kept = [d for d in dates if d in days]
+            sizes = [len(days[d]['stock_id']) for d in kept]
+            self._save('state', {
+                'dates': np.array(kept, dtype='U'),
+                'signatures': np.array([sig for d, sig in zip(dates, signatures) if d in days], dtype=np.int64),
+                'offsets': np.concatenate(([0], np.cumsum(sizes))).astype(np.int64),
+                **{col: np.concatenate([days[d][col] for d in kept]) if kept else np.array([])
+                   for col in ('stock_id',) + PRICE_FIELDS},
+            }, compressed=False)    # 每次更新都改寫，不壓縮以免壓縮時間蓋過計算本身
+        return days
+
+    # ---------- 計算 ----------
+
+    @staticmethod
+    def compute(days, window=None):
+        """
+        由視窗內各交易日的日K計算全市場指標
+
+        Args:
+            days: {日期: {欄位: 陣列}}，日期遞增
+            window: 視窗的所有交易日（遞增，含無分區的日期）；None 則為 days 的日期
+
+        Returns:
+            DataFrame: stock_id、date（最新一筆的日期）、bars（視窗內筆數）、
+                       最新一筆的 open/max/min/close/volume、
+                       ma{5,10,20,60}、vol_ma{5,20,60}（股）、ret{1,3,5,10}（%）、high10（近10筆最高收盤價）、
+                       bars_5d/high_5d/low_5d（最近 5 個交易日內的筆數、最高價、最低價）、
+                       bars_6d/avg_lots_6d（最近 6 個交易日內的筆數、最近至多 5 筆的平均成交量(張)）；
+                       資料不足的指標為 NaN
+        """
+        dates = list(days)
+        window = list(window) if window is not None else dates
+        if not dates:
+            return pd.DataFrame(columns=['stock_id', 'date', 'bars'])
+        frame = pd.DataFrame({
+            'date': np.repeat(dates, [len(days[d]['stock_id']) for d in dates]),
+            **{col: np.concatenate([days[d][col] for d in dates]) for col in ('stock_id',) + PRICE_FIELDS},
+        })
+        panel = PricePanel(frame, fields=PRICE_FIELDS)
+
+        features = {
+            'stock_id': panel.stocks,
+            'date': panel.date(0),
+            'bars': panel.counts,
+            'open': panel.value('open'),
+            'max': panel.value('max'),
+            'min': panel.value('min'),
+            'close': panel.value('close'),
+            'volume': panel.value('Trading_Volume'),
+        }
+        for n in MA_DAYS:
+            features[f'ma{n}'] = panel.window_mean('close', n)
+        for n in VOLUME_MA_DAYS:
+            features[f'vol_ma{n}'] = panel.window_mean('Trading_Volume', n)
+        for n in RETURN_DAYS:
+            features[f'ret{n}'] = panel.change_pct('close', n)
+        features['high10'] = panel.window_max('close', 10)
+
+        # 短視窗：只看最近 5 / 6 個交易日內的資料
+        recent_dates = panel.recent_dates(6)
+        recent_dates[pd.isna(recent_dates)] = ''
+        in_5d = recent_dates >= window[max(len(window) - 5, 0)]
+        in_6d = recent_dates >= window[max(len(window) - 6, 0)]
+        features['bars_5d'] = in_5d.sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            features['high_5d'] = np.where(in_5d[:5], panel.recent('max', 5), -np.inf).max(axis=0)
+            features['low_5d'] = np.where(in_5d[:5], panel.recent('min', 5), np.inf).min(axis=0)
+        features['high_5d'][features['bars_5d'] == 0] = np.nan
+        features['low_5d'][features['bars_5d'] == 0] = np.nan
+
+        bars_6d = in_6d.sum(axis=0)
+        features['bars_6d'] = bars_6d
+        volume = panel.recent('Trading_Volume', 5)
+        avg_lots = np.full(len(panel), np.nan)
+        # 5 筆以上：最近 5 筆張數的平均（由舊到新累加，與逐檔 np.mean 結果相同）；
+        # 2~4 筆：全部筆數的平均股數換算張數
+        full = bars_6d >= 5
+        avg_lots[full] = (volume[::-1, full] / 1000).mean(axis=0)
+        for n in (2, 3, 4):
+            few = bars_6d == n
+            avg_lots[few] = volume[:n, few].sum(axis=0) / n / 1000
+        features['avg_lots_6d'] = avg_lots
+        return pd.DataFrame(features)
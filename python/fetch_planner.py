@@ -0,0 +1,145 @@
+"""
+FinMind 抓取規劃器
+給定要補齊的 (股票, 日期) 缺格，決定用「單日全市場查詢」或「個股區間查詢」，
+使總請求數最少。
+
+每個請求成本相同（配額以次數計）：
+- 單日全市場查詢：一次補齊該日期的所有缺格
+- 個股區間查詢：一次補齊該股票在任意日期區間的所有缺格
+因此最少請求數 = 缺格二部圖（日期 × 股票）的最小頂點覆蓋，
+依 König 定理由最大匹配求得。
+"""
+
+from collections import defaultdict
+
+
+class FetchPlan:
+    """
+    抓取計畫
+
+    Attributes:
+        dates: 以單日全市場查詢補抓的日期（遞增）
+        stocks: {股票代碼: 需補齊的日期列表}，每檔股票以一次區間查詢補抓
+    """
+
+    def __init__(self, dates=None, stocks=None):
+        self.dates = sorted(dates or [])
+        self.stocks = {s: sorted(d) for s, d in (stocks or {}).items()}
+
+    @property
+    def n_requests(self):
+        """計畫的總請求數"""
+        return len(self.dates) + len(self.stocks)
+
+    def stock_ranges(self):
+        """每檔股票的查詢區間 {股票代碼: (start_date, end_date)}"""
+        return {s: (d[0], d[-1]) for s, d in self.stocks.items()}
+
+    def __repr__(self):
+        return f"FetchPlan(dates={len(self.dates)}, stocks={len(self.stocks)}, requests={self.n_requests})"
+
+
+def _max_matching(adj):
+    """
+    二部圖最大匹配（Kuhn 增廣路徑，迭代版避免遞迴深度限制）
+
+    Args:
+        adj: {左頂點: [右頂點...]}
+
+    Returns:
+        dict: {右頂點: 左頂點}
+    """
+    match_right = {}
+    match_left = {}
+    for root in adj:
+        parent = {}          # 右頂點 -> 經由的左頂點
+        stack = [(root, iter(adj[root]))]
+        seen = set()
+        found = None
+        while stack and found is None:
+            left, neighbors = stack[-1]
+            for right in neighbors:
+                if right in seen:
+                    continue
+                seen.add(right)
+                parent[right] = left
+                if right not in match_right:
+                    found = right
+                    break
+                nxt = match_right[right]
+                stack.append((nxt, iter(adj[nxt])))
+                break
+            else:
+                stack.pop()
+        # 沿增廣路徑翻轉匹配
+        while found is not None:
+            left = parent[found]
+            prev = match_left.get(left)
+            match_right[found] = left
+            match_left[left] = found
+            found = prev
+    return match_right
+
+
+def _min_vertex_cover(adj):
+    """
+    König 定理：由最大匹配求最小頂點覆蓋
+
+    Returns:
+        tuple[set, set]: (被選中的左頂點, 被選中的右頂點)
+    """
+    match_right = _max_matching(adj)
+    matched_left = set(match_right.values())
+
+    # 從未匹配的左頂點出發走交錯路徑（左→右走非匹配邊，右→左走匹配邊）
+    visited_left = {u for u in adj if u not in matched_left}
+    visited_right = set()
+    frontier = list(visited_left)
+    while frontier:
+        left = frontier.pop()
+        for right in adj[left]:
+            if right in visited_right:
+                continue
+            visited_right.add(right)
+            nxt = match_right.get(right)
+            if nxt is not None and nxt not in visited_left:
+                visited_left.add(nxt)
+                frontier.append(nxt)
+
+    return set(adj) - visited_left, visited_right
+
+
+def plan_fetch(missing, bulk=True):
+    """
+    產生最少請求數的抓取計畫
+
+    Args:
+        missing: {日期: 缺少的股票代碼集合}；值為 None 表示該日需要全市場資料
+        bulk: 資料集是否支援不指定 data_id 的單日全市場查詢
+              （例如 TaiwanStockTradingDailyReport 只能逐檔查詢）
+
+    Returns:
+        FetchPlan
+    """
+    if not bulk and any(stocks is None for stocks in missing.values()):
+        raise ValueError("資料集不支援全市場查詢，必須指定股票清單")
+
+    bulk_dates = set()
+    adj = {}
+    for date, stocks in missing.items():
+        if stocks is None:
+            bulk_dates.add(date)
+        elif stocks:
+            adj[date] = sorted(stocks)
+
+    # 覆蓋中的股票恰好是還有日期未被覆蓋的股票，下方直接由缺格推得
+    cover_dates = _min_vertex_cover(adj)[0] if bulk else set()
+
+    per_stock = defaultdict(list)
+    for date, stocks in adj.items():
+        if date in cover_dates:
+            continue
+        for stock in stocks:
+            per_stock[stock].append(date)
+
+    return FetchPlan(dates=bulk_dates | cover_dates, stocks=per_stock)
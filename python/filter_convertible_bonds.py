@@ -7,16 +7,18 @@
 """
 
 import warnings
-import requests
 import pandas as pd
 import os
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from finmind_client import FinMindClient, get_http_session
+from market_store import MarketStore
+from trading_calendar import preflight
+
 warnings.filterwarnings("ignore", message="Unverified HTTPS request")
 
-CBAS_BASE = "https://cbas16889.pscnet.com.tw/api/CbasQuote"
-FINMIND_URL = "https://api.finmindtrade.com/api/v4/data"
+CBAS_BASE = os.getenv("CBAS_BASE_URL", "https://cbas16889.pscnet.com.tw").rstrip("/") + "/api/CbasQuote"
 THRESHOLD = 0.05  # ±5%
 
 CBAS_HEADERS = {
@@ -27,7 +29,7 @@ CBAS_HEADERS = {
 
 
 def fetch_cbas(endpoint: str) -> list[dict]:
-    r = requests.get(f"{CBAS_BASE}/{endpoint}", headers=CBAS_HEADERS, verify=False, timeout=20)
+    r = get_http_session().get(f"{CBAS_BASE}/{endpoint}", headers=CBAS_HEADERS, verify=False, timeout=20)
     r.raise_for_status()
     return r.json()["result"]
 
@@ -36,16 +38,12 @@ def fetch_stock_prices(token: str) -> tuple[str, dict[str, float]] | None:
     date_str = datetime.today().strftime("%Y-%m-%d")
     print(f"  查詢日期：{date_str}")
     try:
-        r = requests.get(
-            FINMIND_URL,
-            params={"dataset": "TaiwanStockPrice", "start_date": date_str, "token": token},
-            timeout=60,
-        )
-        if r.status_code == 200:
-            records = r.json().get("data", [])
-            if records:
-                price_map = {rec["stock_id"]: float(rec["close"]) for rec in records if rec.get("close") is not None}
-                return date_str, price_map
+        store = MarketStore()
+        store.sync("price", [date_str], client=FinMindClient(token=token))
+        df = store.read_day("price", date_str)
+        if df is not None and len(df):
+            df = df.dropna(subset=["close"])
+            return date_str, dict(zip(df["stock_id"], df["close"].astype(float)))
     except Exception as e:
         print(f"  查詢失敗：{e}")
     return None
@@ -60,6 +58,12 @@ def filter_convertible_bonds():
     if not token:
         raise ValueError("請設定環境變數 FINMIND_TOKEN 或在 python/token 放置 token 檔案")
 
+    # ── 預檢：休市或股價尚未公布時不抓取 ──
+    print("預檢交易日...")
+    if not preflight(datetime.today().strftime("%Y-%m-%d"), client=FinMindClient(token=token)):
+        print("  不更新資料")
+        return None
+
     # ── 抓取資料 ──
     print("抓取 CBAS 資料...")
     issued_raw = fetch_cbas("GetIssuedCBSchedule")
@@ -0,0 +1,130 @@
+"""
+FinMind 回應快取
+以 (dataset, data_id, date) 為鍵，將單日查詢結果存到磁碟：
+- 已收盤的過去日期資料不會再變動，永久保存（空結果可能只是尚未公布，不保存）
+- 今日資料可能尚未完整，只保留短暫 TTL，並以總容量上限淘汰最舊項目
+"""
+
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+CACHE_DIR = os.getenv('FINMIND_CACHE_DIR', '.cache/finmind')
+VOLATILE_TTL_SEC = int(os.getenv('FINMIND_CACHE_TTL', '1800'))
+VOLATILE_MAX_BYTES = int(os.getenv('FINMIND_CACHE_MAX_MB', '200')) * 1024 * 1024
+
+# 台灣無夏令時間，固定 UTC+8
+TAIPEI_TZ = timezone(timedelta(hours=8))
+
+
+def taipei_today():
+    """台北時間的今日日期字串 'YYYY-MM-DD'"""
+    return datetime.now(TAIPEI_TZ).strftime('%Y-%m-%d')
+
+
+class ResponseCache:
+    """
+    FinMind 單日查詢結果的磁碟快取
+
+    目錄結構：
+        {root}/permanent/{dataset}/{data_id}/{date}.json.gz   已收盤日期，永久保存
+        {root}/volatile/{dataset}/{data_id}/{date}.json.gz    今日資料，TTL + 容量淘汰
+    data_id 為 None（全市場查詢）時以 '_all' 表示。
+    """
+
+    def __init__(self, root=CACHE_DIR, ttl=VOLATILE_TTL_SEC, max_volatile_bytes=VOLATILE_MAX_BYTES):
+        """
+        Args:
+            root: 快取根目錄
+            ttl: 今日資料的存活秒數
+            max_volatile_bytes: 今日資料區的容量上限（位元組）
+        """
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_volatile_bytes = max_volatile_bytes
+
+    def _path(self, tier, dataset, data_id, date):
+        return self.root / tier / dataset / (str(data_id) if data_id else '_all') / f"{date}.json.gz"
+
+    @staticmethod
+    def _read(path):
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, dataset, data_id, date):
+        """
+        取得快取資料
+
+        Returns:
+            list[dict] | None: 快取的 data 列表（可能為空列表，代表該日無資料）；未命中回傳 None
+        """
+        path = self._path('permanent', dataset, data_id, date)
+        if path.exists():
+            return self._read(path)
+
+        path = self._path('volatile', dataset, data_id, date)
+        try:
+            age = time.time() - path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        if date != taipei_today() or age > self.ttl:
+            path.unlink(missing_ok=True)
+            return None
+        return self._read(path)
+
+    def put(self, dataset, data_id, date, records):
+        """
+        寫入快取；過去日期永久保存，今日（或未來）日期寫入 TTL 區
+
+        過去日期的空結果可能只是資料尚未公布（例如盤後稍晚才更新的資料集），不寫入快取，
+        下次查詢會重新向 API 確認。
+        """
+        if date < taipei_today() and not records:
+            return
+        tier = 'permanent' if date < taipei_today() else 'volatile'
+        path = self._path(tier, dataset, data_id, date)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, path)
+        if tier == 'volatile':
+            self.evict()
+
+    def evict(self):
+        """清除過期的今日資料，並在超過容量上限時從最舊的開始淘汰"""
+        volatile = self.root / 'volatile'
+        if not volatile.exists():
+            return
+        now = time.time()
+        today = taipei_today()
+        entries = []
+        for path in volatile.rglob('*.json.gz'):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.name[:10] != today or now - st.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_volatile_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def default_cache():
+    """依環境變數建立預設快取；FINMIND_CACHE=0 時停用"""
+    if os.getenv('FINMIND_CACHE', '1') == '0':
+        return None
+    return ResponseCache()
@@ -0,0 +1,263 @@
+"""
+FinMind API 共用客戶端
+所有腳本統一透過此模組存取 FinMind：
+- 單一 requests.Session，keep-alive 連線池重複使用 TLS 連線
+- Token bucket 限速（預設 100 req/min），以 lock 檔案在多個程序間共享配額
+- 遇到 402（超過使用上限）自動退避重試
+- 單日查詢經過 finmind_cache 磁碟快取，已收盤日期只需下載一次
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from finmind_cache import default_cache
+from finmind_replay import install_recorder
+
+try:
+    import fcntl
+except ImportError:  # Windows 本地執行：僅做程序內限速
+    fcntl = None
+
+# 可用環境變數指向本地替身伺服器（見 finmind_replay）
+FINMIND_BASE_URL = os.getenv('FINMIND_BASE_URL', 'https://api.finmindtrade.com/api/v4').rstrip('/')
+API_URL = f"{FINMIND_BASE_URL}/data"
+
+# FinMind 上限 100 req/min，可用環境變數調整（例如付費方案）
+RATE_LIMIT_PER_MIN = float(os.getenv('FINMIND_RATE_LIMIT', '100'))
+RATE_LOCK_FILE = os.getenv(
+    'FINMIND_RATE_LOCK', os.path.join(tempfile.gettempdir(), 'finmind_rate.lock')
+)
+
+# 402 = 超過使用上限，退避後重試
+RATE_LIMITED_STATUS = 402
+RATE_LIMITED_BACKOFF_SEC = 30
+RATE_LIMITED_RETRY = 3
+
+
+def load_token(token_file='token'):
+    """
+    讀取 FinMind API Token
+
+    優先使用環境變數 FINMIND_TOKEN（GitHub Actions），其次讀取 token 檔案（本地測試）。
+    會清除空白與控制字元，避免貼上時帶入換行符導致 HTTP header 無效。
+
+    Args:
+        token_file: token 檔案路徑（相對於執行目錄）
+
+    Returns:
+        str: token，找不到時回傳空字串
+    """
+    token = os.getenv('FINMIND_TOKEN', '')
+    if not token.strip() and token_file:
+        try:
+            token = Path(token_file).read_text()
+        except FileNotFoundError:
+            token = ''
+    # 檔案可能是「名稱 token」格式，取最後一段
+    parts = token.strip().split()
+    token = parts[-1] if parts else ''
+    return re.sub(r'[\s\x00-\x1f\x7f]', '', token)
+
+
+class TokenBucket:
+    """
+    跨程序共享的 token bucket 限速器
+
+    狀態（剩餘 token、最後更新時間）存放在 lock 檔案中，
+    每次取用時以 flock 鎖定檔案，同一台機器上的所有腳本共享同一份配額。
+    """
+
+    def __init__(self, rate_per_min=RATE_LIMIT_PER_MIN, capacity=1, lock_file=RATE_LOCK_FILE):
+        """
+        Args:
+            rate_per_min: 每分鐘可發出的請求數
+            capacity: bucket 容量（允許的瞬間突發數），預設 1 表示均勻發送
+            lock_file: 共享狀態的 lock 檔案路徑，None 表示只在程序內限速
+        """
+        self.rate = rate_per_min / 60.0
+        self.capacity = float(capacity)
+        self.lock_file = lock_file if fcntl is not None else None
+        self._thread_lock = threading.Lock()
+        self._state = {'tokens': self.capacity, 'ts': time.time()}
+
+    def _take(self, state):
+        """依經過時間補充 token 後嘗試取用，回傳需等待秒數（0 表示已取得）"""
+        now = time.time()
+        tokens = min(self.capacity, state['tokens'] + (now - state['ts']) * self.rate)
+        if tokens >= 1:
+            state['tokens'], state['ts'] = tokens - 1, now
+            return 0.0
+        state['tokens'], state['ts'] = tokens, now
+        return (1 - tokens) / self.rate
+
+    def _take_shared(self):
+        with open(self.lock_file, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                    state = {'tokens': float(state['tokens']), 'ts': float(state['ts'])}
+                except (ValueError, KeyError, TypeError):
+                    state = {'tokens': self.capacity, 'ts': time.time()}
+                wait = self._take(state)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return wait
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self):
+        """阻塞直到取得一個 token"""
+        while True:
+            with self._thread_lock:
+                if self.lock_file:
+                    wait = self._take_shared()
+                else:
+                    wait = self._take(self._state)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+class FinMindClient:
+    """
+    FinMind API 客戶端
+
+    以持久化的 requests.Session 發送請求，所有請求先經過 TokenBucket 取得配額。
+    可在多執行緒中共用同一個實例。
+    """
+
+    def __init__(self, token=None, api_url=API_URL, rate_limiter=None, pool_size=16, timeout=30,
+                 cache='default'):
+        """
+        Args:
+            token: API token，None 則呼叫 load_token()
+            api_url: 資料 API 位址
+            rate_limiter: TokenBucket 實例，None 則使用預設配額
+            pool_size: 連線池大小（需 >= 同時進行的請求數）
+            timeout: 預設逾時秒數
+            cache: ResponseCache 實例；'default' 依環境變數建立，None 停用快取
+        """
+        self.token = load_token() if token is None else token
+        self.api_url = api_url
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.cache = default_cache() if cache == 'default' else cache
+        self.request_count = 0
+        self.cache_hits = 0
+        self._count_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if self.token:
+            self.session.headers['Authorization'] = f"Bearer {self.token}"
+        install_recorder(self.session)
+
+    def get(self, params, url=None, timeout=None):
+        """
+        發送限速後的 GET 請求
+
+        Args:
+            params: 查詢參數（dataset、data_id、start_date、end_date...）
+            url: 請求位址，None 則使用資料 API
+            timeout: 逾時秒數，None 則使用預設值
+
+        Returns:
+            requests.Response
+        """
+        for attempt in range(RATE_LIMITED_RETRY + 1):
+            self.rate_limiter.acquire()
+            resp = self.session.get(url or self.api_url, params=params, timeout=timeout or self.timeout)
+            with self._count_lock:
+                self.request_count += 1
+            if resp.status_code != RATE_LIMITED_STATUS or attempt == RATE_LIMITED_RETRY:
+                return resp
+            print(f"  ⚠ 超過 API 使用上限 (402)，{RATE_LIMITED_BACKOFF_SEC} 秒後重試...")
+            time.sleep(RATE_LIMITED_BACKOFF_SEC)
+        return resp
+
+    def fetch(self, dataset, data_id=None, start_date=None, end_date=None, timeout=None, **extra):
+        """
+        查詢資料集並回傳解析後的 JSON
+
+        單日查詢（start_date == end_date）會先查磁碟快取，成功的回應寫回快取。
+
+        Returns:
+            dict: API 回應（含 status、msg、data）
+
+        Raises:
+            requests.exceptions.RequestException: 網路錯誤或非 JSON 回應
+        """
+        cacheable = self.cache is not None and not extra and start_date is not None and end_date == start_date
+        if cacheable:
+            records = self.cache.get(dataset, data_id, start_date)
+            if records is not None:
+                with self._count_lock:
+                    self.cache_hits += 1
+                return {'status': 200, 'msg': 'cache', 'data': records}
+
+        params = {'dataset': dataset}
+        if data_id is not None:
+            params['data_id'] = str(data_id)
+        if start_date is not None:
+            params['start_date'] = start_date
+        if end_date is not None:
+            params['end_date'] = end_date
+        params.update(extra)
+        data = self.get(params, timeout=timeout).json()
+
+        if cacheable and isinstance(data, dict) and data.get('status', 200) == 200:
+            self.cache.put(dataset, data_id, start_date, data.get('data') or [])
+        return data
+
+    def fetch_records(self, dataset, data_id=None, start_date=None, end_date=None, timeout=None, **extra):
+        """
+        查詢資料集並回傳 data 欄位的紀錄列表
+
+        Returns:
+            list[dict]: 資料列；API 回應錯誤或無資料時回傳空列表
+        """
+        data = self.fetch(dataset, data_id, start_date, end_date, timeout=timeout, **extra)
+        if not isinstance(data, dict) or data.get('status', 200) != 200:
+            return []
+        return data.get('data') or []
+
+
+_client = None
+_client_lock = threading.Lock()
+_http_session = None
+
+
+def get_client():
+    """取得程序內共用的 FinMindClient（第一次呼叫時建立）"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = FinMindClient()
+        return _client
+
+
+def get_http_session():
+    """取得非 FinMind 來源（TWSE、CBAS）共用的連線池 Session，不做限速"""
+    global _http_session
+    with _client_lock:
+        if _http_session is None:
+            _http_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            _http_session.mount('https://', adapter)
+            _http_session.mount('http://', adapter)
+            install_recorder(_http_session)
+        return _http_session
@@ -0,0 +1,217 @@
+"""
+FinMind / TWSE / CBAS 錄製與重播
+離線執行、效能量測、回歸比對時，以本地替身伺服器重播錄下的回應。
+
+錄製：設定 HTTP_RECORD_DIR 後照常執行腳本，所有經由共用 Session 的回應都會存檔
+（建議同時設定 FINMIND_CACHE=0 並指定空的 MARKET_STORE_DIR，避免請求被快取吸收）
+    HTTP_RECORD_DIR=recordings FINMIND_CACHE=0 python 股票綜合篩選.py
+
+重播：啟動替身伺服器，再把各來源的 base URL 指向它
+    python finmind_replay.py --dir recordings --port 8765 --latency 80 --error-rate 0.01 --rate-limit 100
+    FINMIND_BASE_URL=http://127.0.0.1:8765/finmind/api/v4 \\
+    TWSE_BASE_URL=http://127.0.0.1:8765/twse \\
+    CBAS_BASE_URL=http://127.0.0.1:8765/cbas \\
+    python 股票綜合篩選.py
+
+錄製檔以 (來源, 路徑, 排序後的查詢參數) 為鍵，不含 token。
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+RECORD_DIR = os.getenv('HTTP_RECORD_DIR', '')
+
+# 來源名稱 -> 正式主機
+SERVICES = {
+    'finmind': 'api.finmindtrade.com',
+    'twse': 'www.twse.com.tw',
+    'cbas': 'cbas16889.pscnet.com.tw',
+}
+_HOST_TO_SERVICE = {host: name for name, host in SERVICES.items()}
+
+# 不列入鍵值的查詢參數（認證資訊）
+_SECRET_PARAMS = {'token'}
+
+
+def request_key(service, path, query):
+    """
+    錄製檔的鍵值：來源 + 路徑 + 排序後的查詢參數（去除 token）
+
+    Args:
+        service: 來源名稱（'finmind'、'twse'、'cbas'）
+        path: URL 路徑，例如 '/api/v4/data'
+        query: URL 查詢字串
+    """
+    params = sorted((k, v) for k, v in parse_qsl(query, keep_blank_values=True) if k not in _SECRET_PARAMS)
+    return f"{service} {path}?{urlencode(params)}"
+
+
+def _record_path(root, key):
+    service = key.split(' ', 1)[0]
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+    return Path(root) / service / f"{digest}.json.gz"
+
+
+class Recorder:
+    """requests 的 response hook，把正式來源的回應寫入錄製目錄"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def __call__(self, resp, *args, **kwargs):
+        url = urlsplit(resp.request.url)
+        service = _HOST_TO_SERVICE.get(url.hostname)
+        if service is None or resp.request.method != 'GET':
+            return resp
+        key = request_key(service, url.path, url.query)
+        path = _record_path(self.root, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump({
+                'key': key,
+                'status': resp.status_code,
+                'content_type': resp.headers.get('Content-Type', 'application/json'),
+                'body': resp.text,
+            }, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return resp
+
+
+def install_recorder(session, root=None):
+    """若有設定錄製目錄，為 Session 加上錄製 hook"""
+    root = root or RECORD_DIR
+    if root:
+        session.hooks['response'].append(Recorder(root))
+    return session
+
+
+# ---------- 替身伺服器 ----------
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    重播錄製回應的 HTTP 替身伺服器
+
+    URL 第一段為來源名稱：/finmind/api/v4/data?...、/twse/rwd/...、/cbas/api/CbasQuote/...
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, root, latency_ms=0, jitter_ms=0, error_rate=0.0, rate_limit=0):
+        """
+        Args:
+            address: (host, port)
+            root: 錄製目錄
+            latency_ms: 每個回應的固定延遲（毫秒）
+            jitter_ms: 延遲的隨機抖動上限（毫秒）
+            error_rate: 隨機回傳 500 的機率
+            rate_limit: 每分鐘請求上限，超過回傳 402（0 表示不限制）
+        """
+        super().__init__(address, ReplayHandler)
+        self.root = Path(root)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.stats = {'served': 0, 'missing': 0, 'errors': 0, 'rate_limited': 0}
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def over_limit(self):
+        """以 60 秒滑動視窗判斷是否超過每分鐘上限"""
+        if not self.rate_limit:
+            return False
+        now = time.time()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                return True
+            self._recent.append(now)
+            return False
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """處理替身伺服器的 GET 請求"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        delay = server.latency_ms + random.uniform(0, server.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+
+        if server.over_limit():
+            server.count('rate_limited')
+            return self._send(402, json.dumps({'msg': 'Requests reach the upper limit.', 'status': 402}))
+        if server.error_rate and random.random() < server.error_rate:
+            server.count('errors')
+            return self._send(500, json.dumps({'msg': 'injected error', 'status': 500}))
+
+        url = urlsplit(self.path)
+        service, _, rest = url.path.lstrip('/').partition('/')
+        path = _record_path(server.root, request_key(service, '/' + rest, url.query))
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            server.count('missing')
+            return self._send(404, json.dumps({'msg': 'not recorded', 'status': 404}))
+
+        server.count('served')
+        self._send(record['status'], record['body'], record['content_type'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重播錄製的 FinMind / TWSE / CBAS 回應')
+    parser.add_argument('--dir', default=RECORD_DIR or 'recordings', help='錄製目錄')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0, help='固定延遲（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='延遲隨機抖動上限（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='隨機回傳 500 的機率')
+    parser.add_argument('--rate-limit', type=int, default=0, help='每分鐘請求上限，超過回傳 402')
+    args = parser.parse_args()
+
+    server = ReplayServer((args.host, args.port), args.dir, args.latency, args.jitter,
+                          args.error_rate, args.rate_limit)
+    base = f"http://{args.host}:{args.port}"
+    print(f"✓ 替身伺服器啟動：{base}（錄製目錄 {args.dir}）")
+    print(f"  FINMIND_BASE_URL={base}/finmind/api/v4")
+    print(f"  TWSE_BASE_URL={base}/twse")
+    print(f"  CBAS_BASE_URL={base}/cbas")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\n統計：{server.stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+FinMind 回應的型別化解碼
+依資料集的欄位定義，把 API 回傳的 data 列表逐欄直接寫入預先配置的型別陣列，
+不經過 pd.DataFrame(list_of_dicts) 的 object 欄位與後續反覆 astype：
+- 代碼、名稱類欄位 → category
+- 成交量、股數 → int64（缺值補 0）
+- 價格、比例 → float64 / float32（缺值為 NaN）
+- 日期 → 字串（保留 'YYYY-MM-DD' 字串比較的既有寫法）
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# 資料集 -> {欄位: 型別}；不在定義中的欄位不會解碼
+SCHEMAS = {
+    'TaiwanStockPrice': {
+        'date': 'str',
+        'stock_id': 'category',
+        'Trading_Volume': 'int64',
+        'Trading_money': 'int64',
+        'open': 'float64',
+        'max': 'float64',
+        'min': 'float64',
+        'close': 'float64',
+        'spread': 'float64',
+        'Trading_turnover': 'int64',
+    },
+    'TaiwanStockInstitutionalInvestorsBuySell': {
+        'date': 'str',
+        'stock_id': 'category',
+        'name': 'category',
+        'buy': 'int64',
+        'sell': 'int64',
+    },
+    'TaiwanStockTradingDailyReport': {
+        'date': 'str',
+        'stock_id': 'category',
+        'securities_trader': 'category',
+        'securities_trader_id': 'category',
+        'price': 'float32',
+        'buy': 'int64',
+        'sell': 'int64',
+    },
+    'TaiwanStockHoldingSharesPer': {
+        'date': 'str',
+        'stock_id': 'category',
+        'HoldingSharesLevel': 'category',
+        'people': 'int64',
+        'percent': 'float64',
+        'unit': 'int64',
+    },
+    'taiwan_stock_tick_snapshot': {
+        'date': 'str',
+        'stock_id': 'category',
+        'open': 'float64',
+        'high': 'float64',
+        'low': 'float64',
+        'close': 'float64',
+        'change_price': 'float64',
+        'change_rate': 'float64',
+        'average_price': 'float64',
+        'volume': 'int64',
+        'total_volume': 'int64',
+        'amount': 'int64',
+        'total_amount': 'int64',
+        'yesterday_volume': 'int64',
+        'buy_price': 'float64',
+        'buy_volume': 'float64',
+        'sell_price': 'float64',
+        'sell_volume': 'float64',
+        'volume_ratio': 'float64',
+    },
+}
+
+
+def _to_number(value):
+    """API 偶有字串數字或空字串，轉成 float；無法轉換時為 NaN"""
+    if value is None or value == '':
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def decode_columns(records, schema):
+    """
+    將資料列表逐欄解碼為型別陣列
+
+    Args:
+        records: API 回傳的 data 列表
+        schema: {欄位: 型別}
+
+    Returns:
+        dict: {欄位: numpy 陣列或 Categorical}；資料中不存在的欄位略過
+    """
+    n = len(records)
+    present = records[0].keys() if n else schema.keys()
+    columns = {}
+    for col, dtype in schema.items():
+        if col not in present:
+            continue
+        if dtype in ('str', 'category'):
+            values = np.empty(n, dtype=object)
+            for i, r in enumerate(records):
+                v = r.get(col)
+                values[i] = None if v is None else str(v)
+            columns[col] = pd.Categorical(values) if dtype == 'category' else values
+        else:
+            buf = np.fromiter((_to_number(r.get(col)) for r in records), dtype='float64', count=n)
+            if dtype.startswith('int'):
+                buf = np.nan_to_num(buf, nan=0.0)
+            columns[col] = buf.astype(dtype, copy=False)
+    return columns
+
+
+def decode(records, dataset):
+    """
+    將單一回應的 data 列表解碼成型別正確的 DataFrame
+
+    Args:
+        records: API 回傳的 data 列表
+        dataset: 資料集名稱（SCHEMAS 的鍵）
+    """
+    return pd.DataFrame(decode_columns(records, SCHEMAS[dataset]))
+
+
+def concat_frames(frames):
+    """
+    合併多個解碼後的 DataFrame，category 欄位合併類別而不退化成 object
+
+    Returns:
+        DataFrame | None: 無任何資料時回傳 None
+    """
+    frames = [f for f in frames if f is not None and len(f.columns)]
+    if not frames:
+        return None
+    columns = {}
+    for col in frames[0].columns:
+        parts = [f[col] for f in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[col] = union_categoricals(parts, sort_categories=True)
+        else:
+            columns[col] = np.concatenate([p.to_numpy() for p in parts])
+    return pd.DataFrame(columns)
+
+
+class FrameBuilder:
+    """
+    逐批累積 API 回應並組成單一 DataFrame
+
+    每批回應到達時立即解碼成型別欄位，原始 dict 列表即可釋放，
+    不必先把全部回應 extend 成一個大列表。
+    """
+
+    def __init__(self, dataset):
+        """
+        Args:
+            dataset: 資料集名稱（SCHEMAS 的鍵）
+        """
+        self.dataset = dataset
+        self._chunks = []
+        self.rows = 0
+
+    def add(self, records):
+        """解碼一批資料列"""
+        if records:
+            self._chunks.append(decode(records, self.dataset))
+            self.rows += len(records)
+
+    def frame(self):
+        """合併已解碼的批次；沒有資料時回傳 None"""
+        return concat_frames(self._chunks)
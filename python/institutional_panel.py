@@ -0,0 +1,89 @@
+"""
+法人買賣超面板
+將法人買賣超長表（每列一檔一日一類法人）一次轉成 (回溯序 × 股票 × 法人) 的淨買超陣列，
+所有股票、所有法人的 1/3/5 日買超與買超天數一次算出，
+取代逐檔「篩選 → copy → 排序 → head(n)」的統計方式。
+
+回溯序的語意與 price_panel.PricePanel 相同：第 k 列是該股票該類法人的倒數第 k+1 筆。
+"""
+
+import numpy as np
+import pandas as pd
+
+from price_panel import lag_index
+
+INVESTORS = ('Foreign_Investor', 'Investment_Trust')
+
+
+class InstitutionalPanel:
+    """
+    (回溯序 × 股票 × 法人) 淨買超面板（股數，int64；不足的位置補 0）
+
+    Attributes:
+        stocks: 股票代碼（依長表中首次出現的順序）
+        investors: 法人類別
+        counts: (股票 × 法人) 的資料筆數
+    """
+
+    def __init__(self, inst_df, investors=INVESTORS):
+        """
+        Args:
+            inst_df: 法人買賣超長表（date、stock_id、name、buy、sell）
+            investors: 要放入面板的法人類別，其他類別的列略過
+        """
+        stock_codes, stocks = pd.factorize(inst_df['stock_id'], sort=False)
+        date_codes, _ = pd.factorize(inst_df['date'], sort=True)
+        investor_codes = pd.Categorical(inst_df['name'], categories=list(investors)).codes
+        self.stocks = [str(s) for s in stocks]
+        self.investors = list(investors)
+        self._index = {code: i for i, code in enumerate(self.stocks)}
+
+        keep = investor_codes >= 0
+        n_stocks, n_investors = len(self.stocks), len(self.investors)
+        groups = stock_codes[keep] * n_investors + investor_codes[keep]
+        order, lag, counts = lag_index(groups, date_codes[keep], n_stocks * n_investors)
+        self.counts = counts.reshape(n_stocks, n_investors)
+
+        net = (inst_df['buy'].to_numpy(dtype=np.int64) - inst_df['sell'].to_numpy(dtype=np.int64))[keep]
+        depth = int(counts.max()) if len(counts) else 0
+        self._net = np.zeros((depth, n_stocks * n_investors), dtype=np.int64)
+        self._net[lag, groups[order]] = net[order]
+        self._net = self._net.reshape(depth, n_stocks, n_investors)
+
+    def __len__(self):
+        return len(self.stocks)
+
+    def position(self, stock_id):
+        """股票代碼 → 面板位置；不在面板中回傳 None"""
+        return self._index.get(stock_id)
+
+    def count(self, investor):
+        """各股票該類法人的資料筆數"""
+        return self.counts[:, self.investors.index(investor)]
+
+    def head_net(self, investor, n):
+        """各股票最近 n 筆的淨買超合計（股數；不足 n 筆時為現有筆數的合計）"""
+        return self._net[:n, :, self.investors.index(investor)].sum(axis=0)
+
+    def head_buy_days(self, investor, n):
+        """各股票最近 n 筆中淨買超 > 0 的天數"""
+        return (self._net[:n, :, self.investors.index(investor)] > 0).sum(axis=0)
+
+    def stats(self, investor):
+        """
+        各股票的買賣超統計（張數，小數無條件捨去至整數；筆數不足時為 0）
+
+        Returns:
+            dict: {'day1_net', 'day3_net', 'day5_net', 'day5_buy_days'}，每項為對齊 stocks 的 int64 陣列
+        """
+        count = self.count(investor)
+
+        def lots(n):
+            return np.where(count >= n, np.trunc(self.head_net(investor, n) / 1000), 0).astype(np.int64)
+
+        return {
+            'day1_net': lots(1),
+            'day3_net': lots(3),
+            'day5_net': lots(5),
+            'day5_buy_days': np.where(count >= 5, self.head_buy_days(investor, 5), 0),
+        }
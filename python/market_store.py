@@ -0,0 +1,300 @@
+"""
+本地全市場日資料庫
+每個交易日一個壓縮的欄式分區（.npz），只追加不改寫：
+    data/store/price/YYYY-MM-DD.npz           日K（OHLCV）
+    data/store/institutional/YYYY-MM-DD.npz   三大法人買賣超
+
+各腳本先讀本地分區，只向 FinMind 補抓缺少的 (股票, 日期)，由 fetch_planner 決定查詢方式。
+單日全市場查詢寫成完整分區；個股查詢寫成部分分區，並記錄已查詢過的股票。
+今日（含）以後寫入的分區可能是尚未公布完整的資料，標記為暫時分區（provisional）：
+之後每次都視為缺少而重新補抓（經回應快取的 TTL 節流），直到該日收盤後重新抓取覆寫為止。
+"""
+
+import os
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from finmind_cache import taipei_today
+from fetch_planner import plan_fetch
+from finmind_client import get_client
+from finmind_schema import SCHEMAS as DATASET_SCHEMAS, concat_frames, decode_columns
+from trading_calendar import get_calendar
+
+STORE_DIR = os.getenv(
+    'MARKET_STORE_DIR', '../data/store' if os.path.exists('../data') else 'data/store'
+)
+
+# 個股查詢結果寫入分區的間隔（檔數）
+STOCK_FLUSH_EVERY = 100
+
+# coverage() 的回傳值：全市場完整分區
+ALL = 'ALL'
+
+# kind -> (FinMind 資料集, {欄位: 型別})；型別沿用 finmind_schema，date 存在檔名中
+SCHEMAS = {
+    kind: (dataset, {col: dtype for col, dtype in DATASET_SCHEMAS[dataset].items() if col != 'date'})
+    for kind, dataset in (
+        ('price', 'TaiwanStockPrice'),
+        ('institutional', 'TaiwanStockInstitutionalInvestorsBuySell'),
+    )
+}
+
+
+class MarketStore:
+    """全市場日資料分區的讀寫"""
+
+    def __init__(self, root=STORE_DIR):
+        """
+        Args:
+            root: 資料庫根目錄
+        """
+        self.root = Path(root)
+
+    def _path(self, kind, date):
+        return self.root / kind / f"{date}.npz"
+
+    # ---------- 分區 ----------
+
+    def has_day(self, kind, date):
+        """該交易日分區是否已存在（完整或部分）"""
+        return self._path(kind, date).exists()
+
+    def dates(self, kind):
+        """已儲存的交易日（遞增）"""
+        folder = self.root / kind
+        if not folder.exists():
+            return []
+        return sorted(p.stem for p in folder.glob('*.npz'))
+
+    def coverage(self, kind, date):
+        """
+        查詢單日分區涵蓋的股票
+
+        Returns:
+            ALL: 全市場完整分區
+            frozenset: 部分分區（個股查詢寫入）已查詢過的股票代碼
+            None: 無分區或暫時分區（今日以後、或在當日寫入而可能不完整的分區）
+        """
+        path = self._path(kind, date)
+        if date >= taipei_today() or not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as z:
+            if 'provisional' in z.files:
+                return None
+            if 'covered' not in z.files:
+                return ALL
+            return frozenset(z['covered'].tolist())
+
+    def missing_days(self, kind, dates):
+        """dates 中沒有全市場完整分區的交易日"""
+        return [d for d in dates if self.coverage(kind, d) is not ALL]
+
+    def missing_cells(self, kind, dates, stocks=None):
+        """
+        找出尚未儲存的 (股票, 日期) 缺格
+
+        Args:
+            dates: 交易日列表
+            stocks: 需要的股票代碼；None 表示需要全市場
+
+        Returns:
+            dict: {日期: 缺少的股票集合}；需要全市場的日期值為 None
+        """
+        wanted = None if stocks is None else {str(s) for s in stocks}
+        missing = {}
+        for date in dates:
+            covered = self.coverage(kind, date)
+            if covered is ALL:
+                continue
+            if wanted is None:
+                missing[date] = None
+            else:
+                lacking = wanted - (covered or frozenset())
+                if lacking:
+                    missing[date] = lacking
+        return missing
+
+    def write_day(self, kind, date, records, covered=None):
+        """
+        寫入單日分區（覆寫同日舊分區）
+
+        Args:
+            kind: 'price' 或 'institutional'
+            date: 交易日 'YYYY-MM-DD'
+            records: API 回傳的資料列表或 DataFrame
+            covered: 部分分區已查詢過的股票代碼；None 表示全市場完整分區
+        """
+        _, schema = SCHEMAS[kind]
+        if isinstance(records, pd.DataFrame):
+            columns = {col: records[col] for col in schema}
+        else:
+            columns = decode_columns(records, schema)
+        arrays = {}
+        for col, dtype in schema.items():
+            values = columns[col]
+            if dtype in ('str', 'category'):
+                arrays[col] = np.asarray(values, dtype=object).astype(str).astype('U')
+            else:
+                values = pd.to_numeric(pd.Series(values), errors='coerce')
+                if dtype.startswith('int'):
+                    values = values.fillna(0)
+                arrays[col] = values.to_numpy(dtype=dtype)
+        if covered is not None:
+            arrays['covered'] = np.array(sorted(covered), dtype='U')
+        if date >= taipei_today():
+            # 當日寫入的資料可能尚未公布完整，收盤後需重新抓取
+            arrays['provisional'] = np.array(True)
+
+        path = self._path(kind, date)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{date}.{os.getpid()}.tmp.npz")
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+
+    def merge_day(self, kind, date, records, covered):
+        """
+        將個股查詢結果併入單日部分分區；已是完整分區時不做任何事
+
+        Args:
+            records: 這些股票在該日的資料列（查無資料的股票可不出現）
+            covered: 本次查詢過的股票代碼
+        """
+        existing = self.coverage(kind, date)
+        if existing is ALL:
+            return
+        df = pd.DataFrame(decode_columns(records, SCHEMAS[kind][1]))
+        if existing:
+            old = self.read_day(kind, date).drop(columns='date')
+            old = old[~old['stock_id'].isin(covered)]
+            df = concat_frames([old, df])
+        self.write_day(kind, date, df, covered=set(covered) | set(existing or ()))
+
+    def read_day(self, kind, date):
+        """讀取單日分區，回傳含 date 欄位的 DataFrame；不存在時回傳 None"""
+        path = self._path(kind, date)
+        if not path.exists():
+            return None
+        columns = {}
+        with np.load(path, allow_pickle=False) as z:
+            for col, dtype in SCHEMAS[kind][1].items():
+                if dtype == 'category':
+                    columns[col] = pd.Categorical(z[col].astype(object))
+                elif dtype == 'str':
+                    columns[col] = z[col].astype(object)
+                else:
+                    columns[col] = z[col]
+        df = pd.DataFrame(columns)
+        df.insert(0, 'date', date)
+        return df
+
+    # ---------- 補抓 ----------
+
+    def ensure(self, kind, dates, stocks=None, client=None, verbose=True):
+        """
+        補齊 dates × stocks 中缺少的資料
+
+        以 fetch_planner 決定每個缺格用單日全市場查詢或個股區間查詢，使請求數最少。
+        全市場查詢結果寫成完整分區，個股查詢結果併入部分分區。
+        查無資料的全市場日期（例如今日尚未公布）不寫入，下次執行會再補抓。
+
+        Args:
+            kind: 'price' 或 'institutional'
+            dates: 交易日列表
+            stocks: 需要的股票代碼；None 表示全市場
+            client: FinMindClient，None 則使用共用客戶端
+            verbose: 是否列印補抓進度
+
+        Returns:
+            FetchPlan: 執行的抓取計畫
+        """
+        dataset, _ = SCHEMAS[kind]
+        client = client or get_client()
+        missing = self.missing_cells(kind, dates, stocks)
+        plan = plan_fetch(missing)
+        if verbose and plan.n_requests:
+            print(f"  本地缺少 {len(missing)}/{len(dates)} 個交易日的 {dataset}，"
+                  f"規劃 {plan.n_requests} 次請求（全市場 {len(plan.dates)} 日、個股 {len(plan.stocks)} 檔）")
+
+        for date in plan.dates:
+            data = self._fetch(client, dataset, None, date, date)
+            if data is None:
+                continue
+            if kind == 'price':
+                get_calendar().observe(date, bool(data))
+            if data:
+                self.write_day(kind, date, data)
+
+        # 個股結果每 STOCK_FLUSH_EVERY 檔併入分區一次，中斷後重新執行只會補抓尚未寫入的股票
+        rows = defaultdict(list)
+        covered = defaultdict(set)
+        for i, (stock, (start, end)) in enumerate(plan.stock_ranges().items(), 1):
+            data = self._fetch(client, dataset, stock, start, end)
+            if data is not None:
+                wanted = set(plan.stocks[stock])
+                for date in wanted:
+                    covered[date].add(stock)
+                for r in data:
+                    if r.get('date') in wanted:
+                        rows[r['date']].append(r)
+            if covered and (i % STOCK_FLUSH_EVERY == 0 or i == len(plan.stocks)):
+                for date, stocks_done in covered.items():
+                    self.merge_day(kind, date, rows[date], stocks_done)
+                rows.clear()
+                covered.clear()
+        return plan
+
+    @staticmethod
+    def _fetch(client, dataset, data_id, start, end):
+        """發送單一查詢；失敗時列印警告並回傳 None，成功回傳資料列表"""
+        label = f"日期: {start}" if data_id is None else f"股票: {data_id}"
+        try:
+            data = client.fetch(dataset, data_id=data_id, start_date=start, end_date=end, timeout=10)
+        except Exception as e:
+            print(f"  ⚠ API 請求失敗 ({label}): {str(e)}")
+            return None
+        if data.get('status', 200) != 200:
+            print(f"  ⚠ API 錯誤 ({label}): {data.get('msg', 'Unknown error')}")
+            return None
+        return data.get('data') or []
+
+    def sync(self, kind, dates, client=None, verbose=True):
+        """補齊 dates 的全市場完整分區（ensure 的全市場版本）"""
+        return self.ensure(kind, dates, client=client, verbose=verbose)
+
+    # ---------- 讀取 ----------
+
+    def load_window(self, kind, dates):
+        """
+        讀取多個交易日，合併成與 API 回應相同欄位的長表
+        （stock_id、name 為 category，數值欄位為 int64 / float64）
+
+        Returns:
+            DataFrame | None: 無任何分區時回傳 None
+        """
+        return concat_frames(self.read_day(kind, d) for d in dates)
+
+    def panel(self, field, dates, kind='price', stocks=None, investor=None):
+        """
+        取得 (date × stock) 面板
+
+        Args:
+            field: 欄位名稱，例如 'close'、'Trading_Volume'、'buy'
+            dates: 交易日列表
+            kind: 分區種類
+            stocks: 只保留的股票代碼（None 表示全部）
+            investor: kind='institutional' 時的法人別，例如 'Foreign_Investor'
+
+        Returns:
+            DataFrame: index 為日期、columns 為股票代碼，缺值為 NaN
+        """
+        df = self.load_window(kind, dates)
+        if df is None:
+            return pd.DataFrame(index=pd.Index(dates, name='date'))
+        if stocks is not None:
+            df = df[df['stock_id'].isin(stocks)]
+        if investor is not None:
+            df = df[df['name'] == investor]
+        return df.pivot(index='date', columns='stock_id', values=field).reindex(dates)
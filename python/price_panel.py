@@ -0,0 +1,186 @@
+"""
+日K線面板
+將長表（每列一檔一日）轉成 (回溯序 × 股票) 的 NumPy 面板，一次計算所有股票的指標，
+取代「逐檔篩選 DataFrame → 排序 → head(n)」的迴圈。
+
+面板第 k 列是各股票「倒數第 k+1 筆」資料（第 0 列為各自最新一筆），
+與原本每檔依日期遞減排序後 head(n) / iloc[k] 的語意相同：停牌日不佔位置。
+移動平均等視窗統計以累積和相減取得，每個欄位只累加一次。
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def lag_index(group_codes, date_codes, n_groups):
+    """
+    計算長表每列在所屬群組中的回溯序（最新一筆為 0）
+
+    Args:
+        group_codes: 各列的群組編號（0..n_groups-1）
+        date_codes: 各列的日期編號（越大越新）
+        n_groups: 群組數
+
+    Returns:
+        tuple: (排序索引 order, 排序後各列的回溯序 lag, 各群組筆數 counts)
+    """
+    counts = np.bincount(group_codes, minlength=n_groups)
+    # 依 (群組, 日期遞減) 排序後，每列在所屬群組中的位置即為回溯序
+    order = np.lexsort((-date_codes, group_codes))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    lag = np.arange(len(order)) - starts[group_codes[order]]
+    return order, lag, counts
+
+
+class PricePanel:
+    """
+    (回溯序 × 股票) 面板
+
+    Attributes:
+        stocks: 股票代碼（依長表中首次出現的順序）
+        counts: 各股票的資料筆數
+        dates: 長表中的所有日期（遞增）
+    """
+
+    def __init__(self, price_df, fields=('close', 'open', 'Trading_Volume')):
+        """
+        Args:
+            price_df: 日K線長表（至少含 date、stock_id 與 fields）
+            fields: 要放入面板的數值欄位
+        """
+        stock_codes, stocks = pd.factorize(price_df['stock_id'], sort=False)
+        date_codes, dates = pd.factorize(price_df['date'], sort=True)
+        order, lag, counts = lag_index(stock_codes, date_codes, len(stocks))
+        self._build(
+            [str(s) for s in stocks], dates, counts,
+            stock_codes[order], lag, date_codes[order],
+            {field: price_df[field].to_numpy()[order] for field in fields},
+        )
+
+    @classmethod
+    def from_sorted(cls, stocks, dates, counts, date_codes, columns):
+        """
+        由已依 (股票, 日期遞增) 排序的資料建立面板，不需再排序（供 StockIndex 使用）
+
+        Args:
+            stocks: 股票代碼，依資料中的分組順序
+            dates: 所有日期（遞增）
+            counts: 各股票的資料筆數
+            date_codes: 各列的日期編號（dates 的位置）
+            columns: {欄位: 依相同順序排列的數值陣列}
+        """
+        counts = np.asarray(counts)
+        groups = np.repeat(np.arange(len(stocks)), counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        lag = counts[groups] - 1 - (np.arange(len(groups)) - starts[groups])
+        panel = cls.__new__(cls)
+        panel._build(list(stocks), dates, counts, groups, lag, date_codes, columns)
+        return panel
+
+    def _build(self, stocks, dates, counts, groups, lag, date_codes, columns):
+        self.stocks = stocks
+        self.dates = np.asarray(dates, dtype=object)
+        self.counts = counts
+        self._index = {code: i for i, code in enumerate(self.stocks)}
+
+        n_stocks = len(self.stocks)
+        depth = int(counts.max()) if n_stocks else 0
+        self._date_codes = np.full((depth, n_stocks), -1, dtype=np.int64)
+        self._date_codes[lag, groups] = date_codes
+
+        self._values = {}
+        for field, values in columns.items():
+            panel = np.zeros((depth, n_stocks), dtype=values.dtype)
+            panel[lag, groups] = values
+            self._values[field] = panel
+        self._cumsums = {}
+
+    def __len__(self):
+        return len(self.stocks)
+
+    def position(self, stock_id):
+        """股票代碼 → 面板欄位；不在面板中回傳 None"""
+        return self._index.get(stock_id)
+
+    def has(self, n):
+        """資料筆數至少 n 筆的股票（布林陣列）"""
+        return self.counts >= n
+
+    def date(self, lag=0):
+        """各股票倒數第 lag+1 筆的日期（不足時為 None）"""
+        codes = self._date_codes[lag] if lag < len(self._date_codes) else np.full(len(self), -1)
+        out = np.empty(len(self), dtype=object)
+        valid = codes >= 0
+        out[valid] = self.dates[codes[valid]]
+        return out
+
+    def value(self, field, lag=0):
+        """各股票倒數第 lag+1 筆的欄位值（float64，不足時為 NaN）"""
+        out = np.full(len(self), np.nan)
+        if lag < len(self._date_codes):
+            valid = self.has(lag + 1)
+            out[valid] = self._values[field][lag, valid]
+        return out
+
+    def recent(self, field, k):
+        """最近 k 筆（k × 股票），第 j 列為倒數第 j+1 筆（float64，不足時為 NaN）"""
+        out = np.full((k, len(self)), np.nan)
+        depth = min(k, len(self._date_codes))
+        valid = np.arange(depth)[:, None] < self.counts
+        out[:depth][valid] = self._values[field][:depth][valid]
+        return out
+
+    def recent_dates(self, k):
+        """最近 k 筆的日期（k × 股票，不足時為 None）"""
+        out = np.empty((k, len(self)), dtype=object)
+        depth = min(k, len(self._date_codes))
+        codes = self._date_codes[:depth]
+        valid = codes >= 0
+        out[:depth][valid] = self.dates[codes[valid]]
+        return out
+
+    def _cumsum(self, field):
+        if field not in self._cumsums:
+            panel = self._values[field]
+            zero = np.zeros((1, panel.shape[1]), dtype=panel.dtype)
+            self._cumsums[field] = np.concatenate((zero, np.cumsum(panel, axis=0)))
+        return self._cumsums[field]
+
+    def window_sum(self, field, n, lag=0):
+        """回溯序 [lag, lag+n) 的合計（資料不足的股票為 NaN）"""
+        out = np.full(len(self), np.nan)
+        if lag + n <= len(self._date_codes):
+            csum = self._cumsum(field)
+            valid = self.has(lag + n)
+            out[valid] = csum[lag + n, valid] - csum[lag, valid]
+        return out
+
+    def window_mean(self, field, n, lag=0):
+        """回溯序 [lag, lag+n) 的平均（即 n 日移動平均）"""
+        return self.window_sum(field, n, lag) / n
+
+    def rolling_mean(self, field, n, k):
+        """最近 k 個位置的 n 筆移動平均（k × 股票），第 j 列等同 window_mean(field, n, lag=j)"""
+        out = np.full((k, len(self)), np.nan)
+        depth = min(k, len(self._date_codes) - n + 1)
+        if depth > 0:
+            csum = self._cumsum(field)
+            valid = np.arange(n, n + depth)[:, None] <= self.counts
+            sums = csum[n:n + depth] - csum[:depth]
+            out[:depth][valid] = sums[valid] / n
+        return out
+
+    def window_max(self, field, n, lag=0):
+        """回溯序 [lag, lag+n) 的最大值"""
+        out = np.full(len(self), np.nan)
+        if lag + n <= len(self._date_codes):
+            valid = self.has(lag + n)
+            out[valid] = self._values[field][lag:lag + n, valid].max(axis=0)
+        return out
+
+    def change_pct(self, field, days):
+        """最新一筆相對倒數第 days+1 筆的漲跌幅(%)；基期為 0 時為 NaN"""
+        latest = self.value(field, 0)
+        past = self.value(field, days)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(past != 0, (latest - past) / past * 100, np.nan)
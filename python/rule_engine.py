@@ -0,0 +1,152 @@
+"""
+宣告式篩選規則
+每個策略定義為一組具名的向量化條件（Rule），條件以欄位名稱寫成運算式，
+門檻值以參數名稱引用（例如 'total_volume >= min_lots'），不再寫死在各函數中。
+
+RuleSet.evaluate() 依實測的通過率與成本調整條件順序：
+越便宜、越能篩掉資料的條件越先執行，之後的條件只對仍存活的列計算。
+所有條件皆為 AND，結果與依定義順序逐一篩選相同（列順序亦保持不變）。
+"""
+
+import time
+
+import numpy as np
+
+# 尚未量測過的條件先以抽樣估計通過率與成本
+SAMPLE_ROWS = 256
+
+
+class Rule:
+    """
+    具名條件
+
+    Attributes:
+        label: 條件說明，可引用參數（例如 '量>={min_lots}張'）
+        expr: 運算式，名稱依序解析為欄位、參數、np
+        evaluated: 累計計算的列數
+        passed: 累計通過的列數
+        seconds: 累計計算時間
+    """
+
+    def __init__(self, label, expr):
+        self.label = label
+        self.expr = expr
+        self._code = compile(expr, f"<rule {label}>", 'eval')
+        self.evaluated = 0
+        self.passed = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return f"Rule({self.label!r}, {self.expr!r})"
+
+    @property
+    def pass_rate(self):
+        """實測通過率；未量測時為 None"""
+        return self.passed / self.evaluated if self.evaluated else None
+
+    @property
+    def rank(self):
+        """排序依據：每列成本 / 篩除率，越小越先執行"""
+        cost = self.seconds / self.evaluated
+        return cost / max(1 - self.pass_rate, 1e-6)
+
+    def apply(self, columns, params, n):
+        """
+        對 columns 的列計算條件並累計統計
+
+        Returns:
+            ndarray: 長度 n 的布林陣列
+        """
+        start = time.perf_counter()
+        result = eval(self._code, {'__builtins__': {}, 'np': np, **params}, columns)
+        result = np.broadcast_to(np.asarray(result, dtype=bool), (n,))
+        self.seconds += time.perf_counter() - start
+        self.evaluated += n
+        self.passed += int(result.sum())
+        return result
+
+
+class _Columns:
+    """只取出存活列的欄位（第一次引用時才切片並快取）"""
+
+    def __init__(self, table, rows):
+        self._table = table
+        self._rows = rows
+        self._cache = {}
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            if name not in self._table:
+                raise KeyError(name)
+            self._cache[name] = np.asarray(self._table[name])[self._rows]
+        return self._cache[name]
+
+
+class RuleSet:
+    """
+    一個策略的所有條件
+
+    Attributes:
+        name: 策略名稱
+        rules: 條件（定義順序）
+        params: 預設參數
+        funnel: 最近一次 evaluate 的 [(條件說明, 計算前列數, 通過列數)...]（執行順序）
+    """
+
+    def __init__(self, name, rules, params=None, adaptive=True):
+        """
+        Args:
+            name: 策略名稱
+            rules: [Rule...] 或 [(label, expr)...]
+            params: 運算式引用的參數預設值
+            adaptive: 是否依實測通過率與成本調整執行順序
+        """
+        self.name = name
+        self.rules = [r if isinstance(r, Rule) else Rule(*r) for r in rules]
+        self.params = dict(params or {})
+        self.adaptive = adaptive
+        self.funnel = []
+
+    def _order(self, table, n, params):
+        """條件執行順序；未量測過的條件先以抽樣估計"""
+        if not self.adaptive:
+            return list(self.rules)
+        sample = np.linspace(0, n - 1, min(n, SAMPLE_ROWS)).astype(np.int64) if n else np.arange(0)
+        for rule in self.rules:
+            if rule.evaluated == 0 and len(sample):
+                rule.apply(_Columns(table, sample), params, len(sample))
+        return sorted(self.rules, key=lambda r: r.rank if r.evaluated else 0.0)
+
+    def evaluate(self, table, verbose=True, indent='  ', **params):
+        """
+        計算所有條件
+
+        Args:
+            table: DataFrame 或 {欄位: 陣列}
+            verbose: 是否列印各條件的篩選漏斗
+            indent: 漏斗的縮排
+            **params: 覆寫預設參數
+
+        Returns:
+            ndarray: 通過所有條件的布林陣列（對齊 table 的列）
+        """
+        params = {**self.params, **params}
+        n = len(table) if hasattr(table, 'columns') else len(next(iter(table.values()), ()))
+        alive = np.arange(n)
+        self.funnel = []
+        for rule in self._order(table, n, params):
+            before = len(alive)
+            if before:
+                alive = alive[rule.apply(_Columns(table, alive), params, before)]
+            label = rule.label.format(**params)
+            self.funnel.append((label, before, len(alive)))
+            if verbose:
+                print(f"{indent}✅ {label}: {len(alive)} 檔符合 (篩掉 {before - len(alive)} 檔)")
+
+        mask = np.zeros(n, dtype=bool)
+        mask[alive] = True
+        return mask
+
+    def filter(self, df, verbose=True, indent='  ', **params):
+        """篩選 DataFrame，保留通過所有條件的列（順序不變）"""
+        return df[self.evaluate(df, verbose=verbose, indent=indent, **params)]
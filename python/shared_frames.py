@@ -0,0 +1,136 @@
+"""
+共享記憶體 DataFrame 與平行執行
+資料載入後將長表的每個欄位放入 multiprocessing.shared_memory 一次，
+工作行程以欄位名稱附掛成零複製的 numpy view 重建 DataFrame，不需序列化整張表。
+
+字串欄位以 (代碼陣列, 標籤) 存放：代碼在共享記憶體中，只有少量的標籤隨規格傳遞；
+category 欄位在工作行程中以相同代碼重建為 category（零複製）。
+
+各工作的列印輸出先收集起來，完成後依提交順序列印，避免多個行程的輸出交錯。
+"""
+
+import contextlib
+import io
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# 工作行程中附掛的 DataFrame 與共享記憶體區塊（區塊需保留到行程結束，view 才有效）
+_FRAMES = {}
+_BLOCKS = []
+
+
+class SharedFrame:
+    """
+    放在共享記憶體中的 DataFrame
+
+    Attributes:
+        spec: 可傳給其他行程的規格（列數與各欄位的區塊名稱、型別、標籤）
+    """
+
+    def __init__(self, df):
+        """
+        Args:
+            df: 要共享的 DataFrame（數值、字串或 category 欄位）
+        """
+        self._blocks = []
+        columns = []
+        for col in df.columns:
+            values = df[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                kind, labels = 'category', list(values.cat.categories)
+                array = values.cat.codes.to_numpy()
+            elif values.dtype == object:
+                codes, uniques = pd.factorize(values)
+                kind, labels = 'object', list(uniques)
+                array = codes
+            else:
+                kind, labels = 'numeric', None
+                array = values.to_numpy()
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            self._blocks.append(block)
+            columns.append((col, block.name, array.dtype.str, kind, labels))
+        self.spec = {'length': len(df), 'columns': columns}
+
+    def unlink(self):
+        """釋放共享記憶體（由建立者在所有工作結束後呼叫）"""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    @staticmethod
+    def attach(spec):
+        """
+        依規格附掛共享記憶體，重建 DataFrame（數值與 category 欄位零複製）
+
+        Returns:
+            DataFrame
+        """
+        data = {}
+        for col, name, dtype, kind, labels in spec['columns']:
+            block = shared_memory.SharedMemory(name=name)
+            _BLOCKS.append(block)
+            array = np.ndarray((spec['length'],), dtype=np.dtype(dtype), buffer=block.buf)
+            if kind == 'category':
+                data[col] = pd.Categorical.from_codes(array, labels)
+            elif kind == 'object':
+                labels = np.array(labels + [None], dtype=object)
+                data[col] = labels[array]    # 代碼 -1（缺值）對應到最後的 None
+            else:
+                data[col] = array
+        return pd.DataFrame(data, copy=False)
+
+
+def frames():
+    """工作行程中附掛的 DataFrame：{名稱: DataFrame}"""
+    return _FRAMES
+
+
+def _init_worker(specs, initializer, initargs):
+    for name, spec in specs.items():
+        _FRAMES[name] = SharedFrame.attach(spec)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_job(func, args):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = func(*args)
+    return result, output.getvalue()
+
+
+def run_parallel(jobs, shared, workers, initializer=None, initargs=()):
+    """
+    在多個工作行程中執行互相獨立的工作
+
+    Args:
+        jobs: {標籤: (函數, 參數 tuple)}；函數與參數需可序列化（模組層級函數、小型參數）
+        shared: {名稱: DataFrame}，放入共享記憶體，工作行程以 frames() 取得
+        workers: 工作行程數
+        initializer: 工作行程附掛資料後執行一次的初始化函數（例如建立索引）
+        initargs: initializer 的參數
+
+    Returns:
+        dict: {標籤: 回傳值}（依 jobs 的順序）；各工作的列印輸出依相同順序列印
+    """
+    blocks = {name: SharedFrame(df) for name, df in shared.items()}
+    try:
+        context = mp.get_context('spawn')
+        specs = {name: block.spec for name, block in blocks.items()}
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(specs, initializer, initargs)) as pool:
+            futures = {label: pool.submit(_run_job, func, args) for label, (func, args) in jobs.items()}
+            results = {}
+            for label, future in futures.items():
+                results[label], output = future.result()
+                print(output, end='')
+            return results
+    finally:
+        for block in blocks.values():
+            block.unlink()
@@ -3,12 +3,16 @@
 使用 FinMind API 取得股票的歷史價量資料
 """
 
-import requests
 import pandas as pd
 from datetime import datetime, timedelta
 import time
 import os
 
+from finmind_client import FinMindClient
+from market_store import MarketStore
+from stock_registry import StockRegistry, get_registry
+from trading_calendar import TradingCalendar
+
 
 class StockDataFetcher:
     def __init__(self, token_file=None):
@@ -32,8 +36,7 @@ class StockDataFetcher:
         if not self.token:
             raise ValueError("無法取得 FinMind API token（請設定環境變數 FINMIND_TOKEN 或提供 token_file）")
 
-        self.base_url = "https://api.finmindtrade.com/api/v4/data"
-        self.headers = {"Authorization": f"Bearer {self.token}"}
+        self.client = FinMindClient(token=self.token)
 
     def get_stock_price(self, stock_id, start_date, end_date, retry=3):
         """
@@ -67,12 +70,7 @@ class StockDataFetcher:
 
         for attempt in range(retry):
             try:
-                resp = requests.get(
-                    self.base_url,
-                    headers=self.headers,
-                    params=parameter,
-                    timeout=10
-                )
+                resp = self.client.get(parameter, timeout=10)
                 resp.raise_for_status()
 
                 data = resp.json()
@@ -102,35 +100,36 @@ class StockDataFetcher:
 
         return pd.DataFrame()
 
-    def get_multiple_stocks(self, stock_list, start_date, end_date, delay=0.2):
+    def get_multiple_stocks(self, stock_list, start_date, end_date, delay=0):
         """
         批次取得多檔股票資料
 
+        經由本地資料庫補齊缺少的資料，由抓取規劃器決定以單日全市場
+        或個股區間查詢，請求數最少。
+
         Args:
             stock_list: 股票代碼列表
             start_date: 起始日期 'YYYY-MM-DD'
             end_date: 結束日期 'YYYY-MM-DD'
-            delay: 每次請求間隔(秒)，避免過快
+            delay: 保留相容用，不再使用（速率由 FinMindClient 限速器控制）
 
         Returns:
             dict: {股票代碼: DataFrame}
         """
-        result = {}
-
-        for idx, stock_id in enumerate(stock_list, 1):
-            print(f"正在取得 {stock_id} 資料... ({idx}/{len(stock_list)})")
-
-            df = self.get_stock_price(stock_id, start_date, end_date)
+        dates = TradingCalendar(client=self.client).trading_days(start_date, end_date)
+        store = MarketStore()
+        store.ensure('price', dates, stock_list, client=self.client)
+        df_all = store.load_window('price', dates)
+        groups = dict(tuple(df_all.groupby('stock_id', observed=True))) if df_all is not None else {}
 
-            if not df.empty:
-                result[stock_id] = df
+        result = {}
+        for stock_id in stock_list:
+            df = groups.get(str(stock_id))
+            if df is not None and not df.empty:
+                result[stock_id] = df.reset_index(drop=True)
             else:
                 print(f"  查無 {stock_id} 資料")
 
-            # 避免請求過快
-            if idx < len(stock_list):
-                time.sleep(delay)
-
         print(f"\n成功取得 {len(result)}/{len(stock_list)} 檔股票資料")
         return result
 
@@ -140,20 +139,16 @@ class StockDataFetcher:
 
         Args:
             stock_id: 股票代碼
-            days: 天數（預設10天，會自動往前推算避開假日）
+            days: 交易日數（預設10天，依交易日曆避開假日）
 
         Returns:
             DataFrame: 股價資料
         """
-        end_date = datetime.now()
-        # 往前推算更多天以確保有足夠的交易日
-        start_date = end_date - timedelta(days=days*2)
+        end_date = datetime.now().strftime('%Y-%m-%d')
+        # 依交易日曆取得 N 個交易日的起始日
+        start_date = TradingCalendar(client=self.client).window_start(end_date, days)
 
-        df = self.get_stock_price(
-            stock_id,
-            start_date.strftime('%Y-%m-%d'),
-            end_date.strftime('%Y-%m-%d')
-        )
+        df = self.get_stock_price(stock_id, start_date, end_date)
 
         # 只保留最近的 N 筆交易日資料
         if not df.empty and len(df) > days:
@@ -161,27 +156,23 @@ class StockDataFetcher:
 
         return df
 
-    def get_stock_info(self, stock_id, info_file='../(all)stock_info_list.csv'):
+    def get_stock_info(self, stock_id, info_file=None):
         """
-        從股票清單中取得股票基本資訊
+        從股票主檔索引中取得股票基本資訊
 
         Args:
             stock_id: 股票代碼
-            info_file: 股票資訊檔案路徑
+            info_file: 股票資訊檔案路徑，None 則使用共用的股票主檔索引
 
         Returns:
             dict: {'股票代碼', '公司名稱', '公司產業', '上市櫃', '發行股數'}
                   如果找不到則返回 None
         """
         try:
-            df = pd.read_csv(info_file, encoding='utf-8-sig')
-            df['股票代碼'] = df['股票代碼'].astype(str)
-
-            stock = df[df['股票代碼'] == str(stock_id)]
-
-            if not stock.empty:
-                info = stock.iloc[0].to_dict()
+            registry = get_registry() if info_file is None else StockRegistry.load(info_file, category_file=None)
+            info = registry.info(stock_id)
 
+            if info is not None:
                 # 嘗試取得發行股數（如果有的話）
                 # 注意：(all)stock_info_list.csv 可能沒有發行股數欄位
                 # 之後可能需要另外抓取或手動補充
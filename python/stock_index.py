@@ -0,0 +1,160 @@
+"""
+日K線個股索引
+日K線長表只依 (股票, 日期) 排序一次，並記錄每檔股票的起訖位置（CSR 的 offsets），
+之後任何策略取單一股票的歷史都是 O(1) 的連續切片（numpy 欄位為零複製的 view），
+不必再對整張表做 price_df[price_df['stock_id'] == stock_id].sort_values('date')。
+
+整體計算則透過 panel() 取得（回溯序 × 股票）面板，同一組欄位只建立一次。
+"""
+
+import numpy as np
+import pandas as pd
+
+from price_panel import PricePanel
+
+PANEL_FIELDS = ('close', 'open', 'max', 'min', 'Trading_Volume')
+
+
+class StockIndex:
+    """
+    依 (股票, 日期) 排序的日K線索引
+
+    Attributes:
+        frame: 排序後的日K線長表（RangeIndex）
+        stocks: 股票代碼（依原始長表中首次出現的順序，即 frame 中的分組順序）
+        offsets: 第 i 檔股票位於 frame 的第 offsets[i] ~ offsets[i+1]-1 列（日期遞增）
+        dates: 所有日期（遞增）
+    """
+
+    def __init__(self, price_df):
+        """
+        Args:
+            price_df: 日K線長表（至少含 date、stock_id）
+        """
+        stock_codes, stocks = pd.factorize(price_df['stock_id'], sort=False)
+        date_codes, dates = pd.factorize(price_df['date'], sort=True)
+        order = np.lexsort((date_codes, stock_codes))
+
+        self.frame = price_df.take(order).reset_index(drop=True)
+        self.stocks = [str(s) for s in stocks]
+        self.dates = np.asarray(dates, dtype=object)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(stock_codes, minlength=len(stocks)))))
+        self._date_codes = date_codes[order]
+        self._index = {code: i for i, code in enumerate(self.stocks)}
+        self._columns = {}
+        self._panels = {}
+
+    def __len__(self):
+        return len(self.stocks)
+
+    def __contains__(self, stock_id):
+        return stock_id in self._index
+
+    @property
+    def latest_date(self):
+        """最新日期；沒有資料時為 None"""
+        return self.dates[-1] if len(self.dates) else None
+
+    def rows(self, stock_id):
+        """股票在 frame 中的列範圍（slice）；不在索引中回傳 None"""
+        i = self._index.get(stock_id)
+        if i is None:
+            return None
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def column(self, field, stock_id=None):
+        """
+        欄位的 numpy 陣列
+
+        Args:
+            field: 欄位名稱
+            stock_id: 指定時只回傳該股票的部分（零複製切片，日期遞增）；不在索引中回傳空陣列
+        """
+        if field not in self._columns:
+            self._columns[field] = self.frame[field].to_numpy()
+        values = self._columns[field]
+        if stock_id is None:
+            return values
+        rows = self.rows(stock_id)
+        return values[rows] if rows is not None else values[:0]
+
+    def history(self, stock_id):
+        """單一股票的日K線（依日期遞增）；不在索引中回傳空 DataFrame"""
+        rows = self.rows(stock_id)
+        return self.frame.iloc[rows] if rows is not None else self.frame.iloc[:0]
+
+    def on_date(self, date):
+        """指定日期的所有股票（依索引的股票順序）"""
+        codes = np.searchsorted(self.dates, date)
+        if codes >= len(self.dates) or self.dates[codes] != date:
+            return self.frame.iloc[:0]
+        return self.frame[self._date_codes == codes]
+
+    def between(self, start_date, end_date):
+        """日期區間 [start_date, end_date] 的子索引（保留股票順序；子集已排序，不再重新排序）"""
+        lo = np.searchsorted(self.dates, start_date, side='left')
+        hi = np.searchsorted(self.dates, end_date, side='right')
+        keep = (self._date_codes >= lo) & (self._date_codes < hi)
+
+        groups = np.repeat(np.arange(len(self.stocks)), np.diff(self.offsets))[keep]
+        counts = np.bincount(groups, minlength=len(self.stocks))
+        present = counts > 0
+        date_codes = self._date_codes[keep]
+        used = np.unique(date_codes)
+
+        sub = StockIndex.__new__(StockIndex)
+        sub.frame = self.frame[keep].reset_index(drop=True)
+        sub.stocks = [s for s, ok in zip(self.stocks, present) if ok]
+        sub.dates = self.dates[used]
+        sub.offsets = np.concatenate(([0], np.cumsum(counts[present])))
+        sub._date_codes = np.searchsorted(used, date_codes)
+        sub._index = {code: i for i, code in enumerate(sub.stocks)}
+        sub._columns = {}
+        sub._panels = {}
+        return sub
+
+    def locate(self, stock_ids, dates):
+        """
+        (股票, 日期) 在 frame 中的列位置
+
+        Args:
+            stock_ids: 股票代碼序列
+            dates: 對應的日期序列
+
+        Returns:
+            ndarray: 列位置（int64）；該股票當日無資料時為 -1
+        """
+        stock_pos = np.array([self._index.get(str(s), -1) for s in stock_ids], dtype=np.int64)
+        dates = np.asarray(dates, dtype=object)
+        date_pos = np.searchsorted(self.dates, dates)
+        # frame 依 (股票, 日期) 排序，組合鍵遞增
+        n_dates = len(self.dates)
+        keys = np.repeat(np.arange(len(self.stocks)), np.diff(self.offsets)) * n_dates + self._date_codes
+        wanted = stock_pos * n_dates + date_pos
+        rows = np.searchsorted(keys, wanted)
+        found = (stock_pos >= 0) & (date_pos < n_dates) & (rows < len(keys))
+        found[found] = (keys[rows[found]] == wanted[found]) & (self.dates[date_pos[found]] == dates[found])
+        return np.where(found, rows, -1)
+
+    def shift(self, rows, n):
+        """同一股票往後第 n 筆的列位置；rows 為 -1 或超出該股票的資料時為 -1"""
+        rows = np.asarray(rows, dtype=np.int64)
+        groups = np.searchsorted(self.offsets, rows, side='right') - 1
+        target = rows + n
+        valid = (rows >= 0) & (target < self.offsets[np.minimum(groups + 1, len(self.stocks))])
+        return np.where(valid, target, -1)
+
+    def panel(self, fields=PANEL_FIELDS):
+        """
+        （回溯序 × 股票）面板，同一組欄位只建立一次
+
+        Args:
+            fields: 面板欄位（frame 中不存在的欄位略過）
+        """
+        fields = tuple(f for f in fields if f in self.frame.columns)
+        if fields not in self._panels:
+            self._panels[fields] = PricePanel.from_sorted(
+                self.stocks, self.dates, np.diff(self.offsets), self._date_codes,
+                {field: self.column(field) for field in fields},
+            )
+        return self._panels[fields]
@@ -0,0 +1,207 @@
+"""
+股票主檔索引
+(all)stock_info_list.csv 與 stock_category.csv 在每個程序只解析一次，建立雜湊索引：
+- 代碼 → 整數 id（依主檔順序，0..N-1），供陣列化計算使用
+- 代碼 / 名稱 / 產業 / 族群 的 O(1) 查詢
+解析結果快取在磁碟，來源檔案未變動（路徑、大小、修改時間相同）時直接載入。
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+import pandas as pd
+
+from category_matrix import CategoryMatrix
+
+_HERE = Path(__file__).resolve().parent
+STOCK_LIST_FILE = _HERE / '(all)stock_info_list.csv'
+CATEGORY_FILE = _HERE / 'stock_category.csv'
+REGISTRY_CACHE_DIR = os.getenv('STOCK_REGISTRY_CACHE_DIR', '.cache/stock_registry')
+
+CODE_COLUMN = '股票代碼'
+
+
+def _normalize_code(code):
+    """股票代碼統一為去除空白、至少 4 碼的字串（CSV 讀成整數時補回前導 0）"""
+    return str(code).strip().zfill(4)
+
+
+def _signature(*paths):
+    """來源檔案的識別資訊，任何一個變動即視為快取失效"""
+    sig = []
+    for path in paths:
+        path = Path(path)
+        if path.exists():
+            st = path.stat()
+            sig.append([str(path.resolve()), st.st_size, st.st_mtime_ns])
+        else:
+            sig.append([str(path), None, None])
+    return sig
+
+
+class StockRegistry:
+    """
+    股票主檔與族群分類的索引
+
+    Attributes:
+        codes: 依主檔順序的股票代碼列表（index 即整數 id）
+        columns: 主檔欄位名稱
+        name_by_code: {代碼: 公司名稱}
+        code_by_name: {公司名稱: 代碼}
+        industry_by_code: {代碼: 公司產業}
+        market_by_code: {代碼: 上市櫃}
+        codes_by_industry: {產業: [代碼...]}
+        codes_by_category: {族群: [代碼...]}（族群股票不一定在主檔中）
+        categories_by_code: {代碼: [族群...]}（一檔股票可屬於多個族群）
+    """
+
+    def __init__(self, columns, rows, category_rows):
+        """
+        Args:
+            columns: 主檔欄位名稱（第一欄為股票代碼）
+            rows: 主檔資料列（字串列表，代碼已正規化）
+            category_rows: 族群分類 [(代碼, 族群)...]，保留檔案順序與重複
+        """
+        self.columns = list(columns)
+        self._rows = [list(r) for r in rows]
+        self._category_rows = [tuple(r) for r in category_rows]
+
+        col = {name: i for i, name in enumerate(self.columns)}
+        self.codes = [r[0] for r in self._rows]
+        self._ids = {code: i for i, code in enumerate(self.codes)}
+
+        def column(name):
+            i = col.get(name)
+            return [r[i] if i is not None else '' for r in self._rows]
+
+        names = column('公司名稱')
+        industries = column('公司產業')
+        self.name_by_code = dict(zip(self.codes, names))
+        self.code_by_name = {name: code for code, name in zip(self.codes, names)}
+        self.industry_by_code = dict(zip(self.codes, industries))
+        self.market_by_code = dict(zip(self.codes, column('上市櫃')))
+
+        by_industry = defaultdict(list)
+        for code, industry in zip(self.codes, industries):
+            by_industry[industry].append(code)
+        self.codes_by_industry = dict(by_industry)
+
+        by_category = defaultdict(list)
+        of_code = defaultdict(list)
+        for code, category in self._category_rows:
+            by_category[category].append(code)
+            of_code[code].append(category)
+        self.codes_by_category = dict(by_category)
+        self.categories_by_code = dict(of_code)
+        self._category_matrix = None
+
+    # ---------- 載入 ----------
+
+    @classmethod
+    def from_files(cls, stock_file=STOCK_LIST_FILE, category_file=CATEGORY_FILE):
+        """解析 CSV 建立索引（不使用快取）；族群檔不存在時視為沒有族群"""
+        df = pd.read_csv(stock_file, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+        df[CODE_COLUMN] = df[CODE_COLUMN].map(_normalize_code)
+        df = df[[CODE_COLUMN] + [c for c in df.columns if c != CODE_COLUMN]]
+
+        category_rows = []
+        if category_file and Path(category_file).exists():
+            cat = pd.read_csv(category_file, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+            category_rows = list(zip(cat[CODE_COLUMN].map(_normalize_code), cat['族群']))
+
+        return cls(df.columns, df.values.tolist(), category_rows)
+
+    @classmethod
+    def load(cls, stock_file=STOCK_LIST_FILE, category_file=CATEGORY_FILE, cache_dir=REGISTRY_CACHE_DIR):
+        """
+        載入索引，優先使用磁碟快取
+
+        Args:
+            stock_file: 股票主檔 CSV
+            category_file: 族群分類 CSV（None 表示不載入族群）
+            cache_dir: 快取目錄，None 表示不使用快取
+        """
+        sources = [stock_file] + ([category_file] if category_file else [])
+        signature = _signature(*sources)
+        cache_path = None
+        if cache_dir:
+            key = hashlib.sha1(json.dumps([s[0] for s in signature]).encode('utf-8')).hexdigest()[:12]
+            cache_path = Path(cache_dir) / f"{key}.json"
+            try:
+                state = json.loads(cache_path.read_text(encoding='utf-8'))
+                if state['signature'] == signature:
+                    return cls(state['columns'], state['rows'], state['categories'])
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+
+        registry = cls.from_files(stock_file, category_file)
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps({
+                'signature': signature,
+                'columns': registry.columns,
+                'rows': registry._rows,
+                'categories': registry._category_rows,
+            }, ensure_ascii=False), encoding='utf-8')
+            os.replace(tmp, cache_path)
+        return registry
+
+    # ---------- 查詢 ----------
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return _normalize_code(code) in self._ids
+
+    def id_of(self, code):
+        """股票代碼 → 整數 id；不在主檔中回傳 None"""
+        return self._ids.get(_normalize_code(code))
+
+    def code_of(self, stock_index):
+        """整數 id → 股票代碼"""
+        return self.codes[stock_index]
+
+    def info(self, code):
+        """
+        取得主檔資料列
+
+        Returns:
+            dict | None: {'股票代碼', '公司名稱', '公司產業', '上市櫃', ...}；找不到回傳 None
+        """
+        i = self.id_of(code)
+        if i is None:
+            return None
+        return dict(zip(self.columns, self._rows[i]))
+
+    def frame(self):
+        """主檔 DataFrame（股票代碼為字串）"""
+        return pd.DataFrame(self._rows, columns=self.columns)
+
+    def category_frame(self):
+        """族群分類 DataFrame [股票代碼, 族群]，保留所有記錄（一對多）"""
+        return pd.DataFrame(self._category_rows, columns=[CODE_COLUMN, '族群'])
+
+    def category_matrix(self):
+        """族群 × 股票 關聯矩陣（第一次呼叫時建立）"""
+        if self._category_matrix is None:
+            self._category_matrix = CategoryMatrix(self._category_rows)
+        return self._category_matrix
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """取得程序內共用的股票主檔索引（第一次呼叫時載入）"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = StockRegistry.load()
+        return _registry
@@ -0,0 +1,314 @@
+"""
+台股交易日曆
+以實際觀察到的價格資料日期推導交易日（0050 每個交易日都有成交），
+結果快取在磁碟，只在查詢範圍超出已觀察區間時才補抓新日期。
+
+- 已觀察區間內：有價格資料的日期才是交易日
+- 已觀察區間之後（通常是今天、資料尚未公布）：暫以週一至週五視為交易日
+
+全市場逐檔抓取前以 preflight() 預檢：一、兩個請求即可判斷休市或資料尚未公布，
+不必抓完上千檔股票才從空結果得知。
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from finmind_cache import taipei_today
+from finmind_client import get_client
+
+CALENDAR_FILE = os.getenv('TRADING_CALENDAR_FILE', '.cache/trading_calendar.json')
+REFERENCE_STOCK = '0050'
+
+# 連續休市的最長日曆天數上限；超過此長度的區間查無資料視為回應異常
+MAX_HOLIDAY_SPAN = 14
+
+# probe() 的結果
+OPEN = 'open'          # 交易日且資料已公布
+CLOSED = 'closed'      # 休市
+PENDING = 'pending'    # 交易日但資料尚未公布（今日無任何資料時也歸為此類）
+
+# 資料尚未公布時的等待時間與重新預檢間隔
+PREFLIGHT_WAIT_MINUTES = float(os.getenv('PREFLIGHT_WAIT_MINUTES', '0'))
+PREFLIGHT_INTERVAL_SEC = 300
+
+
+def _shift(date, days):
+    return (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def _days_between(start, end):
+    return (datetime.strptime(end, '%Y-%m-%d') - datetime.strptime(start, '%Y-%m-%d')).days + 1
+
+
+def _is_weekday(date):
+    return datetime.strptime(date, '%Y-%m-%d').weekday() < 5
+
+
+class TradingCalendar:
+    """
+    可刷新的交易日曆
+
+    covered_from ~ covered_until 為已確認的區間，區間內的交易日存在 self.dates。
+    """
+
+    def __init__(self, path=CALENDAR_FILE, client=None):
+        """
+        Args:
+            path: 日曆快取檔案路徑
+            client: FinMindClient，None 則使用共用客戶端
+        """
+        self.path = Path(path)
+        self._client = client
+        self._lock = threading.Lock()
+        self.covered_from = None
+        self.covered_until = None
+        self.dates = set()
+        self._load()
+
+    # ---------- 持久化 ----------
+
+    def _load(self):
+        try:
+            state = json.loads(self.path.read_text(encoding='utf-8'))
+            self.covered_from = state['covered_from']
+            self.covered_until = state['covered_until']
+            self.dates = set(state['dates'])
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({
+            'covered_from': self.covered_from,
+            'covered_until': self.covered_until,
+            'dates': sorted(self.dates),
+        }), encoding='utf-8')
+        os.replace(tmp, self.path)
+
+    # ---------- 更新 ----------
+
+    def _covers(self, start, end):
+        return self.covered_from is not None and self.covered_from <= start and end <= self.covered_until
+
+    def refresh(self, start, end=None):
+        """
+        以參考股票的價格資料補齊 start ~ end 的交易日（只抓尚未觀察的部分）
+
+        Args:
+            start: 起始日期 'YYYY-MM-DD'
+            end: 結束日期，None 表示今天
+        """
+        today = taipei_today()
+        end = min(end or today, today)
+        with self._lock:
+            if start > end or self._covers(start, end):
+                return
+            if self.covered_from is None:
+                ranges = [(start, end)]
+            else:
+                ranges = []
+                if start < self.covered_from:
+                    ranges.append((start, _shift(self.covered_from, -1)))
+                if end > self.covered_until:
+                    ranges.append((_shift(self.covered_until, 1), end))
+
+            client = self._client or get_client()
+            observed = set()
+            try:
+                for range_start, range_end in ranges:
+                    data = client.fetch('TaiwanStockPrice', REFERENCE_STOCK, range_start, range_end)
+                    if not isinstance(data, dict) or data.get('status', 200) != 200:
+                        msg = data.get('msg', 'Unknown error') if isinstance(data, dict) else data
+                        raise RuntimeError(f"API 錯誤: {msg}")
+                    records = data.get('data') or []
+                    # 最長的連續休市（春節）不到兩週；更長的區間沒有任何資料表示回應有問題
+                    if not records and _days_between(range_start, range_end) >= MAX_HOLIDAY_SPAN:
+                        raise RuntimeError(f"{range_start} ~ {range_end} 沒有任何參考股票資料")
+                    observed.update(r['date'] for r in records)
+            except Exception as e:
+                # 無法更新時保留原區間，查詢會退回以平日推定
+                print(f"  ⚠ 交易日曆更新失敗 ({start} ~ {end}): {e}")
+                return
+            self.dates.update(observed)
+
+            # 今日資料可能尚未公布，沒看到今日資料時只確認到昨天
+            confirmed_until = end if (end < today or end in self.dates) else _shift(today, -1)
+            self.covered_from = min(start, self.covered_from or start)
+            self.covered_until = max(confirmed_until, self.covered_until or confirmed_until)
+            self._save()
+
+    def observe(self, date, has_data):
+        """
+        記錄一次全市場單日查詢的結果（有資料 = 交易日），不發出任何請求
+
+        只延伸緊接在已確認區間之後的日期，避免留下未觀察的空洞；
+        今日無資料可能只是尚未公布，不視為確認。
+        """
+        with self._lock:
+            changed = False
+            if has_data and date not in self.dates:
+                self.dates.add(date)
+                changed = True
+            confirmed = has_data or date < taipei_today()
+            if confirmed and self.covered_until is not None and date == _shift(self.covered_until, 1):
+                self.covered_until = date
+                changed = True
+            if changed:
+                self._save()
+
+    # ---------- 預檢 ----------
+
+    def _probe_records(self, client, dataset, data_id, date):
+        """
+        單日查詢；不經回應快取（空結果可能很快改變），API 錯誤時拋出例外，
+        避免把錯誤回應誤判為休市
+        """
+        data = client.get({'dataset': dataset, 'data_id': data_id, 'start_date': date, 'end_date': date}).json()
+        if not isinstance(data, dict) or data.get('status', 200) != 200:
+            msg = data.get('msg', 'Unknown error') if isinstance(data, dict) else data
+            raise RuntimeError(f"API 錯誤: {msg}")
+        return data.get('data') or []
+
+    def probe(self, date, dataset='TaiwanStockPrice', data_id=REFERENCE_STOCK, client=None):
+        """
+        以最少的請求判斷 date 的資料集是否可抓取
+
+        1. 日曆已確認的日期、週末：直接判斷休市（不發請求）
+        2. 查詢參考股票在該資料集的單日資料：有資料即可抓取
+        3. 資料集無資料時再查參考股票的日K：有日K表示資料集尚未公布；
+           過去日期無日K為休市，今日無日K無法與尚未公布區分，視為尚未公布
+        只有查詢都成功時才判斷休市並記入日曆；任一查詢失敗即拋出例外
+
+        Args:
+            date: 日期 'YYYY-MM-DD'
+            dataset: 之後要全市場抓取的 FinMind 資料集
+            data_id: 參考股票代碼
+            client: FinMindClient，None 則使用日曆的客戶端
+
+        Returns:
+            str: OPEN、CLOSED 或 PENDING
+
+        Raises:
+            RuntimeError: API 回應錯誤
+        """
+        if date not in self.dates and (self._covers(date, date) or not _is_weekday(date)):
+            return CLOSED
+
+        client = client or self._client or get_client()
+        if self._probe_records(client, dataset, data_id, date):
+            self.observe(date, True)
+            return OPEN
+        has_price = (dataset != 'TaiwanStockPrice' or data_id != REFERENCE_STOCK) and bool(
+            self._probe_records(client, 'TaiwanStockPrice', REFERENCE_STOCK, date))
+        self.observe(date, has_price)
+        if has_price or date >= taipei_today():
+            return PENDING
+        return CLOSED
+
+    # ---------- 查詢 ----------
+
+    def is_trading_day(self, date):
+        """判斷是否為交易日；尚無法確認的日期（今日資料未公布、未來）以平日推定"""
+        if not self._covers(date, date) and date < taipei_today():
+            self.refresh(date, date)
+        if self._covers(date, date):
+            return date in self.dates
+        return date in self.dates or _is_weekday(date)
+
+    def trading_days(self, start, end):
+        """
+        取得 start ~ end（含）之間的交易日，依日期遞增排序
+
+        已確認區間外的日期（例如今日資料尚未公布）以平日推定。
+        """
+        self.refresh(start, end)
+        if self.covered_from is None or self.covered_from > start:
+            confirmed_until = _shift(start, -1)
+            days = []
+        else:
+            confirmed_until = self.covered_until
+            days = sorted(d for d in self.dates if start <= d <= min(end, confirmed_until))
+        current = _shift(max(confirmed_until, _shift(start, -1)), 1)
+        while current <= end:
+            if current in self.dates or _is_weekday(current):
+                days.append(current)
+            current = _shift(current, 1)
+        return days
+
+    def last_n_trading_days(self, n, end=None):
+        """
+        取得截至 end（含）的最近 n 個交易日，依日期遞增排序
+
+        Args:
+            n: 交易日數
+            end: 結束日期，None 表示今天
+        """
+        end = end or taipei_today()
+        # 一年約 245 個交易日，先以 1.5 倍日曆天估計，不足再往前補
+        span = int(n * 1.5) + 10
+        while True:
+            days = self.trading_days(_shift(end, -span), end)
+            if len(days) >= n or span > n * 7 + 30:
+                return days[-n:]
+            span *= 2
+
+    def window_start(self, end, n):
+        """最近 n 個交易日（截至 end）的第一天"""
+        days = self.last_n_trading_days(n, end)
+        return days[0] if days else end
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_calendar():
+    """取得程序內共用的交易日曆"""
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            _calendar = TradingCalendar()
+        return _calendar
+
+
+def preflight(date, dataset='TaiwanStockPrice', data_id=REFERENCE_STOCK, client=None,
+              wait_minutes=PREFLIGHT_WAIT_MINUTES, interval=PREFLIGHT_INTERVAL_SEC):
+    """
+    全市場抓取前的預檢；資料尚未公布時可等待並定期重新預檢
+
+    Args:
+        date: 要抓取的日期
+        dataset: 要抓取的 FinMind 資料集
+        data_id: 參考股票代碼
+        client: FinMindClient，None 則使用共用客戶端
+        wait_minutes: 資料尚未公布時最多等待的分鐘數（0 = 不等待）
+        interval: 等待期間重新預檢的間隔秒數
+
+    Returns:
+        bool: 是否可以開始抓取
+    """
+    calendar = get_calendar()
+    deadline = time.time() + wait_minutes * 60
+    while True:
+        try:
+            status = calendar.probe(date, dataset, data_id, client=client)
+        except Exception as e:
+            # 預檢本身失敗時不阻擋抓取，交由原本的流程處理
+            print(f"  ⚠ 預檢失敗，照常執行: {e}")
+            return True
+        if status == OPEN:
+            print(f"  ✓ 預檢：{date} {dataset} 已有資料")
+            return True
+        if status == CLOSED:
+            print(f"  ⚠ 預檢：{date} 非交易日，不執行抓取")
+            return False
+        if time.time() + interval > deadline:
+            print(f"  ⚠ 預檢：{date} {dataset} 資料尚未公布，稍後再執行")
+            return False
+        print(f"  ⏳ 預檢：{date} {dataset} 資料尚未公布，{interval} 秒後重新檢查...")
+        time.sleep(interval)
@@ -3,61 +3,136 @@
 每日抓取全市場券商分點買賣資料，計算主力買超指標，執行四種篩選
 執行目錄：python/
 """
-import requests
+import argparse
+import numpy as np
 import pandas as pd
-import time
 import os
 import sys
-import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 
-# ==================== 設定 ====================
-
-try:
-    with open('token', 'r') as f:
-        TOKEN = f.read()
-except FileNotFoundError:
-    TOKEN = os.getenv('FINMIND_TOKEN', '')
-TOKEN = re.sub(r'[\s\x00-\x1f\x7f]', '', TOKEN)
+from broker_archive import BrokerArchive
+from broker_concentration import MAIN_FORCE_K, TOP_K, broker_concentration
+from broker_positions import BrokerPositions
+from crawl_checkpoint import CrawlCheckpoint, write_atomic
+from finmind_client import get_client, RATE_LIMIT_PER_MIN
+from finmind_schema import decode
+from stock_registry import StockRegistry, get_registry
+from trading_calendar import preflight
 
-API_URL = "https://api.finmindtrade.com/api/v4/data"
-HEADERS = {"Authorization": f"Bearer {TOKEN}"}
+# ==================== 設定 ====================
 
 TODAY = datetime.now().strftime('%Y-%m-%d')
 HISTORY_DIR = Path('../data/history')
 LATEST_DIR = Path('../data/latest')
-SLEEP_SEC = 0.65  # ~92 req/min，低於上限 100/min
+# 同時進行中的請求數；總速率仍由共用限速器控制，1 = 逐檔抓取
+CRAWL_WORKERS = int(os.getenv('MAIN_FORCE_WORKERS', '8'))
+# 累積買超與連續買超的回溯交易日數
+WINDOW_DAYS = 5
+# 連續買超天數；window 天中至少幾天買超（回溯天數需大於前者、不小於後者）
+STREAK_DAYS = 3
+MIN_POSITIVE_DAYS = 3
+# 每累積幾檔的分點資料串接後批次計算主力買超（與檢查點寫入間隔相同）
+CALC_BATCH = 100
+# 抓取結束後重抓失敗股票的輪數（排程每日只執行一次，當日未補齊的交易日只能以部分資料併入券商部位）
+RETRY_ROUNDS = int(os.getenv('MAIN_FORCE_RETRY_ROUNDS', '2'))
 
 # ==================== 函數 ====================
 
 def fetch_trading_report(stock_id: str, date: str):
-    params = {
-        "dataset": "TaiwanStockTradingDailyReport",
-        "data_id": stock_id,
-        "start_date": date,
-        "end_date": date,
-    }
     try:
-        resp = requests.get(API_URL, headers=HEADERS, params=params, timeout=15)
-        if resp.status_code == 200:
-            data = resp.json()
-            if isinstance(data, dict) and data.get('status', 200) == 200 and data.get('data'):
-                return pd.DataFrame(data['data'])
+        data = get_client().fetch("TaiwanStockTradingDailyReport", stock_id, date, date, timeout=15)
+        # 查無資料回傳空表（非失敗），請求錯誤才回傳 None
+        if isinstance(data, dict) and data.get('status', 200) == 200:
+            return decode(data.get('data') or [], "TaiwanStockTradingDailyReport")
     except Exception:
         pass
     return None
 
 
-def calc_main_force(df: pd.DataFrame) -> int:
-    agg = (
-        df.groupby('securities_trader_id')
-        .agg(buy=('buy', 'sum'), sell=('sell', 'sum'))
-        .reset_index()
-    )
-    top15_buy  = agg.nlargest(15, 'buy')['buy'].sum()
-    top15_sell = agg.nlargest(15, 'sell')['sell'].sum()
-    return int((top15_buy - top15_sell) // 1000)
+def calc_main_force(reports: pd.DataFrame) -> dict:
+    """
+    批次計算多檔股票的主力買超（前 K 大券商買進 − 前 K 大券商賣出，張）
+
+    Args:
+        reports: 多檔股票串接的券商分點長表
+
+    Returns:
+        dict: {stock_id: {'lots': 前 MAIN_FORCE_K 大的主力買超, 'lots_top{K}': 其他 K 的主力買超}}
+    """
+    stats = broker_concentration(reports, TOP_K)
+    columns = {'lots': f'lots_top{MAIN_FORCE_K}'}
+    columns.update({f'lots_top{k}': f'lots_top{k}' for k in TOP_K if k != MAIN_FORCE_K})
+    values = {key: stats[col].tolist() for key, col in columns.items()}
+    return {sid: {key: values[key][i] for key in columns} for i, sid in enumerate(stats.index)}
+
+
+def crawl_main_force(stock_list: list, date: str, workers: int = CRAWL_WORKERS, checkpoint: CrawlCheckpoint = None,
+                     archive: BrokerArchive = None):
+    """
+    並行抓取全市場券商分點資料，每累積 CALC_BATCH 檔回應即批次計算主力買超
+
+    限速器控制整體請求速率，N 個請求同時在途可把往返延遲藏在配額間隔內，
+    總耗時取決於配額而非延遲。
+
+    Args:
+        checkpoint: 進度檢查點；已完成的股票直接沿用結果，只抓失敗與未處理的股票
+        archive: 券商分點封存；每批分點資料先寫成暫存片段再記入檢查點，抓取結束時合併為單日分區一次寫入
+
+    Returns:
+        tuple: (rows, success, empty, fail)，rows 為 [{'stock_id', 'lots', 'lots_top{K}'...}]，依股票清單順序
+    """
+    results = dict(checkpoint.done) if checkpoint else {}
+    todo = [sid for sid in stock_list if sid not in results]
+    if len(todo) < len(stock_list):
+        print(f'  從檢查點恢復：已完成 {len(stock_list) - len(todo)} 檔，剩餘 {len(todo)} 檔')
+
+    pending = {}
+
+    def flush_pending():
+        if not pending:
+            return
+        reports = pd.concat(pending.values(), ignore_index=True)
+        if archive:
+            archive.append_part(date, reports)
+        batch = calc_main_force(reports)
+        for sid in pending:
+            results[sid] = batch[sid]
+            if checkpoint:
+                checkpoint.record(sid, results[sid])
+        pending.clear()
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(fetch_trading_report, sid, date): sid for sid in todo}
+        for future in as_completed(futures):
+            sid = futures[future]
+            df_raw = future.result()
+            if df_raw is not None and len(df_raw) > 0:
+                pending[sid] = df_raw
+                if len(pending) >= CALC_BATCH:
+                    flush_pending()
+            elif df_raw is not None:
+                # 查無資料（None）也算完成，resume 時不再重抓
+                results[sid] = None
+                if checkpoint:
+                    checkpoint.record(sid, None)
+            elif checkpoint:
+                checkpoint.record_failure(sid)
+            done += 1
+            if done % 200 == 0:
+                print(f'  進度 {done}/{len(todo)} ({done/len(todo)*100:.0f}%)')
+    flush_pending()
+    if checkpoint:
+        checkpoint.flush()
+    if archive:
+        archive.compact(date)
+
+    rows = [{'stock_id': sid, **results[sid]} for sid in stock_list if results.get(sid) is not None]
+    empty = sum(1 for sid in stock_list if sid in results and results[sid] is None)
+    fail = len(stock_list) - len(rows) - empty
+    return rows, len(rows), empty, fail
 
 
 def load_history_dates(n: int = 4) -> list:
@@ -77,75 +152,160 @@ def load_raw(date: str):
     return pd.read_csv(f, dtype={'stock_id': str}) if f.exists() else None
 
 
-def enrich(df: pd.DataFrame, stock_map: dict) -> pd.DataFrame:
+def enrich(df: pd.DataFrame, registry: StockRegistry) -> pd.DataFrame:
     df = df.copy()
-    df['公司名稱'] = df['stock_id'].map(lambda x: stock_map.get(x, {}).get('公司名稱', ''))
-    df['公司產業'] = df['stock_id'].map(lambda x: stock_map.get(x, {}).get('公司產業', ''))
-    df['上市櫃']  = df['stock_id'].map(lambda x: stock_map.get(x, {}).get('上市櫃', ''))
+    df['公司名稱'] = df['stock_id'].map(lambda x: registry.name_by_code.get(x, ''))
+    df['公司產業'] = df['stock_id'].map(lambda x: registry.industry_by_code.get(x, ''))
+    df['上市櫃']  = df['stock_id'].map(lambda x: registry.market_by_code.get(x, ''))
     df.rename(columns={'stock_id': '股票代碼'}, inplace=True)
     return df
 
 
-def build_result(rows: list, stock_map: dict, extra_cols: list = None) -> pd.DataFrame:
+def build_result(rows: pd.DataFrame, registry: StockRegistry, extra_cols: list = None,
+                 window: int = WINDOW_DAYS) -> pd.DataFrame:
+    total_col = f'{window}日累積買超(張)'
     base_cols = ['排名', '股票代碼', '公司名稱', '公司產業', '上市櫃']
-    value_cols = (extra_cols or []) + ['今日主力買超(張)', '5日累積買超(張)']
-    if not rows:
+    value_cols = (extra_cols or []) + ['今日主力買超(張)', total_col]
+    if len(rows) == 0:
         return pd.DataFrame(columns=base_cols + value_cols)
-    df = enrich(pd.DataFrame(rows), stock_map)
-    df = df.sort_values('5日累積買超(張)', ascending=False).reset_index(drop=True)
+    df = enrich(rows, registry)
+    df = df.sort_values(total_col, ascending=False).reset_index(drop=True)
     df.insert(0, '排名', range(1, len(df) + 1))
     return df[base_cols + value_cols]
 
 
+def lots_matrix(combined: pd.DataFrame, dates: list) -> pd.DataFrame:
+    """
+    主力買超的 (股票 × 日期) 矩陣
+
+    Args:
+        combined: 各日原始資料（stock_id、lots、date）
+        dates: 要使用的日期（由新到舊）
+
+    Returns:
+        DataFrame: index 為股票代碼（遞增），欄位依 dates 的順序；當日無資料為 NaN
+    """
+    combined = combined[combined['date'].isin(dates)]
+    return combined.pivot(index='stock_id', columns='date', values='lots').reindex(columns=dates)
+
+
+def screen_main_force(matrix: pd.DataFrame, registry: StockRegistry, window: int = WINDOW_DAYS,
+                      streak: int = STREAK_DAYS, min_positive: int = MIN_POSITIVE_DAYS, recent: int = 2,
+                      top_n: int = 50) -> dict:
+    """
+    一次計算四種主力買超篩選
+
+    1. 最近 streak 天皆為正
+    2. 最近 window 天皆為正（資料不足 window 天時無結果）
+    3. window 天中至少 min_positive 天為正，且最近 recent 天皆為正
+    4. window 日累積買超排名前 top_n
+
+    Args:
+        matrix: lots_matrix() 的結果（欄位由新到舊，最多 window 天）
+        window: 回溯交易日數；需大於 streak 且不小於 min_positive
+
+    Returns:
+        dict: {篩選名稱: 結果 DataFrame}
+    """
+    if window <= streak or window < min_positive:
+        # window == streak 時「連續 streak 天」與「連續 window 天」同名，其中一個結果會被覆蓋
+        raise ValueError(f"window ({window}) 需大於 streak ({streak}) 且不小於 min_positive ({min_positive})")
+    values = matrix.to_numpy(dtype=float)
+    positive = values > 0    # 無資料（NaN）視為非正
+    n_days = values.shape[1]
+    base = pd.DataFrame({
+        'stock_id': matrix.index,
+        '今日主力買超(張)': np.nan_to_num(values[:, 0]).astype(np.int64),
+        f'{window}日累積買超(張)': np.nansum(values, axis=1).astype(np.int64),
+    })
+    pos_count = positive.sum(axis=1)
+
+    streak_mask = positive[:, :streak].all(axis=1)
+    window_mask = positive.all(axis=1) if n_days >= window else np.zeros(len(base), dtype=bool)
+    mixed_mask = (pos_count >= min_positive) & positive[:, :recent].all(axis=1)
+    mixed = base[mixed_mask].assign(**{f'{window}天正天數': pos_count[mixed_mask].astype(np.int64)})
+
+    rank = build_result(base, registry, window=window).head(top_n).reset_index(drop=True)
+    rank['排名'] = range(1, len(rank) + 1)
+    return {
+        f'連續{streak}天': build_result(base[streak_mask], registry, window=window),
+        f'連續{window}天': build_result(base[window_mask], registry, window=window),
+        f'{window}天{min_positive}正': build_result(mixed, registry, [f'{window}天正天數'], window=window),
+        '累積排名': rank,
+    }
+
+
 # ==================== 主程式 ====================
 
+parser = argparse.ArgumentParser(description='主力買賣超篩選系統')
+parser.add_argument('--resume', action='store_true', help='沿用上次中斷的抓取進度，只重抓失敗與未完成的股票')
+parser.add_argument('--window', type=int, default=WINDOW_DAYS, help=f'累積買超的回溯交易日數（預設 {WINDOW_DAYS}）')
+args = parser.parse_args()
+if args.window <= STREAK_DAYS or args.window < MIN_POSITIVE_DAYS:
+    parser.error(f'--window 需大於 {STREAK_DAYS}（連續買超天數）且不小於 {MIN_POSITIVE_DAYS}')
+
 print('=== 主力買賣超分析 ===\n')
 print(f'目標日期: {TODAY}')
 
 # 讀取股票清單
 print('讀取股票清單...')
-stock_info = pd.read_csv('(all)stock_info_list.csv')
-stock_info['股票代碼'] = stock_info['股票代碼'].astype(str).str.zfill(4)
-stock_list = stock_info['股票代碼'].tolist()
-stock_map = stock_info.set_index('股票代碼').to_dict('index')
+registry = get_registry()
+stock_list = registry.codes
 print(f'共 {len(stock_list)} 檔股票\n')
 
+# ---- 中斷後未接續的前幾日抓取：殘留片段合併為部分資料的單日分區 ----
+archive = BrokerArchive()
+for date in archive.compact_stale(TODAY):
+    print(f'⚠ {date} 抓取曾中斷，已將殘留的券商分點片段合併封存（部分股票）')
+
+# ---- 預檢：休市或資料尚未公布時不展開全市場抓取 ----
+print('預檢交易日...')
+if not preflight(TODAY, 'TaiwanStockTradingDailyReport'):
+    sys.exit(0)
+print()
+
 # ---- 抓取今日資料 ----
-print(f'開始抓取 {TODAY} 券商分點資料...')
-print(f'預計耗時約 {len(stock_list) * SLEEP_SEC / 60:.0f} 分鐘\n')
-
-rows = []
-success = fail = empty = 0
-
-for i, sid in enumerate(stock_list, 1):
-    if i % 200 == 0:
-        print(f'  進度 {i}/{len(stock_list)} ({i/len(stock_list)*100:.0f}%)')
-    df_raw = fetch_trading_report(sid, TODAY)
-    if df_raw is not None and len(df_raw) > 0:
-        rows.append({'stock_id': sid, 'lots': calc_main_force(df_raw)})
-        success += 1
-    elif df_raw is not None:
-        empty += 1
-    else:
-        fail += 1
-    time.sleep(SLEEP_SEC)
+print(f'開始抓取 {TODAY} 券商分點資料（{CRAWL_WORKERS} 個並行請求）...')
+print(f'預計耗時約 {len(stock_list) / RATE_LIMIT_PER_MIN:.0f} 分鐘（限速 {RATE_LIMIT_PER_MIN:.0f} req/min）\n')
+
+checkpoint = CrawlCheckpoint('main_force', TODAY, resume=args.resume)
+rows, success, empty, fail = crawl_main_force(stock_list, TODAY, checkpoint=checkpoint, archive=archive)
+for attempt in range(1, RETRY_ROUNDS + 1):
+    if fail == 0:
+        break
+    print(f'\n重抓失敗的 {fail} 檔（第 {attempt}/{RETRY_ROUNDS} 輪）...')
+    rows, success, empty, fail = crawl_main_force(stock_list, TODAY, checkpoint=checkpoint, archive=archive)
 
 print(f'\n抓取完成：成功 {success}，空資料 {empty}，失敗 {fail}')
+if archive.has_day(TODAY):
+    print(f'券商分點已封存：{archive.root / TODAY}.npz')
 
 if not rows:
     print('今日無資料（非交易日），結束執行')
+    if fail == 0:
+        checkpoint.clear()
     sys.exit(0)
 
-today_df = pd.DataFrame(rows)  # columns: stock_id, lots
+today_df = pd.DataFrame(rows)  # columns: stock_id, lots（前 15 大）, lots_top5/10/20
 
 # ---- 儲存今日原始資料 ----
 today_hist = HISTORY_DIR / TODAY
 today_hist.mkdir(parents=True, exist_ok=True)
-today_df.to_csv(today_hist / '主力買賣超_raw.csv', index=False)
+write_atomic(today_hist / '主力買賣超_raw.csv', lambda tmp: today_df.to_csv(tmp, index=False))
+# 有失敗的股票時保留檢查點，下次以 --resume 只重抓失敗部分
+if fail == 0:
+    checkpoint.clear()
 print(f'今日原始資料已儲存：{today_hist / "主力買賣超_raw.csv"} ({len(today_df)} 筆)\n')
 
-# ---- 合併最近 5 交易日 ----
-hist_dates = load_history_dates(n=4)
+# ---- 券商部位：今日分點資料完整時標記；不完整的今日留待 --resume 補齊後再併入 ----
+if fail == 0:
+    archive.mark_complete(TODAY)
+BrokerPositions().sync(archive)
+print()
+
+# ---- 合併最近 N 交易日 ----
+window = args.window
+hist_dates = load_history_dates(n=window - 1)
 all_frames = [today_df.assign(date=TODAY)]
 for d in hist_dates:
     frame = load_raw(d)
@@ -153,82 +313,20 @@ for d in hist_dates:
         all_frames.append(frame.assign(date=d))
 
 combined = pd.concat(all_frames, ignore_index=True)
-all_dates = sorted(combined['date'].unique(), reverse=True)
-d5 = all_dates[:5]
-d3 = all_dates[:3]
-d2 = all_dates[:2]
-print(f'使用日期（最近5日）: {d5}')
-
-combined = combined[combined['date'].isin(d5)]
-today_lots_map = today_df.set_index('stock_id')['lots'].to_dict()
+dates = sorted(combined['date'].unique(), reverse=True)[:window]
+print(f'使用日期（最近{window}日）: {dates}')
 
-
-def total_5d(sid: str) -> int:
-    return int(combined[combined['stock_id'] == sid]['lots'].sum())
-
-
-def base_row(sid: str) -> dict:
-    return {
-        'stock_id': sid,
-        '今日主力買超(張)': today_lots_map.get(sid, 0),
-        '5日累積買超(張)': total_5d(sid),
-    }
-
-
-# ---- 篩選 1：連續 3 天為正 ----
-s1_3d = []
-for sid, grp in combined.groupby('stock_id'):
-    sub = grp[grp['date'].isin(d3)]
-    if len(sub) == len(d3) and (sub['lots'] > 0).all():
-        s1_3d.append(base_row(sid))
-df_s1_3d = build_result(s1_3d, stock_map)
-print(f'篩選1 連續3天: {len(df_s1_3d)} 檔')
-
-# ---- 篩選 2：連續 5 天為正 ----
-s1_5d = []
-if len(d5) >= 5:
-    for sid, grp in combined.groupby('stock_id'):
-        sub = grp[grp['date'].isin(d5)]
-        if len(sub) == 5 and (sub['lots'] > 0).all():
-            s1_5d.append(base_row(sid))
-df_s1_5d = build_result(s1_5d, stock_map)
-print(f'篩選2 連續5天: {len(df_s1_5d)} 檔')
-
-# ---- 篩選 3：5天 ≥ 3天正且近2天皆正 ----
-s2 = []
-for sid, grp in combined.groupby('stock_id'):
-    sub5 = grp[grp['date'].isin(d5)]
-    sub2 = grp[grp['date'].isin(d2)]
-    pos_count = int((sub5['lots'] > 0).sum())
-    last2_pos = len(sub2) == len(d2) and (sub2['lots'] > 0).all()
-    if pos_count >= 3 and last2_pos:
-        r = base_row(sid)
-        r['5天正天數'] = pos_count
-        s2.append(r)
-df_s2 = build_result(s2, stock_map, extra_cols=['5天正天數'])
-print(f'篩選3 5天≥3天: {len(df_s2)} 檔')
-
-# ---- 篩選 4：5天累積排名 Top 50 ----
-rank_rows = []
-for sid, grp in combined.groupby('stock_id'):
-    rank_rows.append({
-        'stock_id': sid,
-        '今日主力買超(張)': today_lots_map.get(sid, 0),
-        '5日累積買超(張)': int(grp[grp['date'].isin(d5)]['lots'].sum()),
-    })
-df_rank = build_result(rank_rows, stock_map).head(50)
-# 重新編排名（head 後序號不變，重設即可）
-df_rank = df_rank.reset_index(drop=True)
-df_rank['排名'] = range(1, len(df_rank) + 1)
-print(f'篩選4 累積排名 Top50: {len(df_rank)} 檔')
+# ---- 四種篩選（同一個 股票 × 日期 矩陣）----
+results = screen_main_force(lots_matrix(combined, dates), registry, window=window)
+for i, (name, df) in enumerate(results.items(), 1):
+    print(f'篩選{i} {name}: {len(df)} 檔')
 
 # ---- 輸出 CSV ----
+# 非預設回溯天數另存加上後綴的檔案，不覆寫前端讀取的預設結果
 LATEST_DIR.mkdir(parents=True, exist_ok=True)
-
-df_s1_3d.to_csv(LATEST_DIR / '主力買超_連續3天.csv', index=False, encoding='utf-8-sig')
-df_s1_5d.to_csv(LATEST_DIR / '主力買超_連續5天.csv', index=False, encoding='utf-8-sig')
-df_s2.to_csv(LATEST_DIR / '主力買超_5天3正.csv',    index=False, encoding='utf-8-sig')
-df_rank.to_csv(LATEST_DIR / '主力買超_累積排名.csv', index=False, encoding='utf-8-sig')
+suffix = '' if window == WINDOW_DAYS else f'_{window}日'
+for name, df in results.items():
+    df.to_csv(LATEST_DIR / f'主力買超_{name}{suffix}.csv', index=False, encoding='utf-8-sig')
 
 print(f'\n✓ 已輸出 4 個篩選結果至 {LATEST_DIR}')
 print('完成！')
@@ -0,0 +1,239 @@
+"""
+台股綜合篩選 - 歷史回測
+以本地資料庫重播四種篩選策略在區間內每個交易日「當日」的選股結果，並計算之後的報酬：
+1. 外資大量買超
+2. 投信連續買超
+3. 強勢股篩選
+4. 盤整突破
+
+做法：
+- 整段區間（含回溯視窗與往後的報酬期間）的日K、法人資料只讀取與排序一次
+- 每個交易日只取出滾動視窗（已排序的子索引、依日期排序的法人切片），不重新排序或讀檔
+- 均線等每日指標讀取每日指標庫，回測過的日期之後直接讀取指標檔
+- 直接呼叫 股票綜合篩選 中的策略函數，選出的股票與當日執行的結果相同
+
+用法：
+    python 綜合篩選回測.py 2026-07-01 2026-10-16
+    python 綜合篩選回測.py 2026-07-01 2026-10-16 --strategies 強勢股篩選 盤整突破
+
+注意：股票清單為目前的有效股票清單（已下市股票不在回測範圍內）。
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from feature_store import FeatureStore
+from finmind_cache import taipei_today
+from market_store import MarketStore
+from stock_index import StockIndex
+from stock_registry import get_registry
+from trading_calendar import get_calendar
+from 股票綜合篩選 import (
+    INST_TRADING_DAYS,
+    PRICE_TRADING_DAYS,
+    screen_breakthrough,
+    screen_foreign_investment,
+    screen_investment_trust,
+    screen_strong_stocks,
+)
+
+# ==================== 全域設定 ====================
+
+# 往後報酬的天數（該股票之後第 N 筆日K，停牌日不計）
+FORWARD_DAYS = (1, 3, 5, 10)
+
+STRATEGIES = ('外資大量買超', '投信連續買超', '強勢股篩選', '盤整突破')
+
+OUTPUT_DIR = '../data/backtest' if os.path.exists('../data') else 'data/backtest'
+
+
+# ==================== 資料 ====================
+
+def load_range(start_date, end_date, valid_stocks):
+    """
+    讀取回測所需的整段資料（補抓本地缺少的部分）
+
+    Returns:
+        tuple: (日K個股索引 StockIndex, 依日期排序的法人長表)；無資料時為 (None, None)
+    """
+    calendar = get_calendar()
+    store = MarketStore()
+    needed = set(valid_stocks) | {'0050'}
+
+    # 日K：回溯視窗 + 回測區間 + 往後報酬期間
+    forward_end = min(
+        (datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=3 * max(FORWARD_DAYS))).strftime('%Y-%m-%d'),
+        taipei_today(),
+    )
+    forward_dates = [d for d in calendar.trading_days(end_date, forward_end) if d > end_date]
+    price_dates = calendar.trading_days(calendar.window_start(start_date, PRICE_TRADING_DAYS), end_date)
+    price_dates += forward_dates[:max(FORWARD_DAYS)]
+    print(f"  日K：{price_dates[0]} ~ {price_dates[-1]}（{len(price_dates)} 個交易日）")
+    store.ensure('price', price_dates, needed)
+    price_df = store.load_window('price', price_dates)
+
+    inst_dates = calendar.trading_days(calendar.window_start(start_date, INST_TRADING_DAYS), end_date)
+    print(f"  法人：{inst_dates[0]} ~ {inst_dates[-1]}（{len(inst_dates)} 個交易日）")
+    store.ensure('institutional', inst_dates, valid_stocks)
+    inst_df = store.load_window('institutional', inst_dates)
+
+    if price_df is None or inst_df is None:
+        return None, None
+    prices = StockIndex(price_df[price_df['stock_id'].isin(needed)])
+    # 分區依日期串接，已依日期排序；穩定排序確保同日內的順序與每日執行相同
+    inst_df = inst_df.sort_values('date', kind='stable').reset_index(drop=True)
+    print(f"  ✓ {len(prices.frame)} 筆日K、{len(inst_df)} 筆法人資料")
+    return prices, inst_df
+
+
+def forward_returns(prices, picks):
+    """
+    選股日收盤價與之後 FORWARD_DAYS 筆日K的報酬(%)
+
+    Args:
+        prices: 整段區間的日K個股索引
+        picks: 含 日期、股票代碼 的選股表
+
+    Returns:
+        DataFrame: 收盤價與各天數報酬欄位（對齊 picks 的列；資料不足為 NaN）
+    """
+    close = prices.column('close').astype(np.float64)
+    rows = prices.locate(picks['股票代碼'], picks['日期'])
+    base = np.where(rows >= 0, close[rows], np.nan)
+    out = {'收盤價': base}
+    for n in FORWARD_DAYS:
+        later = prices.shift(rows, n)
+        future = np.where(later >= 0, close[later], np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[f'{n}日報酬(%)'] = np.round(np.where(base > 0, (future - base) / base * 100, np.nan), 2)
+    return pd.DataFrame(out, index=picks.index)
+
+
+# ==================== 回測 ====================
+
+def replay_date(date, prices, inst_df, inst_dates, features, valid_stocks, stock_info, strategies):
+    """
+    重播單一交易日的選股
+
+    Returns:
+        dict: {策略: 結果 DataFrame}
+    """
+    calendar = get_calendar()
+    window = prices.between(calendar.window_start(date, PRICE_TRADING_DAYS), date)
+    lo = np.searchsorted(inst_dates, calendar.window_start(date, INST_TRADING_DAYS), side='left')
+    hi = np.searchsorted(inst_dates, date, side='right')
+    inst = inst_df.iloc[lo:hi]
+
+    runs = {
+        '外資大量買超': lambda: screen_foreign_investment(date, inst, window, valid_stocks, stock_info),
+        '投信連續買超': lambda: screen_investment_trust(date, inst, features, valid_stocks, stock_info),
+        '強勢股篩選': lambda: screen_strong_stocks(date, window, features, valid_stocks, stock_info),
+        '盤整突破': lambda: screen_breakthrough(date, window, valid_stocks, stock_info),
+    }
+    # 策略的逐步輸出在回測中不列印
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {name: runs[name]() for name in strategies}
+
+
+def run_backtest(start_date, end_date, strategies=STRATEGIES):
+    """
+    回測區間內每個交易日的選股與往後報酬
+
+    Returns:
+        tuple: (選股明細 DataFrame, 各策略摘要 DataFrame)
+    """
+    registry = get_registry()
+    valid_stocks = set(registry.codes)
+    stock_info = registry.name_by_code
+
+    print("\n[1/3] 讀取資料...")
+    prices, inst_df = load_range(start_date, end_date, valid_stocks)
+    if prices is None:
+        print("  ✗ 無法獲取資料")
+        return pd.DataFrame(), pd.DataFrame()
+
+    available = set(prices.dates)
+    dates = [d for d in get_calendar().trading_days(start_date, end_date) if d in available]
+    print(f"\n[2/3] 重播 {len(dates)} 個交易日的選股...")
+    inst_dates = inst_df['date'].to_numpy()
+    features = FeatureStore()
+
+    picks = []
+    for i, date in enumerate(dates, 1):
+        results = replay_date(date, prices, inst_df, inst_dates, features, valid_stocks, stock_info, strategies)
+        counts = []
+        for name, df in results.items():
+            counts.append(f"{name} {len(df)}")
+            if len(df) == 0:
+                continue
+            # 盤整突破同一檔股票可能有多個突破日，只計一次
+            codes = df['股票代碼'].astype(str).drop_duplicates()
+            picks.append(pd.DataFrame({
+                '日期': date,
+                '策略': name,
+                '股票代碼': codes.to_numpy(),
+                '公司名稱': [stock_info.get(c, '未知') for c in codes],
+            }))
+        print(f"  [{i}/{len(dates)}] {date}：{'、'.join(counts)}")
+
+    if not picks:
+        return pd.DataFrame(), pd.DataFrame()
+
+    print("\n[3/3] 計算往後報酬...")
+    picks = pd.concat(picks, ignore_index=True)
+    picks = pd.concat([picks, forward_returns(prices, picks)], axis=1)
+
+    summary = []
+    for name, group in picks.groupby('策略', sort=False):
+        row = {'策略': name, '選股次數': len(group), '交易日數': group['日期'].nunique()}
+        for n in FORWARD_DAYS:
+            returns = group[f'{n}日報酬(%)'].dropna()
+            row[f'{n}日平均報酬(%)'] = round(returns.mean(), 2) if len(returns) else np.nan
+            row[f'{n}日勝率(%)'] = round((returns > 0).mean() * 100, 2) if len(returns) else np.nan
+        summary.append(row)
+    return picks, pd.DataFrame(summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='台股綜合篩選歷史回測')
+    parser.add_argument('start_date', help='回測起日 YYYY-MM-DD')
+    parser.add_argument('end_date', help='回測迄日 YYYY-MM-DD')
+    parser.add_argument('--strategies', nargs='+', choices=STRATEGIES, default=list(STRATEGIES),
+                        help='要回測的策略（預設全部）')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    print("=" * 80)
+    print("台股綜合篩選 - 歷史回測".center(76))
+    print("=" * 80)
+    print(f"\n回測區間：{args.start_date} ~ {args.end_date}")
+    print(f"回測策略：{'、'.join(args.strategies)}")
+
+    picks, summary = run_backtest(args.start_date, args.end_date, args.strategies)
+    if len(picks) == 0:
+        print("\n⚠ 回測區間內沒有任何選股結果")
+        return
+
+    print("\n" + "=" * 80)
+    print("回測摘要".center(76))
+    print("=" * 80)
+    print(summary.to_string(index=False))
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    name = f"綜合篩選回測_{args.start_date.replace('-', '')}_{args.end_date.replace('-', '')}"
+    picks.to_csv(os.path.join(OUTPUT_DIR, f"{name}.csv"), index=False, encoding='utf-8-sig')
+    summary.to_csv(os.path.join(OUTPUT_DIR, f"{name}_摘要.csv"), index=False, encoding='utf-8-sig')
+    print(f"\n✓ {os.path.join(OUTPUT_DIR, name)}.csv")
+    print(f"✓ {os.path.join(OUTPUT_DIR, name)}_摘要.csv")
+    print(f"\n總執行時間：{time.time() - start_time:.2f} 秒")
+
+
+if __name__ == "__main__":
+    main()
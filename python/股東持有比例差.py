@@ -1,9 +1,12 @@
-import requests
 import pandas as pd
-import time
-import os
 from datetime import datetime, timedelta
 
+from finmind_client import get_client
+from finmind_schema import decode
+from stock_registry import get_registry
+from market_store import MarketStore
+from trading_calendar import get_calendar
+
 # 設定查詢日期
 # 注意:股東持股資料通常每週更新一次（週五）
 USE_AUTO_DATE = True  # 設為 True 自動查詢，False 使用手動日期
@@ -12,21 +15,10 @@ DAYS_BACK = 30  # 往前查詢的天數（約20個交易日）
 # MANUAL_START_DATE = "2025-11-14"
 # MANUAL_END_DATE = "2025-11-21"
 
-# API 設定
-API_URL = "https://api.finmindtrade.com/api/v4/data"
-# 優先從 token 文件讀取，如果不存在則使用環境變數
-try:
-    with open('token', 'r') as f:
-        API_TOKEN = f.read()
-except FileNotFoundError:
-    API_TOKEN = os.getenv('FINMIND_TOKEN', '')
-# 清除所有空白與控制字元（防止貼上時帶入換行符導致 HTTP header 無效）
-import re
-API_TOKEN = re.sub(r'[\s\x00-\x1f\x7f]', '', API_TOKEN)
-API_HEADERS = {"Authorization": f"Bearer {API_TOKEN}"}
+# API 設定（共用連線池與限速，token 由 finmind_client 讀取）
+client = get_client()
 
 # 檔案路徑（使用相對路徑）
-STOCK_LIST_PATH = '(all)stock_info_list.csv'
 OUTPUT_PATH = './'
 
 def get_available_dates(target_date, days_back=60):
@@ -42,7 +34,7 @@ def get_available_dates(target_date, days_back=60):
         "start_date": start_dt.strftime("%Y-%m-%d"),
         "end_date": target_date,
     }
-    resp = requests.get(API_URL, headers=API_HEADERS, params=params)
+    resp = client.get(params)
     if resp.status_code == 200:
         data = resp.json()
         if 'data' in data and data['data']:
@@ -55,16 +47,9 @@ def get_available_dates(target_date, days_back=60):
 def fetch_all_holding_data(date):
     """一次性獲取某日期所有股票的持股分散資料"""
     print(f"正在獲取 {date} 的持股資料...")
-    params = {
-        "dataset": "TaiwanStockHoldingSharesPer",
-        "start_date": date,
-        "end_date": date,
-    }
-    resp = requests.get(API_URL, headers=API_HEADERS, params=params)
-    if resp.status_code == 200:
-        data = resp.json()
-        if 'data' in data and data['data']:
-            return pd.DataFrame(data['data'])
+    data = client.fetch("TaiwanStockHoldingSharesPer", start_date=date, end_date=date)
+    if 'data' in data and data['data']:
+        return decode(data['data'], "TaiwanStockHoldingSharesPer")
     return None
 
 def get_big_buyer_levels(def_big_buyer):
@@ -102,8 +87,8 @@ def calculate_holding_change_batch(start_df, end_df, ticker):
         if start_big.empty or end_big.empty:
             return None
 
-        start_pct = round(start_big['percent'].astype(float).sum(), 1)
-        end_pct = round(end_big['percent'].astype(float).sum(), 1)
+        start_pct = round(start_big['percent'].sum(), 1)
+        end_pct = round(end_big['percent'].sum(), 1)
         diff = round(end_pct - start_pct, 1)
         pct_change = round(diff / start_pct * 100, 1) if start_pct != 0 else 0.0
 
@@ -120,7 +105,7 @@ def fetch_api_data(dataset, data_id, start_date, end_date):
         "start_date": start_date,
         "end_date": end_date,
     }
-    resp = requests.get(API_URL, headers=API_HEADERS, params=params)
+    resp = client.get(params)
     if resp.status_code == 200:
         data = resp.json()
         if 'data' in data and data['data']:
@@ -129,34 +114,24 @@ def fetch_api_data(dataset, data_id, start_date, end_date):
 
 def get_stock_data(ticker_list, start_date, end_date):
     """獲取股票價格數據並計算期間統計"""
-    all_data = []
-
-    for i, ticker in enumerate(ticker_list):
-        try:
-            df = fetch_api_data("TaiwanStockPrice", ticker, start_date, end_date)
-            if df is None or len(df.columns) < 8:
-                continue
-
-            df = df.iloc[:, [0, 1, 4, 5, 6, 7]]
-            df.columns = ['Date', 'stock_id', 'Open', 'High', 'Low', 'Close']
-            df['Date'] = pd.to_datetime(df['Date'])
-
-            for col in ['Open', 'High', 'Low', 'Close']:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            if not df[['Open', 'High', 'Low', 'Close']].isna().all().all():
-                all_data.append(df)
-
-        except Exception as e:
-            print(f"處理股票 {ticker} 時發生錯誤: {str(e)}")
-
-        if i < len(ticker_list) - 1:
-            time.sleep(0.1)
-
-    if not all_data:
+    # 日K由本地資料庫提供，缺少的部分由抓取規劃器決定以單日全市場或個股區間查詢補抓
+    tickers = {str(t) for t in ticker_list}
+    dates = get_calendar().trading_days(start_date, end_date)
+    store = MarketStore()
+    store.ensure('price', dates, tickers, client=client)
+    df = store.load_window('price', dates)
+    if df is not None:
+        df = df[df['stock_id'].isin(tickers)]
+
+    if df is None or len(df) == 0:
         return pd.DataFrame(columns=['stock_id', '第一天開盤價', '期間最高價', '期間最低價', '最後一天收盤價'])
 
-    final_df = pd.concat(all_data, ignore_index=True).sort_values(['stock_id', 'Date'])
+    df = df.rename(columns={'date': 'Date', 'open': 'Open', 'max': 'High', 'min': 'Low', 'close': 'Close'})
+    df = df[['Date', 'stock_id', 'Open', 'High', 'Low', 'Close']].copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    # 剔除整段期間都沒有價格的股票（與逐檔查詢時相同）
+    has_price = df[['Open', 'High', 'Low', 'Close']].notna().any(axis=1).groupby(df['stock_id'], observed=True).transform('any')
+    final_df = df[has_price].sort_values(['stock_id', 'Date'])
 
     result_data = []
     for stock in final_df['stock_id'].unique():
@@ -202,13 +177,11 @@ print(f"  分析期間: {(datetime.strptime(END_DATE, '%Y-%m-%d') - datetime.str
 
 # 讀取股票清單
 print("讀取股票清單...")
-stock_info = pd.read_csv(STOCK_LIST_PATH)
-valid_tickers = stock_info.iloc[:, 0].astype(str).str.zfill(4).tolist()
+valid_tickers = get_registry().codes
 print(f"共 {len(valid_tickers)} 檔股票\n")
 
 # 一次性獲取起始日期和結束日期的所有持股資料（只需 2 次 API 請求）
 start_holding_df = fetch_all_holding_data(START_DATE)
-time.sleep(1)
 end_holding_df = fetch_all_holding_data(END_DATE)
 
 if start_holding_df is None or end_holding_df is None:
@@ -266,7 +239,7 @@ else:
 # 獲取並合併公司資訊
 print("開始獲取公司資訊...")
 try:
-    resp = requests.get(API_URL, headers=API_HEADERS, params={"dataset": "TaiwanStockInfoWithWarrant"})
+    resp = client.get({"dataset": "TaiwanStockInfoWithWarrant"})
     if resp.status_code == 200:
         comp_data = resp.json()
         if 'data' in comp_data and comp_data['data']:
@@ -12,109 +12,69 @@
 - 輸出整合報告
 """
 
-import requests
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-import time
+from datetime import datetime
 import os
+import time
 import sys
 
-# ==================== 全域設定 ====================
+from feature_store import FeatureStore
+from finmind_client import get_client
+from institutional_panel import InstitutionalPanel
+from market_store import MarketStore
+from rule_engine import RuleSet
+from shared_frames import frames as shared_frames, run_parallel
+from stock_index import StockIndex
+from stock_registry import get_registry
+from trading_calendar import get_calendar
 
-# 讀取 API Token (優先從 token 文件讀取，如果不存在則使用環境變數)
-try:
-    with open('token', 'r') as f:
-        TOKEN = f.read().strip()
-except FileNotFoundError:
-    TOKEN = os.getenv('FINMIND_TOKEN', '').strip()
-
-API_URL = "https://api.finmindtrade.com/api/v4/data"
-HEADERS = {"Authorization": f"Bearer {TOKEN}"}
+# ==================== 全域設定 ====================
 
 # 自動使用今天日期（台灣時區）
 TODAY = datetime.now().strftime('%Y-%m-%d')
 
-# API 請求次數統計
-API_REQUEST_COUNT = 0
+# 資料視窗（交易日數）；多抓一日，今日資料尚未公布時仍有完整視窗
+INST_TRADING_DAYS = 5 + 1     # 法人 5 日統計
+PRICE_TRADING_DAYS = 60 + 1   # 60MA / 60 日均量
+
+# 平行執行策略的工作行程數（1 為依序執行）；>1 時長表放入共享記憶體，各策略在獨立行程中執行
+SCREEN_WORKERS = int(os.getenv('SCREEN_WORKERS', '1'))
 
 # ==================== 共用函數 ====================
 
-def get_date_range(end_date_str, days=100):
-    """計算日期範圍"""
-    end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
-    start_date = end_date - timedelta(days=days)
-    return start_date.strftime('%Y-%m-%d'), end_date_str
+def get_date_range(end_date_str, trading_days=60):
+    """計算日期範圍（截至 end_date_str 的最近 N 個交易日）"""
+    start_date = get_calendar().window_start(end_date_str, trading_days)
+    return start_date, end_date_str
 
 
 def get_valid_stock_list():
     """讀取有效股票清單"""
-    df = pd.read_csv('(all)stock_info_list.csv')
-    return set(df['股票代碼'].astype(str).tolist())
+    return set(get_registry().codes)
 
 
 def get_stock_info():
-    """讀取股票資訊（代碼、名稱）"""
-    df = pd.read_csv('(all)stock_info_list.csv')
-    df['股票代碼'] = df['股票代碼'].astype(str)
-    return df[['股票代碼', '公司名稱']].set_index('股票代碼').to_dict()['公司名稱']
+    """讀取股票資訊（代碼 → 名稱）"""
+    return get_registry().name_by_code
 
 
 def get_stock_category():
     """讀取股票族群分類（支援一對多）"""
-    df = pd.read_csv('stock_category.csv')
-    df['股票代碼'] = df['股票代碼'].astype(str)
-    # 回傳 DataFrame，保留所有記錄（包含重複的股票代碼）
-    return df[['股票代碼', '族群']]
-
+    # 回傳族群 × 股票 關聯矩陣，保留所有記錄（包含重複的股票代碼）
+    return get_registry().category_matrix()
 
-def get_all_institutional_data(start_date, end_date):
-    """批次獲取所有股票的法人買賣超資料"""
-    global API_REQUEST_COUNT
 
+def get_all_institutional_data(start_date, end_date, stocks=None):
+    """批次獲取法人買賣超資料（讀取本地資料庫，只補抓缺少的資料）"""
     print(f"  正在獲取法人買賣超資料 ({start_date} ~ {end_date})...")
 
-    start = datetime.strptime(start_date, '%Y-%m-%d')
-    end = datetime.strptime(end_date, '%Y-%m-%d')
-    date_list = []
-    current = start
-    while current <= end:
-        date_list.append(current.strftime('%Y-%m-%d'))
-        current += timedelta(days=1)
-
-    all_data = []
-    for idx, date in enumerate(date_list, 1):
-        parameter = {
-            "dataset": "TaiwanStockInstitutionalInvestorsBuySell",
-            "start_date": date,
-            "end_date": date,
-        }
-        try:
-            resp = requests.get(API_URL, headers=HEADERS, params=parameter, timeout=10)
-            API_REQUEST_COUNT += 1
-            data = resp.json()
-
-            # 檢查 API 回應狀態
-            if 'status' in data and data['status'] != 200:
-                print(f"  ⚠ API 錯誤 (日期: {date}): {data.get('msg', 'Unknown error')}")
-                if idx == 1:  # 只在第一次請求失敗時顯示詳細資訊
-                    print(f"     HTTP Status: {resp.status_code}")
-                    print(f"     Response: {data}")
-
-            if 'data' in data and len(data['data']) > 0:
-                all_data.extend(data['data'])
-        except requests.exceptions.Timeout:
-            if idx == 1:
-                print(f"  ⚠ API 請求超時 (日期: {date})")
-        except requests.exceptions.RequestException as e:
-            if idx == 1:
-                print(f"  ⚠ API 請求失敗 (日期: {date}): {str(e)}")
-        except Exception as e:
-            if idx == 1:
-                print(f"  ⚠ 未預期的錯誤 (日期: {date}): {str(e)}")
-        time.sleep(0.05)
-
-    if len(all_data) > 0:
-        df = pd.DataFrame(all_data)
+    date_list = get_calendar().trading_days(start_date, end_date)
+    store = MarketStore()
+    store.ensure('institutional', date_list, stocks)
+    df = store.load_window('institutional', date_list)
+
+    if df is not None and len(df) > 0:
         print(f"  ✓ 共獲取 {len(df)} 筆法人資料")
         return df
     else:
@@ -123,85 +83,23 @@ def get_all_institutional_data(start_date, end_date):
 
 
 def get_all_stock_prices(start_date, end_date, valid_stocks, category_stocks=None):
-    """批次獲取所有股票的日K線資料"""
-    global API_REQUEST_COUNT
+    """
+    批次獲取日K線資料（讀取本地資料庫，只補抓缺少的資料）
 
+    族群股票即使不在 valid_stocks 中也一併補齊並保留；
+    由抓取規劃器決定以單日全市場或個股區間查詢補抓。
+    """
     print(f"  正在獲取日K線資料 ({start_date} ~ {end_date})...")
 
-    start = datetime.strptime(start_date, '%Y-%m-%d')
-    end = datetime.strptime(end_date, '%Y-%m-%d')
-    date_list = []
-    current = start
-    while current <= end:
-        date_list.append(current.strftime('%Y-%m-%d'))
-        current += timedelta(days=1)
-
-    all_data = []
-    for idx, date in enumerate(date_list, 1):
-        parameter = {
-            "dataset": "TaiwanStockPrice",
-            "start_date": date,
-            "end_date": date,
-        }
-        try:
-            resp = requests.get(API_URL, headers=HEADERS, params=parameter, timeout=10)
-            API_REQUEST_COUNT += 1
-            data = resp.json()
-
-            # 檢查 API 回應狀態
-            if 'status' in data and data['status'] != 200:
-                print(f"  ⚠ API 錯誤 (日期: {date}): {data.get('msg', 'Unknown error')}")
-                if idx == 1:
-                    print(f"     HTTP Status: {resp.status_code}")
-                    print(f"     Response: {data}")
-
-            if 'data' in data and len(data['data']) > 0:
-                all_data.extend(data['data'])
-        except requests.exceptions.Timeout:
-            if idx == 1:
-                print(f"  ⚠ API 請求超時 (日期: {date})")
-        except requests.exceptions.RequestException as e:
-            if idx == 1:
-                print(f"  ⚠ API 請求失敗 (日期: {date}): {str(e)}")
-        except Exception as e:
-            if idx == 1:
-                print(f"  ⚠ 未預期的錯誤 (日期: {date}): {str(e)}")
-        time.sleep(0.05)
-
-    if len(all_data) > 0:
-        df = pd.DataFrame(all_data)
-        df = df[df['stock_id'].isin(valid_stocks) | (df['stock_id'] == '0050')]
-        print(f"  ✓ 共獲取 {len(df)} 筆價格資料")
-
-        # 如果有提供族群股票清單，補抓所有族群股票
-        if category_stocks is not None:
-            print(f"  正在補抓 {len(category_stocks)} 支族群股票的資料...")
-            補抓成功 = 0
-            for stock_id in category_stocks:
-                parameter = {
-                    "dataset": "TaiwanStockPrice",
-                    "data_id": stock_id,
-                    "start_date": start_date,
-                    "end_date": end_date,
-                }
-                try:
-                    resp = requests.get(API_URL, headers=HEADERS, params=parameter)
-                    API_REQUEST_COUNT += 1
-                    data = resp.json()
-                    if 'data' in data and len(data['data']) > 0:
-                        all_data.extend(data['data'])
-                        補抓成功 += 1
-                except Exception as e:
-                    pass
-                time.sleep(0.05)
-
-            df = pd.DataFrame(all_data)
-            # 去重（因為有些股票可能已經在批次抓取中獲得）
-            df = df.drop_duplicates(subset=['stock_id', 'date'])
-            # 允許族群股票即使不在valid_stocks中也保留
-            df = df[df['stock_id'].isin(valid_stocks) | df['stock_id'].isin(category_stocks) | (df['stock_id'] == '0050')]
-            print(f"  ✓ 補抓成功 {補抓成功} 支，去重後共 {len(df)} 筆價格資料")
+    needed = set(valid_stocks) | set(category_stocks or ()) | {'0050'}
+    date_list = get_calendar().trading_days(start_date, end_date)
+    store = MarketStore()
+    store.ensure('price', date_list, needed)
+    price_df = store.load_window('price', date_list)
 
+    if price_df is not None and len(price_df) > 0:
+        df = price_df[price_df['stock_id'].isin(needed)]
+        print(f"  ✓ 共獲取 {len(df)} 筆價格資料")
         return df
     else:
         print(f"  ✗ 無法獲取價格資料")
@@ -210,36 +108,22 @@ def get_all_stock_prices(start_date, end_date, valid_stocks, category_stocks=Non
 
 # ==================== 策略1：外資大量買超 ====================
 
-def calculate_institutional_stats(stock_df, investor_type, price_df=None):
-    """計算法人買賣超統計資料（張數，不計算金額）"""
-    if len(stock_df) == 0:
-        return {'day1_net': 0, 'day3_net': 0, 'day5_net': 0, 'day5_buy_days': 0}
-
-    investor_df = stock_df[stock_df['name'] == investor_type].copy()
-    if len(investor_df) == 0:
-        return {'day1_net': 0, 'day3_net': 0, 'day5_net': 0, 'day5_buy_days': 0}
-
-    investor_df = investor_df.sort_values('date', ascending=False)
-    investor_df['net_buy'] = investor_df['buy'].astype(float) - investor_df['sell'].astype(float)
-
-    # 計算張數
-    day1_net = int(investor_df.iloc[0]['net_buy'] / 1000) if len(investor_df) >= 1 else 0
-    day3_net = int(investor_df.head(3)['net_buy'].sum() / 1000) if len(investor_df) >= 3 else 0
-    day5_net = int(investor_df.head(5)['net_buy'].sum() / 1000) if len(investor_df) >= 5 else 0
-    day5_buy_days = (investor_df.head(5)['net_buy'] > 0).sum() if len(investor_df) >= 5 else 0
-
-    return {
-        'day1_net': day1_net,
-        'day3_net': day3_net,
-        'day5_net': day5_net,
-        'day5_buy_days': day5_buy_days
-    }
+FOREIGN_RULES = RuleSet('外資大量買超', [
+    ('當日外資買超>{min_lots}張 或 買超金額>{min_yi}億元',
+     '(net_buy / 1000 > min_lots) | (amount > min_yi * 100000000)'),
+], params={'min_lots': 5000, 'min_yi': 2})
+
 
+def screen_foreign_investment(target_date, inst_df_all, prices, valid_stocks, stock_info):
+    """
+    篩選外資大量買超
 
-def screen_foreign_investment(target_date, inst_df_all, price_df_all, valid_stocks, stock_info):
-    """篩選外資大量買超"""
+    Args:
+        prices: 日K線個股索引（StockIndex）
+    """
     print("\n【策略1：外資大量買超】")
-    print(f"  篩選條件：當日外資買超 > 5000張 或 買超金額 > 2億元")
+    print(f"  篩選條件：當日外資買超 > {FOREIGN_RULES.params['min_lots']}張 "
+          f"或 買超金額 > {FOREIGN_RULES.params['min_yi']}億元")
 
     # 找出最近的交易日
     available_dates = sorted(inst_df_all['date'].unique(), reverse=True)
@@ -251,7 +135,7 @@ def screen_foreign_investment(target_date, inst_df_all, price_df_all, valid_stoc
     print(f"  實際使用日期：{actual_date}")
 
     # 計算日期範圍
-    start_date, _ = get_date_range(actual_date, days=10)
+    start_date, _ = get_date_range(actual_date, trading_days=5)
 
     # 過濾資料
     inst_df_filtered = inst_df_all[
@@ -261,101 +145,80 @@ def screen_foreign_investment(target_date, inst_df_all, price_df_all, valid_stoc
     ]
 
     # 獲取目標日期的價格資料
-    price_target = price_df_all[price_df_all['date'] == actual_date]
+    price_target = prices.on_date(actual_date)
     if len(price_target) == 0:
         print("  ✗ 無價格資料")
         return pd.DataFrame()
 
-    price_dict = price_target.set_index('stock_id')['close'].astype(float).to_dict()
+    price_dict = dict(zip(price_target['stock_id'].astype(str), price_target['close']))
 
     # 篩選外資資料
     target_date_df = inst_df_filtered[inst_df_filtered['date'] == actual_date]
-    foreign_target = target_date_df[target_date_df['name'] == 'Foreign_Investor'].copy()
+    foreign_target = target_date_df[target_date_df['name'] == 'Foreign_Investor']
 
     if len(foreign_target) == 0:
         print("  ✗ 無外資資料")
         return pd.DataFrame()
 
-    # 計算買超
-    foreign_target['net_buy'] = foreign_target['buy'].astype(float) - foreign_target['sell'].astype(float)
-    foreign_target['net_buy_lots'] = foreign_target['net_buy'] / 1000
-    foreign_target['amount'] = foreign_target.apply(
-        lambda row: row['net_buy'] * price_dict.get(row['stock_id'], 0),
-        axis=1
-    )
+    # 計算買超（無收盤價時金額以 0 計）
+    net_buy = foreign_target['buy'] - foreign_target['sell']
+    close = foreign_target['stock_id'].astype(str).map(price_dict).fillna(0)
+    amount = net_buy * close
 
     # 篩選符合條件
-    filtered_stocks = foreign_target[
-        (foreign_target['net_buy_lots'] > 5000) |
-        (foreign_target['amount'] > 200000000)
-    ]['stock_id'].unique()
+    mask = FOREIGN_RULES.evaluate({'net_buy': net_buy, 'amount': amount})
+    filtered_stocks = foreign_target[mask]['stock_id'].unique()
 
     print(f"  符合條件：{len(filtered_stocks)} 支")
 
-    results = []
-    for stock_id in filtered_stocks:
-        stock_inst_df = inst_df_filtered[inst_df_filtered['stock_id'] == stock_id].copy()
-        foreign_stats = calculate_institutional_stats(stock_inst_df, 'Foreign_Investor')
-        trust_stats = calculate_institutional_stats(stock_inst_df, 'Investment_Trust')
-        stock_name = stock_info.get(stock_id, '未知')
-
-        results.append({
-            '股票代碼': stock_id,
-            '公司名稱': stock_name,
-            '當日外資買超(張)': foreign_stats['day1_net'],
-            '近三日外資買超(張)': foreign_stats['day3_net'],
-            '近五日外資買超(張)': foreign_stats['day5_net'],
-            '近五日外資買超天數': foreign_stats['day5_buy_days'],
-            '當日投信買超(張)': trust_stats['day1_net'],
-            '近三日投信買超(張)': trust_stats['day3_net'],
-            '近五日投信買超(張)': trust_stats['day5_net'],
-            '近五日投信買超天數': trust_stats['day5_buy_days'],
-        })
-
-    result_df = pd.DataFrame(results).sort_values('當日外資買超(張)', ascending=False)
+    # 所有股票的外資、投信統計一次算出，再取出符合條件的股票
+    panel = InstitutionalPanel(inst_df_filtered)
+    foreign_stats = panel.stats('Foreign_Investor')
+    trust_stats = panel.stats('Investment_Trust')
+    stock_ids = [str(s) for s in filtered_stocks]
+    rows = [panel.position(s) for s in stock_ids]
+
+    result_df = pd.DataFrame({
+        '股票代碼': stock_ids,
+        '公司名稱': [stock_info.get(s, '未知') for s in stock_ids],
+        '當日外資買超(張)': foreign_stats['day1_net'][rows],
+        '近三日外資買超(張)': foreign_stats['day3_net'][rows],
+        '近五日外資買超(張)': foreign_stats['day5_net'][rows],
+        '近五日外資買超天數': foreign_stats['day5_buy_days'][rows],
+        '當日投信買超(張)': trust_stats['day1_net'][rows],
+        '近三日投信買超(張)': trust_stats['day3_net'][rows],
+        '近五日投信買超(張)': trust_stats['day5_net'][rows],
+        '近五日投信買超天數': trust_stats['day5_buy_days'][rows],
+    }).sort_values('當日外資買超(張)', ascending=False)
     print(f"  ✓ 完成！找到 {len(result_df)} 支股票")
     return result_df
 
 
 # ==================== 策略2：投信連續買超 ====================
 
-def check_investment_trust_condition(stock_df, min_avg_lots=500):
-    """檢查投信買賣超條件"""
-    if len(stock_df) == 0:
-        return False, 0, 0, 0
-
-    stock_df = stock_df.sort_values('date', ascending=False).head(5)
-    stock_df['net_buy'] = stock_df['buy'].astype(float) - stock_df['sell'].astype(float)
-    buy_days = (stock_df['net_buy'] > 0).sum()
-    total_net_buy = stock_df['net_buy'].sum()
-    avg_buy_lots = total_net_buy / 1000 / 5
-
-    is_pass = (buy_days >= 4) and (avg_buy_lots >= min_avg_lots)
-    return is_pass, buy_days, int(total_net_buy), int(avg_buy_lots)
-
-
-def check_price_volatility(stock_df, threshold=0.14):
-    """檢查價格波動條件"""
-    if len(stock_df) == 0:
-        return False, 0, 0, 0, 0
-
-    stock_df = stock_df.sort_values('date', ascending=False).head(5)
-    max_price = stock_df['max'].astype(float).max()
-    min_price = stock_df['min'].astype(float).min()
-    latest_close = float(stock_df.iloc[0]['close'])
-
-    if min_price > 0:
-        volatility = (max_price - min_price) / min_price
-    else:
-        volatility = 999
-
-    return volatility <= threshold, volatility, max_price, min_price, latest_close
-
-
-def screen_investment_trust(target_date, inst_df_all, price_df_all, valid_stocks, stock_info):
-    """篩選投信連續買超"""
+TRUST_RULES = RuleSet('投信連續買超', [
+    ('近5日投信買超≥{min_buy_days}日', 'buy_days >= min_buy_days'),
+    ('平均買超≥{min_avg_lots}張', 'avg_buy_lots >= min_avg_lots'),
+    ('有近5日價格', 'has_price'),
+    ('價格波動≤{max_volatility:.0%}', 'volatility <= max_volatility'),
+    ('股價≤{max_price}元', '~(latest_close > max_price)'),
+])
+
+def screen_investment_trust(target_date, inst_df_all, features, valid_stocks, stock_info,
+                            min_buy_days=4, min_avg_lots=500, max_volatility=0.14, max_price=1000):
+    """
+    篩選投信連續買超
+
+    Args:
+        features: 每日指標庫（FeatureStore）
+        min_buy_days: 近5日投信買超天數下限
+        min_avg_lots: 近5日平均買超張數下限
+        max_volatility: 近5日 (最高價-最低價)/最低價 上限
+        max_price: 最新收盤價上限
+    """
     print("\n【策略2：投信連續買超】")
-    print(f"  篩選條件：近5日有4日投信買超、平均買超≥500張、價格波動≤14%、股價≤1000元")
+    print(f"  篩選條件：近5日有{min_buy_days}日投信買超、平均買超≥{min_avg_lots}張、"
+          f"價格波動≤{max_volatility * 100:g}%、股價≤{max_price}元")
 
     # 找出最近的交易日
     available_dates = sorted(inst_df_all['date'].unique(), reverse=True)
@@ -366,7 +229,7 @@ def screen_investment_trust(target_date, inst_df_all, price_df_all, valid_stocks
     actual_date = available_dates[0]
     print(f"  實際使用日期：{actual_date}")
 
-    start_date, _ = get_date_range(actual_date, days=10)
+    start_date, _ = get_date_range(actual_date, trading_days=5)
 
     # 過濾資料
     trust_df = inst_df_all[
@@ -374,195 +237,142 @@ def screen_investment_trust(target_date, inst_df_all, price_df_all, valid_stocks
         (inst_df_all['stock_id'].isin(valid_stocks)) &
         (inst_df_all['date'] >= start_date) &
         (inst_df_all['date'] <= actual_date)
-    ].copy()
-
-    price_df_filtered = price_df_all[
-        (price_df_all['stock_id'].isin(valid_stocks)) &
-        (price_df_all['date'] >= start_date) &
-        (price_df_all['date'] <= actual_date)
     ]
 
-    stock_list = trust_df['stock_id'].unique()
-    print(f"  檢查 {len(stock_list)} 支股票...")
-
-    results = []
-    for stock_id in stock_list:
-        stock_trust_df = trust_df[trust_df['stock_id'] == stock_id]
-        trust_pass, buy_days, total_net_buy, avg_buy_lots = check_investment_trust_condition(stock_trust_df, 500)
-
-        if not trust_pass:
-            continue
-
-        stock_price_df = price_df_filtered[price_df_filtered['stock_id'] == stock_id]
-        if len(stock_price_df) == 0:
-            continue
+    panel = InstitutionalPanel(trust_df, investors=('Investment_Trust',))
+    print(f"  檢查 {len(panel)} 支股票...")
 
-        price_pass, volatility, highest_price, lowest_price, latest_close = check_price_volatility(stock_price_df)
-
-        if not price_pass or latest_close > 1000:
-            continue
+    # 投信條件：近5筆的買超天數與平均買超張數
+    buy_days = panel.head_buy_days('Investment_Trust', 5)
+    total_net_buy = panel.head_net('Investment_Trust', 5)
+    avg_buy_lots = total_net_buy / 1000 / 5
 
-        stock_name = stock_info.get(stock_id, '未知')
-        results.append({
-            '股票代碼': stock_id,
-            '公司名稱': stock_name,
-            '最新收盤價': latest_close,
-            '投信買超天數': buy_days,
-            '投信5日淨買超': total_net_buy,
-            '平均買超張數': avg_buy_lots,
-            '5日最高價': highest_price,
-            '5日最低價': lowest_price,
-            '價格波動率': f"{volatility*100:.2f}%",
-        })
+    # 價格條件：近5個交易日的最高價、最低價與最新收盤價（對齊投信面板的股票順序）
+    daily = features.get(actual_date).set_index('stock_id')
+    daily = daily[daily['bars_5d'] > 0].reindex(panel.stocks)
+    has_price = daily['bars_5d'].notna().to_numpy()
+    highest_price = daily['high_5d'].to_numpy()
+    lowest_price = daily['low_5d'].to_numpy()
+    latest_close = daily['close'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volatility = np.where(lowest_price > 0, (highest_price - lowest_price) / lowest_price, 999)
+
+    mask = TRUST_RULES.evaluate(
+        {
+            'buy_days': buy_days,
+            'avg_buy_lots': avg_buy_lots,
+            'has_price': has_price,
+            'volatility': volatility,
+            'latest_close': latest_close,
+        },
+        min_buy_days=min_buy_days, min_avg_lots=min_avg_lots,
+        max_volatility=max_volatility, max_price=max_price,
+    )
 
-    result_df = pd.DataFrame(results)
+    stock_ids = [s for s, ok in zip(panel.stocks, mask) if ok]
+    result_df = pd.DataFrame({
+        '股票代碼': stock_ids,
+        '公司名稱': [stock_info.get(s, '未知') for s in stock_ids],
+        '最新收盤價': latest_close[mask],
+        '投信買超天數': buy_days[mask],
+        '投信5日淨買超': total_net_buy[mask],
+        '平均買超張數': np.trunc(avg_buy_lots[mask]).astype(np.int64),
+        '5日最高價': highest_price[mask],
+        '5日最低價': lowest_price[mask],
+        '價格波動率': [f"{v * 100:.2f}%" for v in volatility[mask]],
+    })
     print(f"  ✓ 完成！找到 {len(result_df)} 支股票")
     return result_df
 
 
 # ==================== 策略3：強勢股篩選 ====================
 
-def calculate_ma(stock_df, period):
-    """計算移動平均線"""
-    if len(stock_df) < period:
-        return None
-    close_prices = stock_df.head(period)['close'].astype(float)
-    return close_prices.mean()
-
-
-def calculate_volume_ma(stock_df, period):
-    """計算成交量移動平均"""
-    if len(stock_df) < period:
-        return None
-    volumes = stock_df.head(period)['Trading_Volume'].astype(float)
-    return volumes.mean()
-
-
-def calculate_return(stock_df, days=10):
-    """計算N日漲幅"""
-    if len(stock_df) < days + 1:
-        return None
-    latest_close = float(stock_df.iloc[0]['close'])
-    past_close = float(stock_df.iloc[days]['close'])
-    if past_close == 0:
-        return None
-    return ((latest_close - past_close) / past_close) * 100
-
-
-def check_strong_stock_conditions(stock_df, target_date, benchmark_return_10d):
-    """檢查強勢股條件"""
-    if len(stock_df) < 60:
-        return False, None
-
-    today_data = stock_df.iloc[0]
-    today_close = float(today_data['close'])
-    today_volume = float(today_data['Trading_Volume'])
-
-    # 條件1: 近10日最高價
-    last_10_days = stock_df.head(10)
-    max_close_10d = last_10_days['close'].astype(float).max()
-    if today_close < max_close_10d:
-        return False, None
-
-    # 計算均線
-    ma_10 = calculate_ma(stock_df, 10)
-    ma_20 = calculate_ma(stock_df, 20)
-    ma_60 = calculate_ma(stock_df, 60)
-
-    if ma_10 is None or ma_20 is None or ma_60 is None:
-        return False, None
-
-    # 條件2: 多頭排列
-    if not (ma_10 > ma_20 > ma_60):
-        return False, None
-
-    # 條件3: 收盤價 > 20MA
-    if today_close <= ma_20:
-        return False, None
-
-    # 條件4: 十日漲幅 > 0050
-    stock_return_10d = calculate_return(stock_df, 10)
-    if stock_return_10d is None or stock_return_10d <= benchmark_return_10d:
-        return False, None
-
-    # 條件5: 成交量 > 10000張
-    today_volume_lots = today_volume / 1000
-    if today_volume_lots <= 10000:
-        return False, None
-
-    # 條件6: 量能比 >= 1.5
-    vol_ma_5 = calculate_volume_ma(stock_df, 5)
-    vol_ma_60 = calculate_volume_ma(stock_df, 60)
-
-    if vol_ma_5 is None or vol_ma_60 is None or vol_ma_60 == 0:
-        return False, None
-
-    volume_ratio = vol_ma_5 / vol_ma_60
-    if volume_ratio < 1.5:
-        return False, None
-
-    detail = {
-        '收盤價': today_close,
-        '10MA': round(ma_10, 2),
-        '20MA': round(ma_20, 2),
-        '60MA': round(ma_60, 2),
-        '近10日漲幅': round(stock_return_10d, 2),
-        '成交量(張)': int(today_volume_lots),
-        '量能比(5MA/60MA)': round(volume_ratio, 2),
+STRONG_STOCK_RULES = RuleSet('強勢股', [
+    ('資料滿{min_bars}日', 'bars >= min_bars'),
+    ('近10日最高價', 'close >= high10'),
+    ('多頭排列', '(ma10 > ma20) & (ma20 > ma60)'),
+    ('收盤價>20MA', 'close > ma20'),
+    ('十日漲幅>0050', 'ret10 > benchmark_return_10d'),
+    ('成交量>{min_lots}張', 'volume_lots > min_lots'),
+    ('量能比≥{min_volume_ratio}', 'volume_ratio >= min_volume_ratio'),
+], params={'min_bars': 60, 'min_lots': 10000, 'min_volume_ratio': 1.5})
+
+
+def strong_stock_mask(features, benchmark_return_10d, verbose=True):
+    """
+    強勢股條件（讀取每日指標庫的欄位，依 STRONG_STOCK_RULES 篩選）
+
+    Returns:
+        tuple: (符合條件的布林陣列, 指標 dict)
+    """
+    vol_ma_5 = features['vol_ma5'].to_numpy()
+    vol_ma_60 = features['vol_ma60'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volume_ratio = np.where(vol_ma_60 != 0, vol_ma_5 / vol_ma_60, np.nan)
+
+    table = {col: features[col].to_numpy() for col in ('bars', 'close', 'high10', 'ma10', 'ma20', 'ma60', 'ret10')}
+    table['volume_lots'] = features['volume'].to_numpy() / 1000
+    table['volume_ratio'] = volume_ratio
+    mask = STRONG_STOCK_RULES.evaluate(table, verbose=verbose, benchmark_return_10d=benchmark_return_10d)
+    metrics = {
+        'close': table['close'],
+        'return_10d': table['ret10'],
+        'volume_lots': table['volume_lots'],
+        'volume_ratio': volume_ratio,
     }
+    return mask, metrics
 
-    return True, detail
 
+def screen_strong_stocks(target_date, prices, features, valid_stocks, stock_info):
+    """
+    篩選強勢股
 
-def screen_strong_stocks(target_date, price_df_all, valid_stocks, stock_info):
-    """篩選強勢股"""
+    Args:
+        prices: 日K線個股索引（StockIndex）
+        features: 每日指標庫（FeatureStore）
+    """
     print("\n【策略3：強勢股篩選】")
     print(f"  篩選條件：多頭排列、近10日最高、漲幅>0050、大量能")
 
     # 找出最近的交易日
-    available_dates = sorted(price_df_all['date'].unique(), reverse=True)
-    if len(available_dates) == 0:
+    actual_date = prices.latest_date
+    if actual_date is None:
         print("  ✗ 無可用的交易日資料")
         return pd.DataFrame()
 
-    actual_date = available_dates[0]
     print(f"  實際使用日期：{actual_date}")
 
-    start_date, _ = get_date_range(actual_date, days=100)
+    daily = features.get(actual_date)
+    stock_ids = daily['stock_id'].tolist()
 
     # 計算0050基準
-    benchmark_df = price_df_all[price_df_all['stock_id'] == '0050'].copy()
-    benchmark_df = benchmark_df.sort_values('date', ascending=False)
-    benchmark_return_10d = calculate_return(benchmark_df, 10)
+    benchmark = daily.loc[daily['stock_id'] == '0050', 'ret10']
+    benchmark_return_10d = benchmark.iloc[0] if len(benchmark) else np.nan
 
-    if benchmark_return_10d is None:
+    if np.isnan(benchmark_return_10d):
         print("  ✗ 無法計算0050漲幅")
         return pd.DataFrame()
 
     print(f"  0050 十日漲幅: {benchmark_return_10d:.2f}%")
 
     # 篩選股票
-    stock_list = price_df_all[price_df_all['stock_id'].isin(valid_stocks)]['stock_id'].unique()
-    print(f"  檢查 {len(stock_list)} 支股票...")
-
-    results = []
-    for stock_id in stock_list:
-        stock_price_df = price_df_all[price_df_all['stock_id'] == stock_id].copy()
-        stock_price_df = stock_price_df.sort_values('date', ascending=False)
-
-        is_pass, detail = check_strong_stock_conditions(stock_price_df, actual_date, benchmark_return_10d)
+    candidates = np.isin(stock_ids, list(valid_stocks))
+    print(f"  檢查 {candidates.sum()} 支股票...")
 
-        if not is_pass:
-            continue
+    daily = daily[candidates]
+    stock_ids = daily['stock_id'].tolist()
+    mask, metrics = strong_stock_mask(daily, benchmark_return_10d)
 
-        stock_name = stock_info.get(stock_id, '未知')
+    results = []
+    for i in np.flatnonzero(mask):
+        stock_id = stock_ids[i]
         results.append({
             '股票代碼': stock_id,
-            '公司名稱': stock_name,
-            '收盤價': detail['收盤價'],
-            '近10日漲幅': f"{detail['近10日漲幅']}%",
-            '成交量(張)': detail['成交量(張)'],
-            '量能比': detail['量能比(5MA/60MA)'],
+            '公司名稱': stock_info.get(stock_id, '未知'),
+            '收盤價': float(metrics['close'][i]),
+            '近10日漲幅': f"{round(float(metrics['return_10d'][i]), 2)}%",
+            '成交量(張)': int(metrics['volume_lots'][i]),
+            '量能比': round(float(metrics['volume_ratio'][i]), 2),
         })
 
     result_df = pd.DataFrame(results)
@@ -572,112 +382,91 @@ def screen_strong_stocks(target_date, price_df_all, valid_stocks, stock_info):
 
 # ==================== 策略4：盤整突破 ====================
 
-def check_breakthrough(stock_df, target_date, check_days=3):
-    """檢查盤整突破"""
-    if len(stock_df) < 20 + check_days:
-        return False, []
-
-    stock_df = stock_df.sort_values('date', ascending=False)
-
-    target_row = stock_df[stock_df['date'] == target_date]
-    if len(target_row) == 0:
-        return False, []
-
-    today_close = float(target_row.iloc[0]['close'])
-    target_idx = stock_df[stock_df['date'] == target_date].index[0]
-    target_position = stock_df.index.get_loc(target_idx)
-
-    check_range_df = stock_df.iloc[target_position:target_position + check_days]
-    breakthrough_list = []
-
-    for idx, row in check_range_df.iterrows():
-        check_date = row['date']
-        check_open = float(row['open'])
-        check_volume = float(row['Trading_Volume'])
-        check_volume_lots = check_volume / 1000
-
-        check_position = stock_df.index.get_loc(idx)
-        ma_data = stock_df.iloc[check_position:check_position + 20]
-
-        if len(ma_data) < 20:
-            continue
-
-        volumes = ma_data.head(20)['Trading_Volume'].astype(float)
-        volume_ma_20 = volumes.mean()
-
-        if volume_ma_20 == 0:
-            continue
-
-        volume_ma_20_lots = volume_ma_20 / 1000
-        volume_ratio = check_volume_lots / volume_ma_20_lots
-
-        if volume_ratio > 3 and check_volume_lots > 5000:
-            if check_open > 0:
-                price_change_pct = ((today_close - check_open) / check_open) * 100
-            else:
-                price_change_pct = 0
+def breakthrough_mask(panel, check_days=3, ma_days=20, volume_multiple=3, min_lots=5000):
+    """
+    盤整突破條件（所有股票、最近 check_days 個交易日一次計算）
+
+    第 j 列檢查各股票倒數第 j+1 筆：成交量 > 前 ma_days 筆（含當日）均量的 volume_multiple 倍
+    且成交量 > min_lots 張。
+
+    Returns:
+        tuple: (check_days × 股票 的布林陣列, 指標 dict)
+    """
+    volume_lots = panel.recent('Trading_Volume', check_days) / 1000
+    volume_ma_lots = panel.rolling_mean('Trading_Volume', ma_days, check_days) / 1000
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volume_ratio = np.where(volume_ma_lots != 0, volume_lots / volume_ma_lots, np.nan)
+
+    mask = (
+        panel.has(ma_days + check_days)
+        & (volume_ratio > volume_multiple)
+        & (volume_lots > min_lots)
+    )
+    metrics = {
+        'open': panel.recent('open', check_days),
+        'volume_lots': volume_lots,
+        'volume_ma_lots': volume_ma_lots,
+        'volume_ratio': volume_ratio,
+    }
+    return mask, metrics
 
-            breakthrough_list.append({
-                'breakthrough_date': check_date,
-                'breakthrough_price': check_open,
-                'breakthrough_volume': int(check_volume_lots),
-                'volume_ma_20': int(volume_ma_20_lots),
-                'volume_ratio': round(volume_ratio, 2),
-                'price_change_pct': round(price_change_pct, 2)
-            })
 
-    if len(breakthrough_list) > 0:
-        return True, breakthrough_list
-    else:
-        return False, []
+def screen_breakthrough(target_date, prices, valid_stocks, stock_info,
+                        check_days=3, ma_days=20, volume_multiple=3, min_lots=5000):
+    """
+    篩選盤整突破
 
-
-def screen_breakthrough(target_date, price_df_all, valid_stocks, stock_info):
-    """篩選盤整突破"""
+    Args:
+        prices: 日K線個股索引（StockIndex）
+        check_days: 檢查最近幾個交易日內的突破
+        ma_days: 均量天數
+        volume_multiple: 成交量需大於均量的倍數
+        min_lots: 成交量下限（張）
+    """
     print("\n【策略4：盤整突破】")
-    print(f"  篩選條件：成交量>20MA的3倍、成交量>5000張、近3個交易日內突破")
+    print(f"  篩選條件：成交量>{ma_days}MA的{volume_multiple}倍、成交量>{min_lots}張、近{check_days}個交易日內突破")
 
     # 找出最近的交易日
-    available_dates = sorted(price_df_all['date'].unique(), reverse=True)
-    if len(available_dates) < 3:
+    if len(prices.dates) < check_days:
         print("  ✗ 交易日資料不足")
         return pd.DataFrame()
 
-    actual_date = available_dates[0]
+    actual_date = prices.latest_date
     print(f"  實際使用日期：{actual_date}")
 
-    start_date, _ = get_date_range(actual_date, days=40)
+    panel = prices.panel()
 
-    # 篩選股票
-    stock_list = price_df_all[price_df_all['stock_id'].isin(valid_stocks)]['stock_id'].unique()
-    print(f"  檢查 {len(stock_list)} 支股票...")
+    # 篩選股票（最新一筆須為實際使用日期）
+    candidates = np.isin(panel.stocks, list(valid_stocks))
+    print(f"  檢查 {candidates.sum()} 支股票...")
+
+    mask, metrics = breakthrough_mask(panel, check_days, ma_days, volume_multiple, min_lots)
+    mask &= candidates & (panel.date(0) == actual_date)
+
+    today_close = panel.value('close')
+    check_dates = panel.recent_dates(check_days)
 
     results = []
-    for stock_id in stock_list:
-        stock_price_df = price_df_all[price_df_all['stock_id'] == stock_id].copy()
-        stock_price_df = stock_price_df.sort_values('date', ascending=False)
-
-        is_breakthrough, breakthrough_list = check_breakthrough(stock_price_df, actual_date, 3)
-
-        if not is_breakthrough:
-            continue
-
-        stock_name = stock_info.get(stock_id, '未知')
-        today_row = stock_price_df[stock_price_df['date'] == actual_date]
-        today_close_price = float(today_row.iloc[0]['close']) if len(today_row) > 0 else 0
-
-        for bt in breakthrough_list:
-            results.append({
-                '股票代碼': stock_id,
-                '公司名稱': stock_name,
-                '突破日期': bt['breakthrough_date'],
-                '突破日股價': bt['breakthrough_price'],
-                '今日收盤價': today_close_price,
-                '今日至突破日漲跌幅': f"{bt['price_change_pct']}%",
-                '突破日成交量(張)': bt['breakthrough_volume'],
-                '20MA成交量(張)': bt['volume_ma_20'],
-                '成交量倍數': bt['volume_ratio'],
-            })
+    # 依股票、再依日期由近到遠輸出，與逐檔檢查的順序相同
+    for i, j in zip(*np.nonzero(mask.T)):
+        stock_id = panel.stocks[i]
+        check_open = float(metrics['open'][j, i])
+        close = float(today_close[i])
+        if check_open > 0:
+            price_change_pct = ((close - check_open) / check_open) * 100
+        else:
+            price_change_pct = 0
+        results.append({
+            '股票代碼': stock_id,
+            '公司名稱': stock_info.get(stock_id, '未知'),
+            '突破日期': check_dates[j, i],
+            '突破日股價': check_open,
+            '今日收盤價': close,
+            '今日至突破日漲跌幅': f"{round(price_change_pct, 2)}%",
+            '突破日成交量(張)': int(metrics['volume_lots'][j, i]),
+            f'{ma_days}MA成交量(張)': int(metrics['volume_ma_lots'][j, i]),
+            '成交量倍數': round(float(metrics['volume_ratio'][j, i]), 2),
+        })
 
     result_df = pd.DataFrame(results)
     if len(result_df) > 0:
@@ -689,75 +478,45 @@ def screen_breakthrough(target_date, price_df_all, valid_stocks, stock_info):
 
 # ==================== 新增功能：族群個股資料與族群排名 ====================
 
-def calculate_stock_return(stock_df, days=1):
-    """計算股票N日漲跌幅"""
-    if len(stock_df) < days + 1:
-        return None
-
-    stock_df = stock_df.sort_values('date', ascending=False)
-    latest_close = float(stock_df.iloc[0]['close'])
-    past_close = float(stock_df.iloc[days]['close'])
-
-    if past_close == 0:
-        return None
+def generate_category_stock_data(actual_date, prices, inst_df_all, stock_info, categories):
+    """
+    生成族群個股資料（支援一對多）
 
-    return ((latest_close - past_close) / past_close) * 100
-
-
-def generate_category_stock_data(actual_date, price_df_all, inst_df_all, stock_info, stock_category_df):
-    """生成族群個股資料（支援一對多）"""
+    Args:
+        prices: 日K線個股索引（StockIndex）
+        categories: 族群 × 股票 關聯矩陣（CategoryMatrix）
+    """
     print("\n【生成族群個股資料】")
 
-    # 取得所有唯一股票代碼
-    category_stocks = set(stock_category_df['股票代碼'].unique())
-    print(f"  族群內唯一股票數量：{len(category_stocks)}")
-    print(f"  族群記錄總數：{len(stock_category_df)}")
-
-    # 過濾價格資料
-    stock_list = price_df_all[price_df_all['stock_id'].isin(category_stocks)]['stock_id'].unique()
-    print(f"  有價格資料的股票：{len(stock_list)}")
-
-    results = []
-    # 對每個「股票代碼-族群」組合生成一筆記錄
-    for _, row in stock_category_df.iterrows():
-        stock_id = row['股票代碼']
-        category = row['族群']
-
-        # 檢查該股票是否有價格資料
-        if stock_id not in stock_list:
-            continue
-
-        stock_price_df = price_df_all[price_df_all['stock_id'] == stock_id].copy()
-        stock_price_df = stock_price_df.sort_values('date', ascending=False)
-
-        # 檢查是否有今日資料
-        today_data = stock_price_df[stock_price_df['date'] == actual_date]
-        if len(today_data) == 0:
-            continue
-
-        # 計算漲跌幅
-        return_1d = calculate_stock_return(stock_price_df, 1)
-        return_3d = calculate_stock_return(stock_price_df, 3)
-
-        if return_1d is None:
-            continue
-
-        # 今日成交量
-        today_volume = float(today_data.iloc[0]['Trading_Volume']) / 1000
-
-        # 取得公司名稱
-        stock_name = stock_info.get(stock_id, '未知')
-
-        results.append({
-            '股票代碼': stock_id,
-            '公司名稱': stock_name,
-            '族群': category,
-            '今日漲跌幅': round(return_1d, 2),
-            '近三交易日漲跌幅': round(return_3d, 2) if return_3d is not None else 0,
-            '今日成交量': int(today_volume),
-        })
-
-    result_df = pd.DataFrame(results)
+    pair_rows, pair_cols = categories.pairs()
+    print(f"  族群內唯一股票數量：{len(categories.stocks)}")
+    print(f"  族群記錄總數：{len(pair_rows)}")
+
+    # 族群股票在面板中的位置（沒有價格資料的股票不輸出）
+    panel = prices.panel()
+    positions = [panel.position(s) for s in categories.stocks]
+    listed = np.array([p is not None for p in positions], dtype=bool)
+    positions = np.array([p or 0 for p in positions], dtype=np.int64)
+    print(f"  有價格資料的股票：{listed.sum()}")
+
+    # 個股指標（對齊族群矩陣的股票欄位）：需有今日資料且可計算今日漲跌幅
+    has_today = listed & (panel.date(0)[positions] == actual_date)
+    return_1d = np.where(has_today, panel.change_pct('close', 1)[positions], np.nan)
+    return_3d = np.where(listed, panel.change_pct('close', 3)[positions], np.nan)
+    today_volume = np.where(listed, panel.value('Trading_Volume')[positions] / 1000, 0)
+
+    # 每個「股票代碼-族群」組合一筆記錄
+    keep = ~np.isnan(return_1d[pair_cols])
+    rows, cols = pair_rows[keep], pair_cols[keep]
+    stock_ids = [categories.stocks[j] for j in cols]
+    result_df = pd.DataFrame({
+        '股票代碼': stock_ids,
+        '公司名稱': [stock_info.get(s, '未知') for s in stock_ids],
+        '族群': [categories.categories[i] for i in rows],
+        '今日漲跌幅': [round(float(v), 2) for v in return_1d[cols]],
+        '近三交易日漲跌幅': [0 if np.isnan(v) else round(float(v), 2) for v in return_3d[cols]],
+        '今日成交量': today_volume[cols].astype(np.int64),
+    })
 
     # 依族群分組，每個族群內用今日漲跌幅排序
     if len(result_df) > 0:
@@ -767,108 +526,84 @@ def generate_category_stock_data(actual_date, price_df_all, inst_df_all, stock_i
     return result_df
 
 
-def generate_category_ranking(actual_date, price_df_all, inst_df_all, stock_category, category_stock_df):
-    """生成族群排名"""
+def generate_category_ranking(actual_date, prices, inst_df_all, categories, category_stock_df):
+    """
+    生成族群排名
+
+    Args:
+        prices: 日K線個股索引（StockIndex）
+        categories: 族群 × 股票 關聯矩陣（CategoryMatrix）
+        category_stock_df: generate_category_stock_data 的結果（提供今日漲跌幅）
+    """
     print("\n【生成族群排名】")
 
     if len(category_stock_df) == 0:
         print("  ✗ 無族群個股資料")
         return pd.DataFrame()
 
-    # 計算每個族群的統計資料
-    category_stats = []
-
-    for category in category_stock_df['族群'].unique():
-        category_df = category_stock_df[category_stock_df['族群'] == category]
-
-        # 族群平均漲幅
-        avg_return = category_df['今日漲跌幅'].mean()
-
-        # 族群上漲檔數
-        up_count = (category_df['今日漲跌幅'] > 0).sum()
-        total_count = len(category_df)
-        up_pct = (up_count / total_count * 100) if total_count > 0 else 0
-
-        # 取得該族群的股票代碼
-        category_stock_ids = category_df['股票代碼'].tolist()
-
-        # 計算法人買賣超
-        category_inst_df = inst_df_all[inst_df_all['stock_id'].isin(category_stock_ids)]
-
-        # 外資買超（金額）
-        foreign_df = category_inst_df[category_inst_df['name'] == 'Foreign_Investor'].copy()
-        foreign_df = foreign_df.sort_values('date', ascending=False)
-
-        foreign_1d = 0
-        foreign_3d = 0
-        if len(foreign_df) > 0:
-            foreign_df['net_buy'] = foreign_df['buy'].astype(float) - foreign_df['sell'].astype(float)
-
-            # 為每筆交易加上股價，計算金額
-            for stock_id in category_stock_ids:
-                stock_price_df = price_df_all[price_df_all['stock_id'] == stock_id]
-                stock_foreign_df = foreign_df[foreign_df['stock_id'] == stock_id]
-
-                for idx, row in stock_foreign_df.iterrows():
-                    price_row = stock_price_df[stock_price_df['date'] == row['date']]
-                    if len(price_row) > 0:
-                        stock_price = float(price_row.iloc[0]['close'])
-                        # 計算買超金額（張數 * 1000 * 股價）
-                        foreign_df.loc[idx, 'net_buy_amount'] = (row['net_buy'] / 1000) * 1000 * stock_price
-                    else:
-                        foreign_df.loc[idx, 'net_buy_amount'] = 0
-
-            # 最近一日
-            day1_df = foreign_df[foreign_df['date'] == actual_date]
-            foreign_1d = int(day1_df['net_buy_amount'].sum()) if len(day1_df) > 0 else 0
-            # 近三日
-            dates = sorted(foreign_df['date'].unique(), reverse=True)[:3]
-            day3_df = foreign_df[foreign_df['date'].isin(dates)]
-            foreign_3d = int(day3_df['net_buy_amount'].sum()) if len(day3_df) > 0 else 0
-
-        # 投信買超（金額）
-        trust_df = category_inst_df[category_inst_df['name'] == 'Investment_Trust'].copy()
-        trust_df = trust_df.sort_values('date', ascending=False)
-
-        trust_1d = 0
-        trust_3d = 0
-        if len(trust_df) > 0:
-            trust_df['net_buy'] = trust_df['buy'].astype(float) - trust_df['sell'].astype(float)
-
-            # 為每筆交易加上股價，計算金額
-            for stock_id in category_stock_ids:
-                stock_price_df = price_df_all[price_df_all['stock_id'] == stock_id]
-                stock_trust_df = trust_df[trust_df['stock_id'] == stock_id]
-
-                for idx, row in stock_trust_df.iterrows():
-                    price_row = stock_price_df[stock_price_df['date'] == row['date']]
-                    if len(price_row) > 0:
-                        stock_price = float(price_row.iloc[0]['close'])
-                        # 計算買超金額（張數 * 1000 * 股價）
-                        trust_df.loc[idx, 'net_buy_amount'] = (row['net_buy'] / 1000) * 1000 * stock_price
-                    else:
-                        trust_df.loc[idx, 'net_buy_amount'] = 0
-
-            # 最近一日
-            day1_df = trust_df[trust_df['date'] == actual_date]
-            trust_1d = int(day1_df['net_buy_amount'].sum()) if len(day1_df) > 0 else 0
-            # 近三日
-            dates = sorted(trust_df['date'].unique(), reverse=True)[:3]
-            day3_df = trust_df[trust_df['date'].isin(dates)]
-            trust_3d = int(day3_df['net_buy_amount'].sum()) if len(day3_df) > 0 else 0
-
-        category_stats.append({
-            '族群': category,
-            '族群平均漲幅': round(avg_return, 2),
-            f'族群上漲檔數(%)': round(up_pct, 2),
-            '族群上漲檔數(數量)': f"{up_count}/{total_count}",
-            '外資近一日總買超(億元)': round(foreign_1d / 100000000, 2),
-            '外資近三日總買超(億元)': round(foreign_3d / 100000000, 2),
-            '投信近一日總買超(億元)': round(trust_1d / 100000000, 2),
-            '投信近三日總買超(億元)': round(trust_3d / 100000000, 2),
-        })
-
-    result_df = pd.DataFrame(category_stats)
+    # 族群平均漲幅與上漲檔數：今日漲跌幅向量 × 關聯矩陣
+    returns = categories.align(
+        category_stock_df.drop_duplicates('股票代碼').set_index('股票代碼')['今日漲跌幅']
+    )
+    total_count = categories.count(~np.isnan(returns)).astype(np.int64)
+    up_count = categories.count(returns > 0).astype(np.int64)
+    avg_return = categories.mean(returns)
+
+    # 法人買賣超金額（張數 * 1000 * 股價，無股價時為 0）：(日期 × 股票) 矩陣 × 關聯矩陣
+    investors = ['Foreign_Investor', 'Investment_Trust']
+    inst = inst_df_all[inst_df_all['name'].isin(investors)]
+    flow = pd.DataFrame({
+        'stock_id': inst['stock_id'].astype(str).to_numpy(),
+        'date': inst['date'].to_numpy(),
+        'name': inst['name'].astype(str).to_numpy(),
+        'net_buy': (inst['buy'] - inst['sell']).to_numpy(),
+    })
+    close = pd.DataFrame({
+        'stock_id': prices.frame['stock_id'].astype(str).to_numpy(),
+        'date': prices.column('date'),
+        'close': prices.column('close'),
+    }).drop_duplicates(['stock_id', 'date'])
+    flow = flow.merge(close, on=['stock_id', 'date'], how='left')
+    amount = (flow['net_buy'] / 1000 * 1000 * flow['close']).fillna(0).to_numpy()
+    date_codes, dates = pd.factorize(flow['date'], sort=True)
+    stock_cols = categories.columns_of(flow['stock_id'])
+
+    # 只計入族群個股資料中的成員（今日有漲跌幅的股票）
+    listed = np.append(~np.isnan(returns), False)[stock_cols]
+
+    totals = {}
+    for investor in investors:
+        sel = (flow['name'].to_numpy() == investor) & listed
+        shape = (len(dates), len(categories.stocks))
+        amounts = np.zeros(shape)
+        np.add.at(amounts, (date_codes[sel], stock_cols[sel]), amount[sel])
+        present = np.zeros(shape, dtype=bool)
+        present[date_codes[sel], stock_cols[sel]] = True
+
+        by_date = categories.dot(amounts, binary=True)
+        # 近三日：各族群有該法人資料的最近 3 個日期
+        has_date = categories.count(present, binary=True) > 0
+        recent = has_date & (np.cumsum(has_date[::-1], axis=0)[::-1] <= 3)
+        totals[investor, 1] = by_date[np.asarray(dates) == actual_date].sum(axis=0)
+        totals[investor, 3] = (by_date * recent).sum(axis=0)
+
+    def billions(values):
+        # 金額先捨去小數至整數元，再換算億元
+        return [round(int(v) / 100000000, 2) for v in values]
+
+    # 族群依名稱排序（與族群個股資料的分組順序相同），只保留有個股資料的族群
+    order = sorted((i for i in range(len(categories.categories)) if total_count[i] > 0),
+                   key=lambda i: categories.categories[i])
+    result_df = pd.DataFrame({
+        '族群': [categories.categories[i] for i in order],
+        '族群平均漲幅': np.round(avg_return[order], 2),
+        f'族群上漲檔數(%)': np.round(up_count[order] / total_count[order] * 100, 2),
+        '族群上漲檔數(數量)': [f"{up_count[i]}/{total_count[i]}" for i in order],
+        '外資近一日總買超(億元)': billions(totals['Foreign_Investor', 1][order]),
+        '外資近三日總買超(億元)': billions(totals['Foreign_Investor', 3][order]),
+        '投信近一日總買超(億元)': billions(totals['Investment_Trust', 1][order]),
+        '投信近三日總買超(億元)': billions(totals['Investment_Trust', 3][order]),
+    })
 
     # 依上漲檔數(%)排序，並加上排名
     if len(result_df) > 0:
@@ -881,6 +616,63 @@ def generate_category_ranking(actual_date, price_df_all, inst_df_all, stock_cate
 
 # ==================== 主程式 ====================
 
+# ==================== 策略執行 ====================
+
+STRATEGIES = ('外資大量買超', '投信連續買超', '強勢股篩選', '盤整突破', '族群')
+
+# 各策略共用的資料（依序執行時由 main 設定，平行執行時由各工作行程建立）
+_CONTEXT = {}
+
+
+def set_strategy_context(prices, inst_df_all, valid_stocks, stock_info, categories, actual_trade_date):
+    """設定各策略共用的資料"""
+    _CONTEXT.update(
+        prices=prices,
+        inst_df_all=inst_df_all,
+        features=FeatureStore(),
+        valid_stocks=valid_stocks,
+        stock_info=stock_info,
+        categories=categories,
+        actual_trade_date=actual_trade_date,
+    )
+
+
+def _init_worker(valid_stocks, stock_info, actual_trade_date):
+    """工作行程初始化：由共享記憶體中的長表重建個股索引"""
+    frames = shared_frames()
+    set_strategy_context(
+        StockIndex(frames['price']), frames['institutional'],
+        valid_stocks, stock_info, get_stock_category(), actual_trade_date,
+    )
+
+
+def run_strategy(name, target_date):
+    """
+    執行單一策略
+
+    Returns:
+        DataFrame: 篩選結果；'族群' 回傳 (族群個股資料, 族群排名)
+    """
+    c = _CONTEXT
+    if name == '外資大量買超':
+        return screen_foreign_investment(target_date, c['inst_df_all'], c['prices'], c['valid_stocks'], c['stock_info'])
+    if name == '投信連續買超':
+        return screen_investment_trust(target_date, c['inst_df_all'], c['features'], c['valid_stocks'], c['stock_info'])
+    if name == '強勢股篩選':
+        return screen_strong_stocks(target_date, c['prices'], c['features'], c['valid_stocks'], c['stock_info'])
+    if name == '盤整突破':
+        return screen_breakthrough(target_date, c['prices'], c['valid_stocks'], c['stock_info'])
+    if name == '族群':
+        category_stock_df = generate_category_stock_data(
+            c['actual_trade_date'], c['prices'], c['inst_df_all'], c['stock_info'], c['categories']
+        )
+        category_ranking_df = generate_category_ranking(
+            c['actual_trade_date'], c['prices'], c['inst_df_all'], c['categories'], category_stock_df
+        )
+        return category_stock_df, category_ranking_df
+    raise ValueError(f"未知的策略: {name}")
+
+
 def main():
     """主程式 - 執行所有篩選策略"""
     start_time = time.time()
@@ -896,10 +688,10 @@ def main():
     print("正在載入股票清單...")
     valid_stocks = get_valid_stock_list()
     stock_info = get_stock_info()
-    stock_category_df = get_stock_category()
-    unique_category_stocks = stock_category_df['股票代碼'].nunique()
+    categories = get_stock_category()
+    unique_category_stocks = len(categories.stocks)
     print(f"✓ 載入 {len(valid_stocks)} 支股票")
-    print(f"✓ 載入 {unique_category_stocks} 支族群股票（共 {len(stock_category_df)} 筆記錄）\n")
+    print(f"✓ 載入 {unique_category_stocks} 支族群股票（共 {len(categories.indices)} 筆記錄）\n")
 
     # 批次獲取共用資料
     print("=" * 80)
@@ -907,12 +699,12 @@ def main():
     print("=" * 80)
 
     # 法人資料（策略1、2使用）
-    inst_start_date, _ = get_date_range(TODAY, days=10)
-    inst_df_all = get_all_institutional_data(inst_start_date, TODAY)
+    inst_start_date, _ = get_date_range(TODAY, trading_days=INST_TRADING_DAYS)
+    inst_df_all = get_all_institutional_data(inst_start_date, TODAY, valid_stocks)
 
     # 價格資料（所有策略使用，需要較長期間）
-    price_start_date, _ = get_date_range(TODAY, days=100)
-    category_stocks_set = set(stock_category_df['股票代碼'].unique())
+    price_start_date, _ = get_date_range(TODAY, trading_days=PRICE_TRADING_DAYS)
+    category_stocks_set = set(categories.stocks)
     price_df_all = get_all_stock_prices(price_start_date, TODAY, valid_stocks, category_stocks_set)
 
     if inst_df_all is None or price_df_all is None:
@@ -925,47 +717,35 @@ def main():
 
     print("\n✓ 共用資料獲取完成\n")
 
+    # 日K線只排序一次，各策略共用個股索引
+    prices = StockIndex(price_df_all)
+
     # 找出實際使用的交易日期（用於檔名）
-    available_dates = sorted(price_df_all['date'].unique(), reverse=True)
-    actual_trade_date = available_dates[0] if len(available_dates) > 0 else TODAY
+    actual_trade_date = prices.latest_date or TODAY
     print(f"\n實際交易日期：{actual_trade_date}")
 
-    # 執行四個策略
+    # 均線等每日指標先寫入指標庫，各策略只讀取欄位
+    FeatureStore().get(actual_trade_date)
+
+    # 執行四個策略與族群報表
     print("\n" + "=" * 80)
     print("開始執行篩選策略")
     print("=" * 80)
 
-    results = {}
-
-    # 策略1：外資大量買超
-    results['外資大量買超'] = screen_foreign_investment(
-        TODAY, inst_df_all, price_df_all, valid_stocks, stock_info
-    )
-
-    # 策略2：投信連續買超
-    results['投信連續買超'] = screen_investment_trust(
-        TODAY, inst_df_all, price_df_all, valid_stocks, stock_info
-    )
-
-    # 策略3：強勢股篩選
-    results['強勢股篩選'] = screen_strong_stocks(
-        TODAY, price_df_all, valid_stocks, stock_info
-    )
-
-    # 策略4：盤整突破
-    results['盤整突破'] = screen_breakthrough(
-        TODAY, price_df_all, valid_stocks, stock_info
-    )
-
-    # 新增功能：族群個股資料
-    category_stock_df = generate_category_stock_data(
-        actual_trade_date, price_df_all, inst_df_all, stock_info, stock_category_df
-    )
+    if SCREEN_WORKERS > 1:
+        print(f"\n（{SCREEN_WORKERS} 個工作行程平行執行，長表放入共享記憶體）")
+        results = run_parallel(
+            {name: (run_strategy, (name, TODAY)) for name in STRATEGIES},
+            {'price': prices.frame, 'institutional': inst_df_all},
+            SCREEN_WORKERS,
+            initializer=_init_worker,
+            initargs=(valid_stocks, stock_info, actual_trade_date),
+        )
+    else:
+        set_strategy_context(prices, inst_df_all, valid_stocks, stock_info, categories, actual_trade_date)
+        results = {name: run_strategy(name, TODAY) for name in STRATEGIES}
 
-    # 新增功能：族群排名
-    category_ranking_df = generate_category_ranking(
-        actual_trade_date, price_df_all, inst_df_all, stock_category_df, category_stock_df
-    )
+    category_stock_df, category_ranking_df = results.pop('族群')
 
     # 輸出結果
     print("\n" + "=" * 80)
@@ -1024,7 +804,7 @@ def main():
     print("執行完成".center(76))
     print("=" * 80)
     print(f"\n總執行時間：{elapsed_time:.2f} 秒")
-    print(f"API 請求總次數：{API_REQUEST_COUNT} 次")
+    print(f"API 請求總次數：{get_client().request_count} 次（快取命中 {get_client().cache_hits} 次）")
     print(f"總共找到 {sum(len(df) for df in results.values())} 筆符合條件的記錄")
     print("\n所有檔案已儲存完成！\n")
 
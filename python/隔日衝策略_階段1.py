@@ -4,13 +4,20 @@
 功能: 抓取最近15天的日K資料和法人買賣資料,計算技術指標
 """
 
-import requests
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import time
-import numpy as np
 import os
 
+from feature_store import FeatureStore
+from finmind_client import FinMindClient
+from market_store import MarketStore
+from stock_registry import get_registry
+from trading_calendar import get_calendar, preflight
+
+# 日K 需最近 6 個交易日、法人需最近 3 日；今日盤前尚無資料，多算一日
+HISTORY_TRADING_DAYS = 6 + 1
+
 def print_separator(char="=", length=80):
     print(char * length)
 
@@ -40,75 +47,55 @@ def load_token():
 def prepare_historical_data(token):
     """
     階段1：準備歷史資料
+
+    Returns:
+        bool | None: 是否成功；今日非交易日時為 None
     """
     print_header("階段1：準備歷史資料")
 
-    headers = {"Authorization": f"Bearer {token}"}
+    client = FinMindClient(token=token)
 
     # 讀取股票清單
     print("\n[1/5] 讀取股票清單...")
-    df_stocks = pd.read_csv('(all)stock_info_list.csv')
-    all_stock_ids = df_stocks['股票代碼'].astype(str).tolist()
+    registry = get_registry()
+    df_stocks = registry.frame()
+    all_stock_ids = registry.codes
     print(f"✅ 總共 {len(all_stock_ids)} 檔股票")
 
-    # 設定日期範圍
+    # 設定日期範圍（依交易日曆，不以日曆天推估）
     today = datetime.now()
-    start_date = (today - timedelta(days=15)).strftime("%Y-%m-%d")
     end_date = today.strftime("%Y-%m-%d")
-    print(f"📅 資料日期範圍: {start_date} ~ {end_date}")
+    calendar = get_calendar()
+    start_date = calendar.window_start(end_date, HISTORY_TRADING_DAYS)
+    trade_dates = calendar.trading_days(start_date, end_date)
+    store = MarketStore()
+    print(f"📅 資料日期範圍: {start_date} ~ {end_date}（{len(trade_dates)} 個交易日）")
+
+    # 預檢：今日休市不執行；前一交易日的法人資料需已公布，才展開全市場抓取
+    if not calendar.is_trading_day(end_date):
+        print("⚠️  今日非交易日，不執行")
+        return None
+    previous = [d for d in trade_dates if d < end_date]
+    if previous and not preflight(previous[-1], 'TaiwanStockInstitutionalInvestorsBuySell', client=client):
+        return False
 
     # ========================================================================
     # 抓取日K資料
     # ========================================================================
-    print("\n[2/5] 抓取日K資料（每檔股票最近10天）...")
-    print("⚠️  這會需要一些時間，請耐心等待...")
-
-    url_daily = "https://api.finmindtrade.com/api/v4/data"
-    all_daily_data = []
-    failed_stocks = []
+    print("\n[2/5] 讀取日K資料（本地資料庫，只補抓缺少的資料）...")
 
     start_time = time.time()
-    for idx, stock_id in enumerate(all_stock_ids):
-        try:
-            parameter = {
-                "dataset": "TaiwanStockPriceAdj",
-                "data_id": stock_id,
-                "start_date": start_date,
-                "end_date": end_date,
-            }
-
-            resp = requests.get(url_daily, headers=headers, params=parameter, timeout=10)
-            data = resp.json()
-
-            if "data" in data and len(data["data"]) > 0:
-                df_stock = pd.DataFrame(data["data"])
-                all_daily_data.append(df_stock)
-
-            # 每100檔顯示進度
-            if (idx + 1) % 100 == 0:
-                elapsed = time.time() - start_time
-                progress = (idx + 1) / len(all_stock_ids) * 100
-                avg_time = elapsed / (idx + 1)
-                remaining = avg_time * (len(all_stock_ids) - idx - 1)
-                print(f"  進度: {idx + 1}/{len(all_stock_ids)} ({progress:.1f}%) - 已耗時: {elapsed:.0f}秒 - 預計剩餘: {remaining:.0f}秒")
-
-            time.sleep(0.05)
-
-        except Exception as e:
-            failed_stocks.append(stock_id)
-            if len(failed_stocks) <= 5:
-                print(f"  ⚠️  股票 {stock_id} 失敗: {e}")
+    store.ensure('price', trade_dates, all_stock_ids, client=client)
+    df_daily_all = store.load_window('price', trade_dates)
 
     elapsed = time.time() - start_time
-    print(f"\n✅ 日K資料抓取完成！總耗時: {elapsed:.1f}秒")
-    print(f"   成功: {len(all_daily_data)} 檔 | 失敗: {len(failed_stocks)} 檔")
-
-    if len(all_daily_data) == 0:
-        print("❌ 沒有成功抓取任何日K資料，程式終止")
+    if df_daily_all is None or len(df_daily_all) == 0:
+        print("❌ 沒有成功取得任何日K資料，程式終止")
         return False
 
-    # 合併所有日K資料
-    df_daily_all = pd.concat(all_daily_data, ignore_index=True)
+    df_daily_all = df_daily_all[df_daily_all['stock_id'].isin(all_stock_ids)]
+    print(f"\n✅ 日K資料準備完成！總耗時: {elapsed:.1f}秒")
+    print(f"   成功: {df_daily_all['stock_id'].nunique()} 檔")
     print(f"   總共 {len(df_daily_all)} 筆日K資料")
 
     # ========================================================================
@@ -116,34 +103,15 @@ def prepare_historical_data(token):
     # ========================================================================
     print("\n[3/5] 計算技術指標...")
 
-    df_daily_all['Trading_Volume'] = pd.to_numeric(df_daily_all['Trading_Volume'], errors='coerce')
-    df_daily_all['open'] = pd.to_numeric(df_daily_all['open'], errors='coerce')
-    df_daily_all['close'] = pd.to_numeric(df_daily_all['close'], errors='coerce')
-    df_daily_all = df_daily_all.sort_values(['stock_id', 'date'])
-
-    result_list = []
-    for stock_id, group in df_daily_all.groupby('stock_id'):
-        group = group.sort_values('date').tail(6)
-        if len(group) < 2:
-            continue
-
-        latest = group.iloc[-1]
-        prev_body = abs(latest['close'] - latest['open'])
-
-        if len(group) >= 5:
-            volumes_5d = group.tail(5)['Trading_Volume'].values / 1000
-            avg_volume_5d = np.mean(volumes_5d)
-        else:
-            avg_volume_5d = np.mean(group['Trading_Volume'].values) / 1000
-
-        result_list.append({
-            'stock_id': stock_id,
-            'prev_date': latest['date'],
-            'prev_body': prev_body,
-            'avg_volume_5d': avg_volume_5d,
-        })
-
-    df_indicators = pd.DataFrame(result_list)
+    # 每日指標庫：最近 6 個交易日內的最新K棒實體與至多 5 筆的平均成交量，至少需 2 筆
+    features = FeatureStore(store).get(df_daily_all['date'].max())
+    features = features[features['stock_id'].isin(all_stock_ids) & (features['bars_6d'] >= 2)]
+    df_indicators = pd.DataFrame({
+        'stock_id': features['stock_id'],
+        'prev_date': features['date'],
+        'prev_body': (features['close'] - features['open']).abs(),
+        'avg_volume_5d': features['avg_lots_6d'],
+    })
     print(f"✅ 成功計算 {len(df_indicators)} 檔股票的技術指標")
 
     # ========================================================================
@@ -151,49 +119,22 @@ def prepare_historical_data(token):
     # ========================================================================
     print("\n[4/5] 抓取法人買賣資料...")
 
-    all_institution_data = []
-    failed_institution = []
-
     start_time = time.time()
-    for idx, stock_id in enumerate(all_stock_ids):
-        try:
-            parameter = {
-                "dataset": "TaiwanStockInstitutionalInvestorsBuySell",
-                "data_id": stock_id,
-                "start_date": start_date,
-                "end_date": end_date,
-            }
-
-            resp = requests.get(url_daily, headers=headers, params=parameter, timeout=10)
-            data = resp.json()
-
-            if "data" in data and len(data["data"]) > 0:
-                df_inst = pd.DataFrame(data["data"])
-                all_institution_data.append(df_inst)
-
-            if (idx + 1) % 100 == 0:
-                elapsed = time.time() - start_time
-                progress = (idx + 1) / len(all_stock_ids) * 100
-                avg_time = elapsed / (idx + 1)
-                remaining = avg_time * (len(all_stock_ids) - idx - 1)
-                print(f"  進度: {idx + 1}/{len(all_stock_ids)} ({progress:.1f}%) - 已耗時: {elapsed:.0f}秒 - 預計剩餘: {remaining:.0f}秒")
-
-            time.sleep(0.05)
-
-        except Exception as e:
-            failed_institution.append(stock_id)
+    store.ensure('institutional', trade_dates, all_stock_ids, client=client)
+    df_institution_all = store.load_window('institutional', trade_dates)
+    if df_institution_all is not None:
+        df_institution_all = df_institution_all[df_institution_all['stock_id'].isin(all_stock_ids)]
 
     elapsed = time.time() - start_time
-    print(f"\n✅ 法人資料抓取完成！總耗時: {elapsed:.1f}秒")
-    print(f"   成功: {len(all_institution_data)} 檔 | 失敗: {len(failed_institution)} 檔")
+    print(f"\n✅ 法人資料準備完成！總耗時: {elapsed:.1f}秒")
 
     # 處理法人資料
-    if len(all_institution_data) > 0:
-        df_institution_all = pd.concat(all_institution_data, ignore_index=True)
+    if df_institution_all is not None and len(df_institution_all) > 0:
+        print(f"   成功: {df_institution_all['stock_id'].nunique()} 檔")
         print(f"   總共 {len(df_institution_all)} 筆法人資料")
 
         institution_result = []
-        for stock_id, group in df_institution_all.groupby('stock_id'):
+        for stock_id, group in df_institution_all.groupby('stock_id', observed=True):
             group = group.sort_values('date')
 
             foreign = group[group['name'] == 'Foreign_Investor'].tail(3)
@@ -285,7 +226,11 @@ def main():
     # 執行階段1：準備歷史資料
     success = prepare_historical_data(token)
 
-    if success:
+    if success is None:
+        print("\n" + "=" * 80)
+        print("⏸️  今日非交易日，階段1略過")
+        print("=" * 80)
+    elif success:
         print("\n" + "=" * 80)
         print("🎉 階段1完成！歷史資料已準備就緒")
         print("=" * 80)
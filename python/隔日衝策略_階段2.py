@@ -10,6 +10,27 @@ from datetime import datetime
 import time
 import os
 
+from finmind_client import FINMIND_BASE_URL, FinMindClient
+from finmind_schema import FrameBuilder
+from rule_engine import RuleSet
+
+# 篩選條件（全部符合才入選；執行順序依實測的篩除率與成本調整）
+NEXT_DAY_RULES = RuleSet('隔日衝', [
+    ('紅K棒', 'close > open'),
+    ('實體>前日{body_ratio}倍', 'current_body > prev_body * body_ratio'),
+    ('量>5日均量{volume_ratio}倍', 'total_volume > avg_volume_5d * volume_ratio'),
+    ('上影線<實體{shadow_ratio:.0%}', '(current_body > 0) & (upper_shadow < current_body * shadow_ratio)'),
+    ('下影線<實體{shadow_ratio:.0%}', '(current_body > 0) & (lower_shadow < current_body * shadow_ratio)'),
+    ('收在高點', 'close >= high * close_to_high'),
+    ('量>={min_lots}張', 'total_volume >= min_lots'),
+], params={
+    'body_ratio': 1.5,
+    'volume_ratio': 2,
+    'shadow_ratio': 0.3,
+    'close_to_high': 0.98,
+    'min_lots': 10000,
+})
+
 def print_separator(char="=", length=80):
     print(char * length)
 
@@ -42,7 +63,7 @@ def realtime_screen(token):
     """
     print_header(f"階段2：即時篩選 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-    headers = {"Authorization": f"Bearer {token}"}
+    client = FinMindClient(token=token)
 
     # 讀取歷史資料
     print("\n[1/3] 讀取歷史資料...")
@@ -62,7 +83,7 @@ def realtime_screen(token):
     # 抓取即時價格（分批查詢 + 重試機制）
     print("\n[2/3] 抓取即時價格...")
     all_stock_ids = df_historical['股票代碼'].astype(str).tolist()
-    url_realtime = "https://api.finmindtrade.com/api/v4/taiwan_stock_tick_snapshot"
+    url_realtime = f"{FINMIND_BASE_URL}/taiwan_stock_tick_snapshot"
 
     # 分批查詢（每批500檔，避免URL過長）
     batch_size = 500
@@ -70,7 +91,7 @@ def realtime_screen(token):
 
     print(f"  將 {len(all_stock_ids)} 檔股票分成 {len(batches)} 批查詢")
 
-    all_realtime_data = []
+    realtime = FrameBuilder('taiwan_stock_tick_snapshot')
     max_retries = 10
 
     for batch_idx, batch in enumerate(batches, 1):
@@ -83,7 +104,7 @@ def realtime_screen(token):
                     print(f"    第 {attempt} 次嘗試...")
 
                 parameter = {"data_id": batch}
-                resp = requests.get(url_realtime, headers=headers, params=parameter, timeout=30)
+                resp = client.get(parameter, url=url_realtime, timeout=30)
 
                 if resp.status_code != 200:
                     print(f"    ⚠️  HTTP {resp.status_code}")
@@ -114,7 +135,7 @@ def realtime_screen(token):
                         break
 
                 if "data" in data and len(data["data"]) > 0:
-                    all_realtime_data.extend(data["data"])
+                    realtime.add(data["data"])
                     print(f"    ✅ 成功取得 {len(data['data'])} 檔")
                     success = True
                     break
@@ -140,25 +161,14 @@ def realtime_screen(token):
         if not success:
             print(f"    ❌ 第 {batch_idx} 批查詢失敗（已嘗試{max_retries}次）")
 
-        # 批次間稍微延遲
-        if batch_idx < len(batches):
-            time.sleep(0.5)
-
-    if len(all_realtime_data) == 0:
+    # 各批回應已解碼為型別欄位（價格為 float64、成交量為 int64）
+    df_realtime = realtime.frame()
+    if df_realtime is None:
         print("\n❌ 沒有成功取得任何即時資料")
         return False
 
-    df_realtime = pd.DataFrame(all_realtime_data)
     print(f"\n✅ 總共成功取得 {len(df_realtime)} 檔股票的即時資料")
 
-    # 確保數值型態正確
-    df_realtime['open'] = pd.to_numeric(df_realtime['open'], errors='coerce')
-    df_realtime['close'] = pd.to_numeric(df_realtime['close'], errors='coerce')
-    df_realtime['high'] = pd.to_numeric(df_realtime['high'], errors='coerce')
-    df_realtime['low'] = pd.to_numeric(df_realtime['low'], errors='coerce')
-    df_realtime['total_volume'] = pd.to_numeric(df_realtime['total_volume'], errors='coerce')
-    df_realtime['change_rate'] = pd.to_numeric(df_realtime['change_rate'], errors='coerce')
-
     # 套用篩選條件
     print("\n[3/3] 套用篩選條件...")
 
@@ -176,48 +186,7 @@ def realtime_screen(token):
     df_combined['upper_shadow'] = df_combined['high'] - df_combined[['open', 'close']].max(axis=1)
     df_combined['lower_shadow'] = df_combined[['open', 'close']].min(axis=1) - df_combined['low']
 
-    df_filtered = df_combined.copy()
-    initial_count = len(df_filtered)
-
-    # 條件1: 紅K棒
-    df_filtered = df_filtered[df_filtered['close'] > df_filtered['open']]
-    print(f"  ✅ 條件1 (紅K棒): {len(df_filtered)} 檔符合 (篩掉 {initial_count - len(df_filtered)} 檔)")
-
-    # 條件2: 實體 > 前日1.5倍
-    cond2_count = len(df_filtered)
-    df_filtered = df_filtered[df_filtered['current_body'] > df_filtered['prev_body'] * 1.5]
-    print(f"  ✅ 條件2 (實體>前日1.5倍): {len(df_filtered)} 檔符合 (篩掉 {cond2_count - len(df_filtered)} 檔)")
-
-    # 條件3: 量 > 5日均量2倍
-    cond3_count = len(df_filtered)
-    df_filtered = df_filtered[df_filtered['total_volume'] > df_filtered['avg_volume_5d'] * 2]
-    print(f"  ✅ 條件3 (量>5日均量2倍): {len(df_filtered)} 檔符合 (篩掉 {cond3_count - len(df_filtered)} 檔)")
-
-    # 條件4: 上影線 < 實體30%
-    cond4_count = len(df_filtered)
-    df_filtered = df_filtered[
-        (df_filtered['current_body'] > 0) &
-        (df_filtered['upper_shadow'] < df_filtered['current_body'] * 0.3)
-    ]
-    print(f"  ✅ 條件4 (上影線<實體30%): {len(df_filtered)} 檔符合 (篩掉 {cond4_count - len(df_filtered)} 檔)")
-
-    # 條件5: 下影線 < 實體30%
-    cond5_count = len(df_filtered)
-    df_filtered = df_filtered[
-        (df_filtered['current_body'] > 0) &
-        (df_filtered['lower_shadow'] < df_filtered['current_body'] * 0.3)
-    ]
-    print(f"  ✅ 條件5 (下影線<實體30%): {len(df_filtered)} 檔符合 (篩掉 {cond5_count - len(df_filtered)} 檔)")
-
-    # 條件6: 收在高點
-    cond6_count = len(df_filtered)
-    df_filtered = df_filtered[df_filtered['close'] >= df_filtered['high'] * 0.98]
-    print(f"  ✅ 條件6 (收在高點): {len(df_filtered)} 檔符合 (篩掉 {cond6_count - len(df_filtered)} 檔)")
-
-    # 條件7: 量 >= 10000張
-    cond7_count = len(df_filtered)
-    df_filtered = df_filtered[df_filtered['total_volume'] >= 10000]
-    print(f"  ✅ 條件7 (量>=10000張): {len(df_filtered)} 檔符合 (篩掉 {cond7_count - len(df_filtered)} 檔)")
+    df_filtered = NEXT_DAY_RULES.filter(df_combined)
 
     print(f"\n🎯 最終篩選結果: {len(df_filtered)} 檔股票符合所有條件")
 